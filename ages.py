@@ -0,0 +1,162 @@
+'''
+Season ages of players, from data/all_hitter_ages.csv, data/all_pitcher_ages.csv and the birth
+dates in data/id_map.csv.
+
+Marcel's aging step needs each player season's Age, which the stat tables don't have. AgeIndex
+loads the age tables once into a dense (player, season) array, so that ages are attached to a
+whole frame with one hash lookup of its unique playerids and one array gather, instead of a
+merge of the full age tables. Player seasons missing from the age tables get an age from the
+player's birth date in the crosswalk, or failing that from his ages in other seasons.
+
+A season age is the player's age on June 30 of the season, as in the age tables.
+
+Classes
+-------
+
+AgeIndex
+    Looks up the ages of player seasons by Fangraphs playerid and season.
+'''
+
+import numpy as np
+import pandas as pd
+
+from forecast.aging import HITTER_AGES, PITCHER_AGES
+from forecast.datacache import read_csv
+from idmap import ID_MAP, IdMap
+
+
+class AgeIndex:
+    '''
+    Looks up the season ages of players by Fangraphs playerid.
+
+    Attributes
+    ----------
+    players: Index
+        The playerids of the age tables, normalized as in IdMap.
+
+    seasons: ndarray
+        The seasons of the columns of table, consecutive.
+
+    table: ndarray
+        The age of every (player, season), NaN where the tables have none.
+
+    Methods
+    -------
+    lookup(playerids, seasons)
+        Returns the ages of player seasons.
+
+    add_age(df)
+        Returns df with an Age column.
+    '''
+
+    def __init__(self, ages = (HITTER_AGES, PITCHER_AGES), id_map = ID_MAP, cache = True):
+        '''
+        Parameters
+        ----------
+        ages: list-like of csv or DataFrame (default = (HITTER_AGES, PITCHER_AGES))
+            Tables with playerid, Season and Age. Where they disagree the first one is used.
+
+        id_map: str, IdMap or None (default = ID_MAP)
+            The crosswalk with the birth dates of players missing from the age tables. It is
+            only read when such a player is looked up. If None, birth dates aren't used.
+
+        cache: bool (default = True)
+            If True, csvs are read through forecast.datacache.
+        '''
+        frames = []
+        for table in ages:
+            if not isinstance(table, pd.DataFrame):
+                table = read_csv(table) if cache else pd.read_csv(table, encoding = 'utf-8-sig')
+            frames.append(table[['playerid', 'Season', 'Age']].dropna())
+        data = pd.concat(frames, ignore_index = True)
+        codes, self.players = pd.factorize(IdMap._normalize(data['playerid']))
+        self.players = pd.Index(self.players)
+        season = data['Season'].to_numpy(dtype = np.int64)
+        self.seasons = np.arange(season.min(), season.max() + 1)
+        self.table = np.full((len(self.players), len(self.seasons)), np.nan)
+        #assigned in reverse, so that the first table's age wins.
+        self.table[codes[::-1], season[::-1] - self.seasons[0]] = data['Age'].to_numpy(dtype = float)[::-1]
+        #each player's age minus season, for seasons the tables don't have.
+        with np.errstate(invalid = 'ignore'):
+            self._offsets = np.nanmedian(self.table - self.seasons, axis = 1)
+        self.id_map = id_map
+        self._births = None
+
+    def lookup(self, playerids, seasons):
+        '''
+        Returns an array of the ages of player seasons.
+
+        Parameters
+        ----------
+        playerids: array-like
+            Fangraphs playerids, as ints or strings.
+
+        seasons: int or array-like
+            The season of each playerid.
+
+        Returns
+        -------
+        A float array aligned with playerids; NaN where no age is known.
+        '''
+        #only the unique ids are normalized and hashed.
+        codes, uniques = pd.factorize(pd.Series(playerids).reset_index(drop = True))
+        uniques = pd.Index(IdMap._normalize(pd.Series(uniques)))
+        seasons = np.broadcast_to(np.asarray(seasons, dtype = float), (len(codes),))
+        players = self.players.get_indexer(uniques)
+        players = np.where(codes >= 0, players[codes], -1)
+
+        column = seasons - self.seasons[0]
+        known = (players >= 0) & (column >= 0) & (column < len(self.seasons)) & ~np.isnan(column)
+        out = np.full(len(codes), np.nan)
+        out[known] = self.table[players[known], column[known].astype(np.intp)]
+
+        missing = np.isnan(out) & (codes >= 0)
+        if missing.any() and self.id_map is not None:
+            born = self._birth_dates(uniques)[codes[missing]]
+            out[missing] = seasons[missing] - born
+        missing = np.isnan(out) & (players >= 0)
+        out[missing] = seasons[missing] + self._offsets[players[missing]]
+        return out
+
+    def add_age(self, df, column = 'Age', playerid = 'playerid', season = 'Season', overwrite = False):
+        '''
+        Returns a copy of df with a column of each row's age.
+
+        Parameters
+        ----------
+        df: DataFrame
+            Player seasons with playerid and season columns.
+
+        column: str (default = 'Age')
+            The name of the added column.
+
+        playerid, season: str (default = 'playerid', 'Season')
+            The columns of df holding Fangraphs playerids and seasons.
+
+        overwrite: bool (default = False)
+            If False and df has column, only its missing ages are looked up.
+        '''
+        out = df.copy()
+        if column in df.columns and not overwrite:
+            ages = df[column].to_numpy(dtype = float, na_value = np.nan, copy = True)
+            missing = np.isnan(ages)
+            ages[missing] = self.lookup(df[playerid][missing], df[season].to_numpy()[missing])
+        else:
+            ages = self.lookup(df[playerid], df[season].to_numpy())
+        out[column] = ages
+        return out
+
+    def _birth_dates(self, ids):
+        '''
+        Returns, for each normalized id, its birth year, plus one if the birthday is after
+        June 30, so that a season minus it is the season age; NaN for unknown ids.
+        '''
+        if self._births is None:
+            id_map = self.id_map if isinstance(self.id_map, IdMap) else IdMap(self.id_map)
+            index, rows = id_map._indexes['fg_id']
+            born = pd.to_datetime(id_map.data['birth_date'].take(rows), errors = 'coerce')
+            late = (born.dt.month * 100 + born.dt.day > 630).to_numpy()
+            self._births = (index, born.dt.year.to_numpy(dtype = float) + late)
+        index, born = self._births
+        found = index.get_indexer(pd.Index(ids))
+        return np.where(found >= 0, born[np.maximum(found, 0)], np.nan)
@@ -0,0 +1,419 @@
+'''
+Benchmarks of the hot paths of forecast/marcel.py, stats.py and scraper.py.
+
+The benchmarks run offline. The Marcel inputs are built from the player seasons in
+data/all_hitter_ages.csv and data/all_pitcher_ages.csv (real playerids, seasons, ages and
+playing time) with synthetic stat lines, and can be scaled up by copying every player under
+new playerids: scale 10 has ten times the players of the bundled data, scale 100 a hundred.
+
+Every case is timed on fresh inputs; setup (building the forecaster, the projections that
+replacement levels are solved from, ...) is not timed. The report gives the best wall time of
+the repeats, the peak memory traced by tracemalloc during one more run, and rows per second,
+where rows are the input rows the case reads. Results can be saved as a baseline and later
+runs compared with it, flagging cases that got slower by more than a tolerance. Baselines are
+only comparable on the same machine.
+
+Run from the repository root:
+
+    python benchmark.py --scales 1 10 100 --save baseline.json
+    python benchmark.py --scales 1 10 100 --compare baseline.json
+
+Functions
+---------
+
+synthetic_hitters(scale, since, seed)
+    Returns a hitter Marcel input built from data/all_hitter_ages.csv.
+
+synthetic_pitchers(scale, since, seed)
+    Returns a pitcher Marcel input built from data/all_pitcher_ages.csv.
+
+run(cases, scales, repeat)
+    Times the cases at each scale and returns a DataFrame of results.
+
+compare(results, baseline, tolerance)
+    Returns results with the baseline times and a regression flag.
+'''
+
+import argparse
+import datetime
+import gc
+import json
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from forecast.aging import HITTER_AGES, PITCHER_AGES
+from forecast.datacache import read_csv
+from forecast.marcel import MarcelForecaster
+from scraper import read_statcast_dir, statcast_scrape_to_dir
+from stats import StatCalculator
+
+#added to playerids for each copy of the players in a scaled up input; bigger than any Fangraphs playerid.
+PLAYERID_OFFSET = 10_000_000
+POSITIONS = ['C', '1B', '2B', '3B', 'SS', 'OF', 'OF/1B', 'SS/2B', '2B/3B', 'C/1B']
+
+
+def _scaled(ages, scale, since):
+    '''
+    Returns the seasons of ages since since, with every player copied scale times under new playerids.
+    '''
+    ages = ages[ages['Season'] >= since].reset_index(drop = True)
+    copies = np.repeat(np.arange(scale), len(ages))
+    out = ages.iloc[np.tile(np.arange(len(ages)), scale)].reset_index(drop = True)
+    out['playerid'] = out['playerid'].to_numpy() + copies * PLAYERID_OFFSET
+    return out
+
+
+def _talent(rng, playerid, sd = .15):
+    '''
+    Returns a lognormal talent multiplier per row, the same for every row of a player.
+    '''
+    codes, players = pd.factorize(playerid)
+    return np.exp(rng.normal(0, sd, len(players)))[codes]
+
+
+def synthetic_hitters(scale = 1, since = 2000, seed = 0):
+    '''
+    Returns a hitter Marcel input with the columns of a Fangraphs export.
+
+    The player seasons, ages, G, AB and PA are those of data/all_hitter_ages.csv since since,
+    copied scale times; the other stats are drawn around league rates.
+    '''
+    rng = np.random.default_rng(seed)
+    df = _scaled(read_csv(HITTER_AGES), scale, since)
+    talent = _talent(rng, df['playerid'])
+    pa = df['PA'].to_numpy()
+    ab = df['AB'].to_numpy()
+    count = lambda rate: rng.poisson(pa * rate)
+
+    h = rng.binomial(ab, np.clip(.25 * talent, 0, 1))
+    doubles = rng.binomial(h, .2)
+    triples = rng.binomial(h - doubles, .02)
+    hr = np.minimum(count(.03 * talent), h - doubles - triples)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        avg = np.where(ab > 0, h / ab, np.nan)
+    stats = {'H': h, '1B': h - doubles - triples - hr, '2B': doubles, '3B': triples, 'HR': hr,
+             'R': count(.12 * talent), 'RBI': count(.11 * talent), 'BB': count(.08 * talent),
+             'IBB': count(.005), 'SO': count(.22 / talent), 'HBP': count(.01), 'SF': count(.007),
+             'SH': count(.003), 'GDP': count(.02), 'SB': count(.02 * talent), 'CS': count(.007),
+             'AVG': avg}
+    out = df[['Season', 'Name', 'Team', 'G', 'AB', 'PA']].copy()
+    for stat, values in stats.items():
+        out[stat] = values
+    out['playerid'] = df['playerid'].to_numpy()
+    out['Age'] = df['Age'].to_numpy()
+    return out
+
+
+def synthetic_pitchers(scale = 1, since = 2000, seed = 0):
+    '''
+    Returns a pitcher Marcel input with the columns of a Fangraphs export. See synthetic_hitters.
+    '''
+    rng = np.random.default_rng(seed)
+    df = _scaled(read_csv(PITCHER_AGES), scale, since)
+    talent = _talent(rng, df['playerid'])
+    ip = df['IP'].to_numpy(dtype = float)
+    outs = np.floor(ip) * 3 + np.round(ip % 1 * 10)
+    tbf = np.round(outs * 1.43).astype(np.int64)
+    count = lambda rate: rng.poisson(tbf * rate)
+    g = df['G'].to_numpy()
+    gs = df['GS'].to_numpy()
+
+    er = count(.11 / talent)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        era = np.where(outs > 0, er / outs * 27, np.nan)
+    stats = {'W': count(.02 * talent), 'L': count(.02 / talent), 'ERA': era, 'G': g, 'GS': gs,
+             'CG': rng.binomial(gs, .02), 'ShO': rng.binomial(gs, .005),
+             'SV': rng.binomial(g - gs, .1), 'HLD': rng.binomial(g - gs, .15), 'BS': rng.binomial(g - gs, .04),
+             'IP': ip, 'TBF': tbf, 'H': count(.22 / talent), 'R': er + count(.01), 'ER': er,
+             'HR': count(.03 / talent), 'BB': count(.08 / talent), 'IBB': count(.005), 'HBP': count(.01),
+             'WP': count(.008), 'BK': count(.001), 'SO': count(.21 * talent)}
+    out = df[['Season', 'Name', 'Team']].copy()
+    for stat, values in stats.items():
+        out[stat] = values
+    out['playerid'] = df['playerid'].to_numpy()
+    out['Age'] = df['Age'].to_numpy()
+    return out
+
+
+class _Inputs:
+    '''
+    The inputs of one scale, built on first use and shared by the cases.
+    '''
+
+    def __init__(self, scale, since, seed):
+        self.scale = scale
+        self.since = since
+        self.seed = seed
+        self._values = {}
+
+    def get(self, name, build):
+        if name not in self._values:
+            self._values[name] = build()
+        return self._values[name]
+
+    @property
+    def hitters(self):
+        return self.get('hitters', lambda: synthetic_hitters(self.scale, self.since, self.seed))
+
+    @property
+    def pitchers(self):
+        return self.get('pitchers', lambda: synthetic_pitchers(self.scale, self.since, self.seed))
+
+    @property
+    def season(self):
+        return int(self.hitters['Season'].max()) + 1
+
+    def forecaster(self):
+        return MarcelForecaster(self.pitchers, self.hitters, as_pandas = True)
+
+    @property
+    def hitter_projections(self):
+        def build():
+            df = self.forecaster().project_hitters(self.season)
+            rng = np.random.default_rng(self.seed)
+            df['Pos'] = np.asarray(POSITIONS, dtype = object)[rng.integers(0, len(POSITIONS), len(df))]
+            return df
+        return self.get('hitter_projections', build)
+
+    @property
+    def pitcher_projections(self):
+        return self.get('pitcher_projections', lambda: self.forecaster().project_pitchers(self.season))
+
+
+#Each case takes the inputs of a scale and returns (run, rows): a function of no arguments
+#that does the work being timed, and the number of input rows it reads. Cases are set up
+#again before every repeat, so nothing cached by one run is reused by the next.
+
+def _project_hitters(inputs):
+    m = inputs.forecaster()
+    return (lambda: m.project_hitters(inputs.season)), len(inputs.hitters)
+
+
+def _project_pitchers(inputs):
+    m = inputs.forecaster()
+    return (lambda: m.project_pitchers(inputs.season)), len(inputs.pitchers)
+
+
+def _project_hitters_cached(inputs):
+    m = inputs.forecaster()
+    m.project_hitters(inputs.season)
+    return (lambda: m.project_hitters(inputs.season - 1)), len(inputs.hitters)
+
+
+def _project_one_hitter(inputs):
+    m = inputs.forecaster()
+    m.project_hitters(inputs.season)
+    last = inputs.hitters[inputs.hitters['Season'] == inputs.season - 1]
+    ids = [last['playerid'].iloc[0]]
+    return (lambda: m.project_hitters(inputs.season, ids = ids)), len(inputs.hitters)
+
+
+def _hit_step1(inputs):
+    m = inputs.forecaster()
+    rows = int((inputs.hitters['Season'] >= inputs.season - 3).sum())
+    return (lambda: m._hit_step1(inputs.season)), rows
+
+
+def _hit_step4_prorating(inputs):
+    m = inputs.forecaster()
+    return (lambda: m._hit_step4_prorating(inputs.season)), len(inputs.hitters)
+
+
+def _pit_step4_prorating(inputs):
+    m = inputs.forecaster()
+    return (lambda: m._pit_step4_prorating(inputs.season)), len(inputs.pitchers)
+
+
+def _hitterFWAR_rows(inputs):
+    calculator = StatCalculator()
+    df = inputs.hitter_projections
+    return (lambda: df.apply(calculator.hitterFWAR, axis = 1)), len(df)
+
+
+def _hitterFWAR_batch(inputs):
+    calculator = StatCalculator()
+    df = inputs.hitter_projections
+    return (lambda: calculator.hitterFWAR_batch(df)), len(df)
+
+
+def _solve_replacement_levels(inputs):
+    calculator = StatCalculator()
+    hitters = inputs.hitter_projections
+    pitchers = inputs.pitcher_projections
+    #league size grows with the player pool, so the rostered share stays the same.
+    teams = 15 * inputs.scale
+    solve = lambda: calculator.solve_replacement_levels(hitters, pitchers, teams = teams,
+                                                        pitcher_stat_dict = {'K': 'SO', 'S': 'SV'})
+    return solve, len(hitters) + len(pitchers)
+
+
+def _scrape_to_dir(inputs):
+    #four weeks of pitches in weekly slices, served by a local fetch instead of the network.
+    rng = np.random.default_rng(inputs.seed)
+    per_day = 2_500 * inputs.scale
+    def fetch(start, end):
+        days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+        n = per_day * days
+        return pd.DataFrame({'game_date': np.repeat(pd.date_range(start, periods = days).strftime('%Y-%m-%d'), per_day),
+                             'batter': rng.integers(400000, 700000, n), 'pitcher': rng.integers(400000, 700000, n),
+                             'launch_speed': rng.normal(88, 14, n), 'launch_angle': rng.normal(12, 25, n)})
+    directory = tempfile.mkdtemp(prefix = 'phi_benchmark_')
+    def scrape():
+        try:
+            statcast_scrape_to_dir(directory, datetime.date(2019, 4, 1), datetime.date(2019, 4, 28), days = 7, fetch = fetch)
+            return read_statcast_dir(directory)
+        finally:
+            shutil.rmtree(directory, ignore_errors = True)
+    return scrape, per_day * 28
+
+
+#name: (setup, largest scale it runs at). The row-by-row reference code is slow enough that
+#it only runs at the smaller scales.
+CASES = {
+    'project_hitters': (_project_hitters, None),
+    'project_pitchers': (_project_pitchers, None),
+    'project_hitters_cached': (_project_hitters_cached, None),
+    'project_one_hitter': (_project_one_hitter, None),
+    '_hit_step1': (_hit_step1, 1),
+    '_hit_step4_prorating': (_hit_step4_prorating, None),
+    '_pit_step4_prorating': (_pit_step4_prorating, None),
+    'hitterFWAR_rows': (_hitterFWAR_rows, 10),
+    'hitterFWAR_batch': (_hitterFWAR_batch, None),
+    'solve_replacement_levels': (_solve_replacement_levels, None),
+    'scrape_to_dir': (_scrape_to_dir, 10),
+}
+
+
+def _measure(setup, inputs, repeat):
+    '''
+    Returns (best wall time, peak traced memory in bytes, rows) of a case.
+    '''
+    times = []
+    for _ in range(repeat):
+        work, rows = setup(inputs)
+        gc.collect()
+        start = time.perf_counter()
+        work()
+        times.append(time.perf_counter() - start)
+    work, rows = setup(inputs)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        work()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(times), peak, rows
+
+
+def run(cases = None, scales = (1, 10, 100), repeat = 3, since = 2000, seed = 0, verbose = False):
+    '''
+    Times the benchmark cases at each scale and returns a DataFrame of the results.
+
+    Parameters
+    ----------
+    cases: list-like or None (default = None)
+        Names of cases in CASES. If None, all of them.
+
+    scales: list-like of int (default = (1, 10, 100))
+        How many copies of the bundled players the inputs have.
+
+    repeat: int (default = 3)
+        The number of timed runs of each case; the best is reported.
+
+    since: int (default = 2000)
+        The first season of the bundled data used.
+
+    seed: int (default = 0)
+        Seed of the synthetic stats.
+
+    verbose: bool (default = False)
+        If True, prints each result as it is measured.
+
+    Returns
+    -------
+    A DataFrame with a row per case and scale: rows, seconds, peak_mb and rows_per_s.
+    '''
+    cases = list(CASES) if cases is None else list(cases)
+    results = []
+    for scale in scales:
+        inputs = _Inputs(scale, since, seed)
+        for name in cases:
+            setup, max_scale = CASES[name]
+            if max_scale is not None and scale > max_scale:
+                continue
+            seconds, peak, rows = _measure(setup, inputs, repeat)
+            results.append({'case': name, 'scale': scale, 'rows': rows, 'seconds': seconds,
+                            'peak_mb': peak / 2**20, 'rows_per_s': rows / seconds})
+            if verbose:
+                print('{:<26} x{:<4} {:>10.4f} s {:>9.1f} MB'.format(name, scale, seconds, peak / 2**20), flush = True)
+        del inputs
+        gc.collect()
+    return pd.DataFrame(results, columns = ['case', 'scale', 'rows', 'seconds', 'peak_mb', 'rows_per_s'])
+
+
+def save_baseline(results, path):
+    '''
+    Writes results to a json baseline.
+    '''
+    with open(path, 'w') as f:
+        json.dump(results.to_dict(orient = 'records'), f, indent = 1)
+
+
+def compare(results, baseline, tolerance = .2):
+    '''
+    Returns results with the baseline's seconds and peak_mb and whether each case regressed.
+
+    Parameters
+    ----------
+    results: DataFrame
+        From run.
+
+    baseline: str or DataFrame
+        A json baseline written by save_baseline, or earlier results.
+
+    tolerance: numeric (default = .2)
+        A case regressed if it is slower than the baseline by more than this share.
+    '''
+    if not isinstance(baseline, pd.DataFrame):
+        with open(baseline) as f:
+            baseline = pd.DataFrame(json.load(f))
+    baseline = baseline.set_index(['case', 'scale'])[['seconds', 'peak_mb']].add_prefix('baseline_')
+    out = results.join(baseline, on = ['case', 'scale'])
+    out['ratio'] = out['seconds'] / out['baseline_seconds']
+    out['regressed'] = out['ratio'] > 1 + tolerance
+    return out
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Benchmarks of Marcel, StatCalculator and scraper hot paths.')
+    parser.add_argument('--cases', nargs = '+', choices = list(CASES), help = 'cases to run (default: all)')
+    parser.add_argument('--scales', nargs = '+', type = int, default = [1, 10, 100])
+    parser.add_argument('--repeat', type = int, default = 3)
+    parser.add_argument('--since', type = int, default = 2000, help = 'first season of the bundled data used')
+    parser.add_argument('--save', metavar = 'JSON', help = 'write the results as a baseline')
+    parser.add_argument('--compare', metavar = 'JSON', help = 'compare with a saved baseline')
+    parser.add_argument('--tolerance', type = float, default = .2)
+    args = parser.parse_args(argv)
+
+    results = run(args.cases, args.scales, args.repeat, args.since, verbose = True)
+    if args.compare:
+        results = compare(results, args.compare, args.tolerance)
+    with pd.option_context('display.width', 200, 'display.max_rows', None):
+        print(results.to_string(index = False, float_format = '{:.4g}'.format))
+    if args.save:
+        save_baseline(results[['case', 'scale', 'rows', 'seconds', 'peak_mb', 'rows_per_s']], args.save)
+    if args.compare and results['regressed'].any():
+        print('regressed: ' + ', '.join('{} x{}'.format(*x) for x in results.loc[results['regressed'], ['case', 'scale']].to_numpy()))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,289 @@
+'''
+Expected batting stats (xBA, xSLG, xHR) from pitch-level statcast data.
+
+An ExpectedStatsGrid is a 2D lookup table of outcome rates by binned launch speed and launch
+angle: the rate of hits, total bases and home runs of batted balls in each (speed, angle) bin.
+A batted ball's expected outcomes are its bin's row of the table, so a batch of batted balls is
+mapped to expected values with one bin computation and one array gather.
+
+expected_stats streams a statcast_store once, a batch at a time, adding every batch's actual
+and expected counts to per (batter, season) totals, so its memory is bounded by the batch size
+and the number of batter seasons rather than the number of pitches.
+
+Like Statcast's expected stats, strikeouts count as at bats with no expected hits, and batted
+balls without a launch speed or angle keep their actual outcome.
+
+Requires pyarrow, through statcast_store.
+
+Classes
+-------
+
+ExpectedStatsGrid
+    Outcome rates of batted balls by launch speed and launch angle bin.
+
+Functions
+---------
+
+expected_stats(root, grid)
+    Returns the actual and expected stats of every batter season in a statcast_store.
+'''
+
+import numpy as np
+import pandas as pd
+
+from statcast_store import iter_statcast
+
+HITS = {'single': 1, 'double': 2, 'triple': 3, 'home_run': 4} #total bases
+#events ending at bats that aren't hits.
+OUTS = ['field_out', 'strikeout', 'strikeout_double_play', 'grounded_into_double_play', 'double_play',
+        'triple_play', 'force_out', 'fielders_choice', 'fielders_choice_out', 'field_error', 'other_out']
+#events ending plate appearances that aren't at bats.
+NOT_AT_BATS = ['walk', 'intent_walk', 'hit_by_pitch', 'sac_fly', 'sac_bunt', 'sac_fly_double_play',
+               'sac_bunt_double_play', 'catcher_interf']
+AT_BATS = list(HITS) + OUTS
+STRIKEOUTS = ['strikeout', 'strikeout_double_play']
+#the outcomes the grid holds rates of, per batted ball.
+OUTCOMES = ['H', 'TB', 'HR']
+COLUMNS = ['season', 'batter', 'events', 'launch_speed', 'launch_angle']
+
+
+def _outcomes(events):
+    '''
+    Returns, for an array of events, arrays of whether it was a plate appearance, an at bat, a
+    strikeout, and the (n, OUTCOMES) actual outcomes.
+    '''
+    #a batch has a handful of distinct events, so they are encoded once and every flag is an
+    #integer lookup of the codes; -1 (a missing event) picks the last row, which is all zeros.
+    codes, uniques = pd.factorize(np.asarray(events, dtype = object))
+    table = np.array([[HITS.get(x, 0), x in AT_BATS, x in AT_BATS or x in NOT_AT_BATS, x in STRIKEOUTS]
+                      for x in uniques] + [[0, False, False, False]], dtype = float)[codes]
+    bases = table[:, 0]
+    actual = np.column_stack([bases > 0, bases, bases == 4]).astype(float)
+    return table[:, 2] > 0, table[:, 1] > 0, table[:, 3] > 0, actual
+
+
+def _box_sum(a, k):
+    '''
+    Returns the sums of a 2D array (rows, columns, ...) over the (2k + 1) x (2k + 1) box around
+    every cell, with cumulative sums.
+    '''
+    padded = np.pad(a, [(k + 1, k), (k + 1, k)] + [(0, 0)] * (a.ndim - 2))
+    c = padded.cumsum(axis = 0).cumsum(axis = 1)
+    w = 2*k + 1
+    return c[w:, w:] - c[:-w, w:] - c[w:, :-w] + c[:-w, :-w]
+
+
+class ExpectedStatsGrid:
+    '''
+    The rates of hits, total bases and home runs of batted balls by launch speed and angle bin.
+
+    Bins are step wide and start at the low edge of speeds and angles; batted balls outside the
+    grid are counted in its outermost bins.
+
+    Attributes
+    ----------
+    speeds, angles: tuple
+        (low, high, step) of the launch speed (mph) and launch angle (degrees) bins.
+
+    shape: tuple
+        The number of (speed, angle) bins.
+
+    table: ndarray
+        The rates, (speed bins * angle bins, OUTCOMES), flattened so that a bin is one row.
+
+    count: ndarray
+        The number of batted balls the rates of every bin were fitted from.
+
+    Methods
+    -------
+    fit(data)
+        Class method fitting a grid from statcast pitches.
+
+    fit_store(root)
+        Class method fitting a grid from a statcast_store.
+
+    bins(launch_speed, launch_angle)
+        Returns the bin of every batted ball, -1 where speed or angle is missing.
+
+    lookup(launch_speed, launch_angle)
+        Returns the expected outcomes of every batted ball.
+    '''
+
+    def __init__(self, speeds, angles, table, count = None):
+        '''
+        Parameters
+        ----------
+        speeds, angles: tuple
+            (low, high, step) of the bins.
+
+        table: array-like
+            The rates, (speed bins * angle bins, OUTCOMES) or (speed bins, angle bins, OUTCOMES).
+
+        count: array-like or None (default = None)
+            The batted balls in every bin.
+        '''
+        self.speeds = tuple(speeds)
+        self.angles = tuple(angles)
+        self.shape = (self._size(self.speeds), self._size(self.angles))
+        self.table = np.asarray(table, dtype = float).reshape(self.shape[0] * self.shape[1], len(OUTCOMES))
+        self.count = None if count is None else np.asarray(count).reshape(-1)
+
+    @staticmethod
+    def _size(edges):
+        low, high, step = edges
+        return int(np.ceil((high - low) / step))
+
+    @classmethod
+    def fit(cls, data, speeds = (0, 125, 1), angles = (-90, 90, 1), k = 2, regress = 10):
+        '''
+        Returns a grid fitted from the batted balls of statcast pitches.
+
+        Each bin's rates are regressed toward the rates of the (2k + 1) x (2k + 1) bins around
+        it, so that sparse bins at the edges of the grid get sensible rates.
+
+        Parameters
+        ----------
+        data: DataFrame or iterable of DataFrames
+            Statcast pitches with events, launch_speed and launch_angle, e.g. from
+            statcast_store.iter_statcast. Only at bats that aren't strikeouts are used.
+
+        speeds, angles: tuple (default = (0, 125, 1), (-90, 90, 1))
+            (low, high, step) of the bins.
+
+        k: int (default = 2)
+            The number of bins on each side of a bin that its rates are regressed toward.
+
+        regress: numeric (default = 10)
+            The batted balls of the neighbouring bins' rates added to every bin.
+        '''
+        grid = cls(speeds, angles, np.zeros(cls._size(speeds) * cls._size(angles) * len(OUTCOMES)))
+        n_bins = len(grid.table)
+        count = np.zeros(n_bins)
+        sums = np.zeros((n_bins, len(OUTCOMES)))
+        for df in [data] if isinstance(data, pd.DataFrame) else data:
+            pa, ab, so, actual = _outcomes(df['events'])
+            b = grid.bins(df['launch_speed'], df['launch_angle'])
+            keep = ab & ~so & (b >= 0)
+            b = b[keep]
+            count += np.bincount(b, minlength = n_bins)
+            for j in range(len(OUTCOMES)):
+                sums[:, j] += np.bincount(b, weights = actual[keep, j], minlength = n_bins)
+
+        league = sums.sum(axis = 0) / max(count.sum(), 1)
+        box_count = _box_sum(count.reshape(grid.shape), k).reshape(-1)
+        box_sums = _box_sum(sums.reshape(grid.shape + (len(OUTCOMES),)), k).reshape(n_bins, -1)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            prior = np.where(box_count[:, None] > 0, box_sums / box_count[:, None], league)
+        grid.table = (sums + regress * prior) / (count[:, None] + regress)
+        grid.count = count
+        return grid
+
+    @classmethod
+    def fit_store(cls, root, seasons = None, **kwargs):
+        '''
+        Returns a grid fitted from the at bats of a statcast_store, streamed a batch at a time.
+        Keyword arguments are passed to fit.
+        '''
+        data = iter_statcast(root, seasons = seasons, events = AT_BATS,
+                             columns = ['events', 'launch_speed', 'launch_angle'])
+        return cls.fit(data, **kwargs)
+
+    def bins(self, launch_speed, launch_angle):
+        '''
+        Returns an int array of the flattened bin of every batted ball, -1 where launch speed or
+        angle is missing.
+        '''
+        speed = np.asarray(launch_speed, dtype = float)
+        angle = np.asarray(launch_angle, dtype = float)
+        known = ~(np.isnan(speed) | np.isnan(angle))
+        i = np.clip((speed - self.speeds[0]) // self.speeds[2], 0, self.shape[0] - 1)
+        j = np.clip((angle - self.angles[0]) // self.angles[2], 0, self.shape[1] - 1)
+        return np.where(known, np.nan_to_num(i) * self.shape[1] + np.nan_to_num(j), -1).astype(np.intp)
+
+    def lookup(self, launch_speed, launch_angle):
+        '''
+        Returns an array (batted balls, OUTCOMES) of expected hits, total bases and home runs;
+        NaN where launch speed or angle is missing.
+        '''
+        b = self.bins(launch_speed, launch_angle)
+        out = self.table[b]
+        out[b < 0] = np.nan
+        return out
+
+    def to_frame(self):
+        '''
+        Returns the table as a DataFrame indexed by the low edges of the (speed, angle) bins.
+        '''
+        index = pd.MultiIndex.from_product(
+            [self.speeds[0] + self.speeds[2] * np.arange(self.shape[0]),
+             self.angles[0] + self.angles[2] * np.arange(self.shape[1])],
+            names = ['launch_speed', 'launch_angle'])
+        df = pd.DataFrame(self.table, index = index, columns = OUTCOMES)
+        if self.count is not None:
+            df['count'] = self.count
+        return df
+
+
+def expected_stats(root, grid, seasons = None, batch_size = 250_000):
+    '''
+    Returns the actual and expected stats of every batter season in a statcast_store.
+
+    The store is read once, a batch at a time, and only its season, batter, events,
+    launch_speed and launch_angle columns are read.
+
+    Parameters
+    ----------
+    root: str
+        The statcast_store directory.
+
+    grid: ExpectedStatsGrid
+        The expected outcomes of batted balls, e.g. ExpectedStatsGrid.fit_store(root).
+
+    seasons: list-like of int or None (default = None)
+        Only these seasons. None uses all of them.
+
+    batch_size: int (default = 250,000)
+        The pitches read and aggregated at a time.
+
+    Returns
+    -------
+    A DataFrame indexed by (Season, batter), with counts PA, AB, BBE (batted balls with a launch
+    speed and angle), H, TB, HR, xH, xTB, xHR, the mean EV and LA of batted balls, and the rates
+    BA, xBA, SLG and xSLG.
+    '''
+    names = ['PA', 'AB', 'BBE', 'EV', 'LA', 'H', 'TB', 'HR', 'xH', 'xTB', 'xHR']
+    partials = []
+    for df in iter_statcast(root, seasons = seasons, events = AT_BATS + NOT_AT_BATS, columns = COLUMNS,
+                            batch_size = batch_size):
+        pa, ab, so, actual = _outcomes(df['events'])
+        speed = df['launch_speed'].to_numpy(dtype = float, na_value = np.nan)
+        angle = df['launch_angle'].to_numpy(dtype = float, na_value = np.nan)
+        expected = grid.lookup(speed, angle)
+        bbe = ab & ~so & ~np.isnan(expected[:, 0])
+        #at bats that aren't batted balls with a bin keep their actual outcome; strikeouts are 0.
+        expected = np.where(bbe[:, None], expected, actual * ab[:, None])
+
+        key = df['season'].to_numpy(dtype = np.int64) * 10_000_000 + df['batter'].to_numpy(dtype = np.int64)
+        codes, keys = pd.factorize(key)
+        values = np.column_stack([pa, ab, bbe, np.where(bbe, speed, 0), np.where(bbe, angle, 0),
+                                  actual * ab[:, None], expected])
+        sums = np.column_stack([np.bincount(codes, weights = values[:, j], minlength = len(keys))
+                                for j in range(values.shape[1])])
+        partials.append(pd.DataFrame(sums, index = keys, columns = names))
+
+    if not partials:
+        out = pd.DataFrame(columns = names, index = pd.MultiIndex.from_arrays([[], []], names = ['Season', 'batter']))
+    else:
+        out = pd.concat(partials).groupby(level = 0).sum()
+        out.index = pd.MultiIndex.from_arrays([out.index // 10_000_000, out.index % 10_000_000],
+                                              names = ['Season', 'batter'])
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        out['EV'] = out['EV'] / out['BBE']
+        out['LA'] = out['LA'] / out['BBE']
+        out['BA'] = out['H'] / out['AB']
+        out['xBA'] = out['xH'] / out['AB']
+        out['SLG'] = out['TB'] / out['AB']
+        out['xSLG'] = out['xTB'] / out['AB']
+    counts = ['PA', 'AB', 'BBE', 'H', 'TB', 'HR']
+    out[counts] = out[counts].astype(np.int64)
+    return out
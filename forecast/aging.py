@@ -0,0 +1,244 @@
+"""
+Aging curves for Marcel, stored as age to multiplier lookup tables.
+
+An aging curve is a table with a row for every age and a column for every stat it adjusts.
+A projection is aged by gathering the row of each player's age and multiplying the whole
+(players, stats) matrix by it, so aging costs one gather and one multiply whatever the curve.
+Stats the curve doesn't adjust (e.g. PA and AB) are multiplied by 1.
+
+Two curves are included. MarcelCurve is Tango's: good stats change by .006 a year below 29 and
+.003 a year above it, bad stats by as much in the other direction. DeltaMethodCurve is fitted
+per stat from consecutive seasons of the same players with the delta method, e.g. from
+data/all_hitter_ages.csv and data/all_pitcher_ages.csv or from the Marcel input itself.
+
+The age of a projection is the player's age in the last season of his data, as in Marcel.
+
+WARNING: The directory structure in phi_baseball is not final. File locations may change.
+
+Classes
+-------
+
+AgingCurve
+    An age to multiplier lookup table, applied to projections with a gather and multiply.
+
+MarcelCurve
+    Tango's Marcel aging curve.
+
+DeltaMethodCurve
+    Per stat aging curves fitted from consecutive seasons with the delta method.
+
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .datacache import read_csv
+except ImportError: #imported from inside forecast/, as the notebooks do.
+    from datacache import read_csv
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+HITTER_AGES = os.path.join(DATA, 'all_hitter_ages.csv')
+PITCHER_AGES = os.path.join(DATA, 'all_pitcher_ages.csv')
+
+
+def marcel_adjustment(age):
+    """
+    Returns an array of Marcel age adjustments for an array of ages.
+    """
+    age = np.asarray(age, dtype=float)
+    return np.where(age >= 29, .003*(29 - age), .006*(29 - age))
+
+
+class AgingCurve:
+    """
+    An aging curve stored as a table of multipliers by age and stat.
+
+    Ages between two rows of the table are interpolated linearly, ages outside it use its
+    first or last row, and a missing age gives missing values in the stats the curve adjusts.
+
+    Attributes
+    ----------
+    stats: Index
+        The stats the curve adjusts.
+
+    ages: ndarray
+        The consecutive whole ages of the rows of table.
+
+    table: ndarray
+        The multipliers, (ages, stats).
+    """
+
+    def __init__(self, stats, ages, table):
+        """
+        Parameters
+        ----------
+        stats: list-like
+            The stats the curve adjusts.
+
+        ages: array-like
+            Consecutive whole ages, one per row of table.
+
+        table: array-like
+            The multipliers, (ages, stats).
+        """
+        self.stats = pd.Index(stats)
+        self.ages = np.asarray(ages, dtype=np.int64)
+        self.table = np.asarray(table, dtype=float)
+        if self.table.shape != (len(self.ages), len(self.stats)):
+            raise ValueError('table must have shape (ages, stats), not {}'.format(self.table.shape))
+        if len(self.ages) and (np.diff(self.ages) != 1).any():
+            raise ValueError('ages must be consecutive whole ages')
+        self._tables = {}
+
+    def multipliers(self, age, stats):
+        """
+        Returns an array (len(age), len(stats)) of the multipliers for each age and stat.
+        """
+        table, missing = self._lookup(stats)
+        age = np.asarray(age, dtype=float)
+        unknown = np.isnan(age)
+        x = np.clip(np.where(unknown, self.ages[0], age) - self.ages[0], 0, len(self.ages) - 1)
+        lower = x.astype(np.intp)
+        out = table[lower]
+        frac = x - lower
+        if frac.any():
+            upper = np.minimum(lower + 1, len(self.ages) - 1)
+            out += frac[:, None] * (table[upper] - out)
+        if unknown.any():
+            out[unknown] = missing
+        return out
+
+    def apply(self, values, age, stats):
+        """
+        Returns values, an array (players, stats), aged by the curve. age is each row's age.
+        """
+        return values * self.multipliers(age, stats)
+
+    def to_frame(self):
+        """
+        Returns the table as a DataFrame indexed by age.
+        """
+        return pd.DataFrame(self.table, index=pd.Index(self.ages, name='Age'), columns=self.stats)
+
+    def _lookup(self, stats):
+        """
+        Returns the table with a column for every stat in stats, those the curve doesn't adjust
+        being 1, and the row used for a missing age. Cached by stats.
+        """
+        key = tuple(stats)
+        if key not in self._tables:
+            columns = self.stats.get_indexer(key)
+            table = np.ones((len(self.ages), len(key)))
+            table[:, columns >= 0] = self.table[:, columns[columns >= 0]]
+            self._tables[key] = (table, np.where(columns >= 0, np.nan, 1.0))
+        return self._tables[key]
+
+
+class MarcelCurve(AgingCurve):
+    """
+    Tango's Marcel aging curve: good stats are multiplied by 1 + adj and bad stats by 1 - adj,
+    where adj is .006*(29 - age) below 29 and .003*(29 - age) from 29 on.
+    """
+
+    def __init__(self, good_stats, bad_stats, min_age=0, max_age=100):
+        """
+        Parameters
+        ----------
+        good_stats, bad_stats: list-like
+            The stats that are better or worse when bigger, e.g. MarcelForecaster.hit_good_stats
+            and hit_bad_stats.
+
+        min_age, max_age: int (default = 0, 100)
+            The range of ages in the table.
+        """
+        ages = np.arange(min_age, max_age + 1)
+        adj = marcel_adjustment(ages)[:, None]
+        table = np.hstack([np.repeat(1 + adj, len(good_stats), axis=1),
+                           np.repeat(1 - adj, len(bad_stats), axis=1)])
+        super().__init__(list(good_stats) + list(bad_stats), ages, table)
+
+
+class DeltaMethodCurve(AgingCurve):
+    """
+    Aging curves fitted separately for every stat with the delta method.
+
+    Each pair of consecutive seasons of a player, at ages a and a + 1, gives the change in each
+    stat's rate per unit of playing time, weighted by the harmonic mean of the two seasons'
+    playing time. The multiplier at age a is the weighted ratio of the rates at a + 1 to the
+    rates at a, so it is the change expected over the next season, as in Marcel. Ages with few
+    pairs are regressed toward no change.
+    """
+
+    @classmethod
+    def fit(cls, data, stats, playing_time, ages=None, regress=1000, min_age=None, max_age=None):
+        """
+        Returns a DeltaMethodCurve fitted from player seasons.
+
+        Parameters
+        ----------
+        data: DataFrame or csv
+            Player seasons with playerid, Season, playing_time and the stats, e.g.
+            MarcelForecaster.hitters or HITTER_AGES. Several rows of a player's season (e.g.
+            one per team) are added together.
+
+        stats: list-like
+            The stats to fit, counted per unit of playing_time.
+
+        playing_time: str
+            The stat the rates are per, e.g. 'PA' or 'IP'.
+
+        ages: DataFrame, csv or None (default = None)
+            Player seasons with playerid, Season and Age (e.g. HITTER_AGES), used for the ages
+            of data. If None, data must have Age.
+
+        regress: numeric (default = 1000)
+            The playing time of no change added to every age's pairs.
+
+        min_age, max_age: int or None (default = None)
+            The range of ages in the table. If None, the range of ages with pairs.
+        """
+        if not isinstance(data, pd.DataFrame):
+            data = read_csv(data)
+        stats = list(stats)
+        seasons = data[['playerid', 'Season', playing_time] + stats].groupby(['playerid', 'Season']).sum()
+        if ages is None:
+            age = data.groupby(['playerid', 'Season'])['Age'].max()
+        else:
+            if not isinstance(ages, pd.DataFrame):
+                ages = read_csv(ages)
+            age = ages.groupby(['playerid', 'Season'])['Age'].max()
+        age = age.reindex(seasons.index).to_numpy(dtype=float)
+
+        player = seasons.index.get_level_values('playerid').to_numpy()
+        season = seasons.index.get_level_values('Season').to_numpy()
+        pt = seasons[playing_time].to_numpy(dtype=float)
+        counts = seasons[stats].to_numpy(dtype=float)
+        #seasons are sorted by player and season, so a pair is a row and the one after it.
+        pair = ((player[1:] == player[:-1]) & (season[1:] == season[:-1] + 1)
+                & (pt[1:] > 0) & (pt[:-1] > 0) & ~np.isnan(age[:-1]))
+        first = np.flatnonzero(pair)
+        second = first + 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = counts / pt[:, None]
+        weight = 2 / (1 / pt[first] + 1 / pt[second])
+
+        at = np.floor(age[first]).astype(np.int64)
+        low = at.min() if min_age is None else min_age
+        high = at.max() if max_age is None else max_age
+        keep = (at >= low) & (at <= high)
+        at, first, second, weight = at[keep] - low, first[keep], second[keep], weight[keep]
+        before = np.zeros((high - low + 1, len(stats)))
+        after = np.zeros((high - low + 1, len(stats)))
+        np.add.at(before, at, np.nan_to_num(rates[first]) * weight[:, None])
+        np.add.at(after, at, np.nan_to_num(rates[second]) * weight[:, None])
+
+        #regressed toward each stat's league rate, unchanged.
+        league = np.nansum(counts, axis=0) / np.nansum(pt)
+        before += regress * league
+        after += regress * league
+        with np.errstate(divide='ignore', invalid='ignore'):
+            table = np.where(before > 0, after / before, 1.0)
+        return cls(stats, np.arange(low, high + 1), table)
@@ -0,0 +1,208 @@
+"""
+Backtesting for Marcel projections.
+
+Each target season is projected from the seasons before it and compared with what the players
+actually did. Target seasons are independent of each other, so they are fanned out to a
+process pool. The player-season table is copied into shared memory once; every worker reads
+that copy instead of receiving its own pickled DataFrame.
+
+WARNING: The directory structure in phi_baseball is not final. File locations may change.
+
+Classes
+-------
+
+SharedFrame
+    A DataFrame copied into a block of shared memory, which worker processes can view read-only.
+
+Functions
+---------
+
+backtest_hitters(forecaster, seasons)
+    Returns RMSE and MAE by stat for hitter Marcels over the given seasons.
+
+backtest_pitchers(forecaster, seasons)
+    Returns RMSE and MAE by stat for pitcher Marcels over the given seasons.
+
+"""
+
+import copy
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+
+class SharedFrame:
+    """
+    A DataFrame copied once into a block of shared memory.
+
+    Numeric columns are stored as they are. Other columns (Name, Team, etc.) are stored as
+    categorical codes and their categories are kept in spec, which is small and can be pickled.
+    Worker processes rebuild a read-only view of the frame with SharedFrame.attach(spec).
+
+    Attributes
+    ----------
+    spec: tuple
+        The shared memory block's name, the number of rows, and the layout of each column.
+    """
+
+    def __init__(self, df):
+        columns = []
+        arrays = []
+        offset = 0
+        for col in df.columns:
+            values = df[col].to_numpy()
+            categories = None
+            if values.dtype.kind not in 'biuf':
+                values, categories = pd.factorize(df[col])
+            columns.append((col, values.dtype.str, offset, categories))
+            arrays.append(values)
+            offset += -(-values.nbytes // 8) * 8 #keep every column 8 byte aligned.
+        self._shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for (col, dtype, start, categories), values in zip(columns, arrays):
+            np.ndarray(values.shape, dtype=dtype, buffer=self._shm.buf, offset=start)[:] = values
+        self.spec = (self._shm.name, len(df), columns)
+
+    @staticmethod
+    def attach(spec):
+        """
+        Returns the shared memory block and a read-only DataFrame viewing it.
+
+        The caller must keep a reference to the shared memory block for as long as the
+        DataFrame is in use.
+        """
+        name, length, columns = spec
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError: #track was added in python 3.13.
+            shm = shared_memory.SharedMemory(name=name)
+        data = {}
+        for col, dtype, start, categories in columns:
+            values = np.ndarray((length,), dtype=dtype, buffer=shm.buf, offset=start)
+            values.flags.writeable = False
+            if categories is not None:
+                values = pd.Categorical.from_codes(values, categories)
+            data[col] = values
+        return shm, pd.DataFrame(data, copy=False)
+
+    def close(self):
+        """
+        Releases the shared memory block. Views attached to it must no longer be used.
+        """
+        self._shm.close()
+        self._shm.unlink()
+
+
+def backtest_hitters(forecaster, seasons, stats=None, min_playing_time=0, by_season=False, max_workers=None):
+    """
+    Returns the errors of hitter Marcels against actual performance.
+
+    Parameters
+    ----------
+    forecaster: MarcelForecaster
+        The forecaster to test. Its hitter data must contain the target seasons and the three
+        seasons before each of them. It is not modified.
+
+    seasons: list-like of int
+        The target seasons to project and compare.
+
+    stats: list-like or None (default = None)
+        The stats to score. If None, forecaster.hitter_stat_cols.
+
+    min_playing_time: numeric (default = 0)
+        Only players with at least this many actual PA in the target season are scored.
+
+    by_season: bool (default = False)
+        If True, the report is indexed by (Season, stat) instead of stat.
+
+    max_workers: int or None (default = None)
+        The number of worker processes; None uses every core. If 1, runs in this process.
+
+    Returns
+    -------
+    A DataFrame indexed by stat with columns N (players scored), RMSE and MAE.
+    """
+    return _backtest(forecaster, 'hitters', seasons, stats, min_playing_time, by_season, max_workers)
+
+
+def backtest_pitchers(forecaster, seasons, stats=None, min_playing_time=0, by_season=False, max_workers=None):
+    """
+    Returns the errors of pitcher Marcels against actual performance.
+
+    Identical to backtest_hitters, except that stats defaults to forecaster.pitcher_stat_cols
+    and min_playing_time is in IP.
+    """
+    return _backtest(forecaster, 'pitchers', seasons, stats, min_playing_time, by_season, max_workers)
+
+
+_worker = {}
+
+
+def _init_worker(forecaster, kind, spec):
+    """
+    Pool initializer. Attaches the shared player-season table to the worker's forecaster.
+    """
+    shm, data = SharedFrame.attach(spec)
+    setattr(forecaster, kind, data)
+    _worker.update(forecaster=forecaster, kind=kind, shm=shm)
+
+
+def _worker_errors(season, stats, min_playing_time):
+    return _season_errors(_worker['forecaster'], _worker['kind'], season, stats, min_playing_time)
+
+
+def _season_errors(forecaster, kind, season, stats, min_playing_time):
+    """
+    Returns a DataFrame, indexed by stat, with the count, sum of squared errors and sum of
+    absolute errors of the projections for season.
+    """
+    if kind == 'hitters':
+        projected = forecaster.project_hitters(season)
+        playing_time = 'PA'
+    else:
+        projected = forecaster.project_pitchers(season)
+        playing_time = 'IP'
+    data = getattr(forecaster, kind)
+    actual = data[data['Season'] == season]
+    columns = list(stats) + [playing_time]*(playing_time not in stats)
+    actual = actual[columns].groupby(actual['playerid']).sum()
+    actual = actual[actual[playing_time] >= min_playing_time]
+    players = projected.index.intersection(actual.index)
+    errors = projected.loc[players, stats].to_numpy(float) - actual.loc[players, stats].to_numpy(float)
+    return pd.DataFrame({'N': np.isfinite(errors).sum(axis=0),
+                         'SSE': np.nansum(errors**2, axis=0),
+                         'SAE': np.nansum(np.abs(errors), axis=0)},
+                        index=pd.Index(stats, name='stat'))
+
+
+def _backtest(forecaster, kind, seasons, stats, min_playing_time, by_season, max_workers):
+    seasons = list(seasons)
+    if stats is None:
+        stats = forecaster.hitter_stat_cols if kind == 'hitters' else forecaster.pitcher_stat_cols
+    stats = list(stats)
+
+    if max_workers == 1:
+        parts = [_season_errors(forecaster, kind, s, stats, min_playing_time) for s in seasons]
+    else:
+        #the workers get a forecaster without data; the table reaches them through shared memory.
+        #nor its cached stores and league means, which the workers rebuild from the shared table.
+        stub = copy.copy(forecaster)
+        stub._cache = {}
+        stub.hitters = forecaster.hitters.iloc[:0]
+        stub.pitchers = forecaster.pitchers.iloc[:0]
+        shared = SharedFrame(getattr(forecaster, kind))
+        try:
+            with ProcessPoolExecutor(max_workers, initializer=_init_worker,
+                                     initargs=(stub, kind, shared.spec)) as pool:
+                parts = list(pool.map(_worker_errors, seasons, repeat(stats), repeat(min_playing_time)))
+        finally:
+            shared.close()
+
+    totals = pd.concat(parts, keys=seasons, names=['Season'])
+    if not by_season:
+        totals = totals.groupby(level='stat', sort=False).sum()
+    return pd.DataFrame({'N': totals['N'],
+                         'RMSE': np.sqrt(totals['SSE']/totals['N']),
+                         'MAE': totals['SAE']/totals['N']})
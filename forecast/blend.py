@@ -0,0 +1,204 @@
+"""
+Consensus projections from several projection systems (Marcel, Steamer, ZiPS, ...).
+
+Every system is aligned on playerid into one array of shape (systems, players, stats).
+Counting stats are turned into rates per unit of playing time (PA for hitters, IP for
+pitchers), the rates are averaged with per-system and per-stat weights, and the result is
+scaled by a separately blended playing time. A system that doesn't project a player, or
+doesn't have a stat, is left out of that average rather than counted as zero. Rate stats
+are then recomputed from the blended counting stats with MarcelForecaster.set_hitter_rates
+and set_pitcher_rates.
+Variance columns (e.g. HR_var from Marcel) are split into the Poisson variation of the count,
+its mean, and the variance of its rate. The rate variances are combined as the variance of the
+weighted average of the rates, and scaled to the blended playing time.
+
+WARNING: The directory structure in phi_baseball is not final. File locations may change.
+
+Functions
+---------
+
+blend_hitters(projections)
+    Returns a consensus hitter projection from several systems.
+
+blend_pitchers(projections)
+    Returns a consensus pitcher projection from several systems.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .datacache import read_csv
+    from .marcel import MarcelForecaster
+    from .store import normalize_ids
+except ImportError: #imported from inside forecast/, as the notebooks do.
+    from datacache import read_csv
+    from marcel import MarcelForecaster
+    from store import normalize_ids
+
+HITTER_RATE_STATS = ['AVG', 'OBP', 'SLG', 'OPS', 'wOBA', 'wRC+', 'ADP']
+PITCHER_RATE_STATS = ['ERA', 'FIP', 'WHIP', 'K/9', 'BB/9', 'ADP']
+#numeric columns that describe the player rather than project him; taken from the first system that has him.
+INFO_COLS = ['playerid', 'Season', 'Age', 'reliability']
+
+
+def blend_hitters(projections, weights=None, stat_weights=None, playing_time_weights=None,
+                  rename=None, rate_stats=HITTER_RATE_STATS):
+    """
+    Returns a consensus hitter projection from several projection systems.
+
+    Parameters
+    ----------
+    projections: dict
+        Maps each system's name to its projections: a csv or a DataFrame with one row per
+        player, either indexed by playerid or with a playerid column (e.g. the output of
+        MarcelForecaster.project_hitters). Must have PA.
+
+    weights: dict or None (default = None)
+        Maps system names to weights. Systems that aren't included get weight 1.
+
+    stat_weights: dict or None (default = None)
+        Maps a stat to a dict of system weights that replace weights for that stat, e.g.
+        {'SB': {'steamer': 2, 'zips': 1, 'marcel': 0}}.
+
+    playing_time_weights: dict or None (default = None)
+        System weights for PA. If None, weights. Use e.g. {'steamer': 1, 'zips': 0,
+        'marcel': 0} to take playing time from a single source.
+
+    rename: dict or None (default = None)
+        Maps system names to a dict renaming that system's columns to the shared names,
+        e.g. {'marcel': {'K': 'SO'}}.
+
+    rate_stats: list-like (default = HITTER_RATE_STATS)
+        Numeric columns that are averaged as they are instead of per PA. AVG, OBP, SLG and
+        OPS are then recomputed from the counting stats where possible.
+
+    Returns
+    -------
+    A DataFrame indexed by playerid, with a row for every player in any system.
+    """
+    out = _blend(projections, 'PA', weights, stat_weights, playing_time_weights, rename, rate_stats)
+    MarcelForecaster.set_hitter_rates(out)
+    return out
+
+
+def blend_pitchers(projections, weights=None, stat_weights=None, playing_time_weights=None,
+                   rename=None, rate_stats=PITCHER_RATE_STATS):
+    """
+    Returns a consensus pitcher projection from several projection systems.
+
+    Identical to blend_hitters, except that playing time is IP and ERA, FIP, K/9, BB/9 and
+    WHIP are recomputed with MarcelForecaster.set_pitcher_rates.
+    """
+    out = _blend(projections, 'IP', weights, stat_weights, playing_time_weights, rename, rate_stats)
+    MarcelForecaster.set_pitcher_rates(out)
+    return out
+
+
+def _align(projections, rename):
+    """
+    Returns a dict of each system's projections indexed by playerid with harmonized column names.
+    """
+    rename = rename or {}
+    frames = {}
+    for name, df in projections.items():
+        if not isinstance(df, pd.DataFrame):
+            df = read_csv(df)
+        df = df.rename(columns=rename.get(name, {}))
+        if 'playerid' in df.columns:
+            df = df.set_index('playerid', drop=False)
+        df.index = normalize_ids(df.index)
+        #the blank divider columns in Fangraphs exports ("-1") hold no values.
+        frames[name] = df.loc[~df.index.duplicated(), df.notna().any()]
+    return frames
+
+
+def _system_weights(systems, stats, weights, stat_weights):
+    """
+    Returns an array (systems, stats) of weights.
+    """
+    weights = weights or {}
+    out = np.array([[weights.get(s, 1.0)] * len(stats) for s in systems], dtype=float)
+    for j, stat in enumerate(stats):
+        if stat in (stat_weights or {}):
+            out[:, j] = [stat_weights[stat].get(s, 0.0) for s in systems]
+    return out
+
+
+def _weighted_average(values, weights):
+    """
+    Returns the average over the first axis of values, weighted by weights and skipping NaN.
+    """
+    present = ~np.isnan(values)
+    total = (weights * present).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(present, values * weights, 0).sum(axis=0) / total
+
+
+def _weighted_variance(variances, counts, playing_time, weights):
+    """
+    Returns the variance, per unit of playing time squared, of the weighted average over the
+    first axis of the rates counts / playing_time, skipping NaN as _weighted_average does.
+
+    A count's variance is taken to be its mean, the Poisson variation of the season, plus
+    playing_time squared times the variance of its rate, as Marcel's is. Systems that project
+    a count without its variance are taken to be as uncertain as those that have one.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        present = ~np.isnan(counts) & (playing_time > 0)
+        rate_var = np.maximum(variances - counts, 0) / playing_time**2
+        known = present & ~np.isnan(rate_var)
+        mean = np.where(known, rate_var * weights, 0).sum(axis=0) / (weights * known).sum(axis=0)
+        rate_var = np.where(known, rate_var, mean)
+        total = (weights * present).sum(axis=0)
+        return np.where(present, rate_var * weights**2, 0).sum(axis=0) / total**2
+
+
+def _blend(projections, playing_time, weights, stat_weights, playing_time_weights, rename, rate_stats):
+    frames = _align(projections, rename)
+    systems = list(frames)
+    players = pd.Index(np.concatenate([df.index.to_numpy() for df in frames.values()])).unique()
+
+    numeric = [col for df in frames.values() for col in df.select_dtypes('number').columns]
+    numeric = pd.Index(numeric).unique().drop(INFO_COLS + [playing_time], errors='ignore')
+    rates = [col for col in numeric if col in rate_stats]
+    variances = [col for col in numeric if col.endswith('_var') and col not in rates]
+    counts = [col for col in numeric if col not in rate_stats and col not in variances]
+    #a variance is blended with its count; one without a count is dropped.
+    variances = [col for col in variances if col[:-len('_var')] in counts]
+    stats = [playing_time] + counts + rates
+
+    #one (systems, players, stats) array; missing players and stats are NaN.
+    cube = np.stack([df.reindex(index=players, columns=stats).to_numpy(dtype=float) for df in frames.values()])
+    pt = cube[:, :, :1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_pt = np.where(pt > 0, cube[:, :, 1:1 + len(counts)] / pt, np.nan)
+    values = np.concatenate([pt, per_pt, cube[:, :, 1 + len(counts):]], axis=2)
+
+    w = _system_weights(systems, stats, weights, stat_weights)
+    if playing_time_weights is not None:
+        w[:, 0] = _system_weights(systems, [playing_time], playing_time_weights, None)[:, 0]
+    blended = _weighted_average(values, w[:, None, :])
+    blended[:, 1:1 + len(counts)] *= blended[:, :1]
+
+    #names, teams, seasons and ages come from the first system that projects the player.
+    info = None
+    columns = []
+    for df in frames.values():
+        cols = [col for col in df.columns if col not in numeric and col not in (playing_time, 'playerid')]
+        columns += [col for col in cols if col not in columns]
+        part = df[cols].reindex(players)
+        info = part if info is None else info.combine_first(part)
+    info = info[columns]
+
+    out = pd.DataFrame(blended, index=players, columns=stats)
+    if variances:
+        #a stat's variance is blended with the weights of that stat.
+        j = [stats.index(x[:-len('_var')]) for x in variances]
+        var = np.stack([df.reindex(index=players, columns=variances).to_numpy(dtype=float) for df in frames.values()])
+        rate_var = _weighted_variance(var, cube[:, :, j], pt, w[:, None, j])
+        out[variances] = blended[:, j] + rate_var * blended[:, :1]**2
+    out = pd.concat([info, out], axis=1)
+    out.insert(0, 'playerid', players)
+    return out
@@ -0,0 +1,164 @@
+"""
+Cached loading of the csv files used by phi_baseball.
+
+The first time a csv is read it is parsed, typed and written to a Feather (Arrow IPC) file in a
+cache directory next to it. Later reads memory-map the Feather file instead of parsing the csv.
+The cache is rebuilt automatically when the csv changes: a changed modification time triggers a
+hash of the csv, and the cache is only rebuilt if the contents differ.
+
+Caching requires pyarrow. Without it, read_csv parses the csv on every call.
+
+WARNING: The directory structure in phi_baseball is not final. File locations may change.
+
+Functions
+---------
+
+read_csv(path)
+    Returns a typed DataFrame of the csv at path, from the cache when the cache is current.
+
+clear_cache(path)
+    Deletes the cache files for the csv at path.
+
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+CACHE_DIR = '.cache'
+_FORMAT_VERSION = 2 #increment when _parse changes, so that old caches are rebuilt.
+
+
+def read_csv(path, columns=None, cache_dir=None):
+    """
+    Returns a DataFrame of the csv at path.
+
+    Compared with pd.read_csv, column names are stripped of byte order marks and whitespace,
+    'Season' is integer and 'playerid' is integer when every id is numeric. Other columns are
+    typed as pd.read_csv types them.
+
+    Parameters
+    ----------
+    path: str
+        The csv file.
+
+    columns: list-like or None (default = None)
+        The columns to return. If None, returns all columns.
+
+    cache_dir: str or None (default = None)
+        Where cache files are kept. If None, a directory named CACHE_DIR next to the csv. csvs
+        with the same name in different directories can share one.
+    """
+    if feather is None:
+        return _select(_parse(path), columns)
+    cache_path, meta_path = _cache_paths(path, cache_dir)
+    stat = os.stat(path)
+    if _is_current(path, stat, cache_path, meta_path):
+        return feather.read_table(cache_path, columns=columns, memory_map=True).to_pandas()
+    df = _parse(path)
+    try:
+        _write(df, cache_path, meta_path, path, stat)
+    except OSError: #an unwritable cache directory shouldn't stop the read.
+        pass
+    return _select(df, columns)
+
+
+def clear_cache(path, cache_dir=None):
+    """
+    Deletes the cache files for the csv at path, if there are any.
+    """
+    for cache_file in _cache_paths(path, cache_dir):
+        if os.path.exists(cache_file):
+            os.remove(cache_file)
+
+
+def _select(df, columns):
+    if columns is None:
+        return df
+    return df[list(columns)]
+
+
+def _cache_paths(path, cache_dir):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR)
+    path = os.path.abspath(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    #the hash of the full path keeps csvs with the same name apart in a shared cache_dir.
+    key = hashlib.blake2b(path.encode(), digest_size=8).hexdigest()
+    cache_path = os.path.join(cache_dir, '{}-{}.feather'.format(stem, key))
+    return cache_path, cache_path + '.json'
+
+
+def _file_hash(path):
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _is_current(path, stat, cache_path, meta_path):
+    """
+    Returns True if the cache for path exists and matches the csv.
+    """
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if meta.get('version') != _FORMAT_VERSION or not os.path.exists(cache_path):
+        return False
+    if meta['mtime_ns'] == stat.st_mtime_ns and meta['size'] == stat.st_size:
+        return True
+    if meta['size'] != stat.st_size or meta['hash'] != _file_hash(path):
+        return False
+    #touched but unchanged; remember the new mtime so the next read skips hashing.
+    meta['mtime_ns'] = stat.st_mtime_ns
+    try:
+        _write_json(meta, meta_path)
+    except OSError:
+        pass
+    return True
+
+
+def _write(df, cache_path, meta_path, path, stat):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temp = cache_path + '.tmp'
+    #uncompressed, so that reads can memory-map the file.
+    feather.write_feather(df, temp, compression='uncompressed')
+    os.replace(temp, cache_path)
+    _write_json({'version': _FORMAT_VERSION, 'mtime_ns': stat.st_mtime_ns,
+                 'size': stat.st_size, 'hash': _file_hash(path)}, meta_path)
+
+
+def _write_json(meta, meta_path):
+    temp = meta_path + '.tmp'
+    with open(temp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(temp, meta_path)
+
+
+def _parse(path):
+    """
+    Returns the csv at path as a DataFrame with cleaned column names and types.
+    """
+    try:
+        df = pd.read_csv(path, encoding='utf-8-sig')
+    except UnicodeDecodeError: #id_map.csv, for one, isn't utf-8.
+        df = pd.read_csv(path, encoding='latin-1')
+    df.columns = [str(x).strip().lstrip('\ufeff').strip('"') for x in df.columns]
+    if 'Season' in df.columns and df['Season'].notna().all():
+        df['Season'] = df['Season'].astype(np.int64)
+    if 'playerid' in df.columns:
+        ids = pd.to_numeric(df['playerid'], errors='coerce')
+        if ids.notna().all() and (ids % 1 == 0).all():
+            df['playerid'] = ids.astype(np.int64)
+    return df.reset_index(drop=True)
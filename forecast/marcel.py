@@ -15,11 +15,31 @@ MarcelForecaster
 
 """
 
+import warnings
 
+import numpy as np
 import pandas as pd
 
+try:
+    from .aging import DeltaMethodCurve, MarcelCurve
+    from .datacache import read_csv
+    from .profiling import Instrumented
+    from .statcast import STATCAST_HITTERS, StatcastEstimator
+    from .store import PlayerSeasonStore, normalize_ids
+    from .streaming import SeasonAccumulator, read_chunks
+except ImportError: #imported from inside forecast/, as the notebooks do.
+    from aging import DeltaMethodCurve, MarcelCurve
+    from datacache import read_csv
+    from profiling import Instrumented
+    from statcast import STATCAST_HITTERS, StatcastEstimator
+    from store import PlayerSeasonStore, normalize_ids
+    from streaming import SeasonAccumulator, read_chunks
 
-class MarcelForecaster:
+#the rate stats set_hitter_rates and set_pitcher_rates compute from counts; they get no variance.
+RATE_STATS = ['AVG', 'SLG', 'OBP', 'OPS', 'ERA', 'FIP', 'K/9', 'BB/9', 'WHIP']
+
+
+class MarcelForecaster(Instrumented):
     """
     Creates Marcel Forecasts for baseball players. 
     
@@ -38,6 +58,21 @@ class MarcelForecaster:
     pitcher_stat_cols: list_like
         The labels of the numeric columsn (besides playerid and Season) which
         are forcast in the system. Extracted from pitchers by default.
+
+    hitter_aging: AgingCurve or None
+        The aging curve applied to hitter projections. If None (the default), Tango's Marcel
+        curve built from hit_good_stats and hit_bad_stats. Set with set_hitter_aging.
+
+    pitcher_aging: AgingCurve or None
+        The aging curve applied to pitcher projections. See hitter_aging.
+
+    hitter_statcast: StatcastEstimator or None
+        If set, its Statcast estimates are blended into hitter projections after aging. None
+        (the default) leaves projections as Marcel's. Set with set_hitter_statcast.
+
+    hook: callable or None
+        If set, called with a forecast.profiling.StepRecord after every Marcel step with its
+        wall time and rows. None (the default) disables the instrumentation. See profile.
         
     Class Attributes
     ----------------
@@ -63,6 +98,30 @@ class MarcelForecaster:
         
     project_hitters(season)
         Creates a set of hitter Marcels from self.hitters for the given season.
+
+    project_pitchers_range(seasons)
+        Creates pitcher Marcels for several seasons at once.
+
+    project_hitters_range(seasons)
+        Creates hitter Marcels for several seasons at once.
+
+    project_pitchers_streaming(source, season)
+        Creates pitcher Marcels from data read in chunks, for data too large for memory.
+
+    project_hitters_streaming(source, season)
+        Creates hitter Marcels from data read in chunks, for data too large for memory.
+
+    set_hitter_aging(curve)
+        Sets the aging curve of hitter projections: Marcel's, fitted or any AgingCurve.
+
+    set_pitcher_aging(curve)
+        Sets the aging curve of pitcher projections.
+
+    set_hitter_statcast(estimator)
+        Blends Statcast estimates of power (HR, 2B) into hitter projections.
+
+    profile()
+        Context manager that times every Marcel step run inside it; see forecast.profiling.
     
     """
     default_hitter = pd.Series( {'Season': 2018.1666666666667,
@@ -115,7 +174,7 @@ class MarcelForecaster:
                                      'playerid': 11982.895321932285}
                                 )
 
-    def __init__(self,pitcher_data,hitter_data, as_pandas = False):
+    def __init__(self,pitcher_data,hitter_data, as_pandas = False, dtype = np.float64):
         """
         Parameters
         ----------
@@ -151,16 +210,21 @@ class MarcelForecaster:
               
         as_pandas: bool
             If true, the constructor treats pitcher_data and hitter data as Pandas DataFrames. If false,
-            the data is assumed to be a csv file and pd.read_csv will be called on pitcher data and hitter data.
+            the data is assumed to be a csv file and is read with datacache.read_csv, which keeps a
+            typed columnar copy of each csv so that later constructions don't parse it again.
 
+        dtype: numpy dtype (default = np.float64)
+            The dtype of the stat matrices the vectorized engine projects from. np.float32
+            halves their memory at the cost of precision.
 
         """
+        self._cache = {}
         if as_pandas:
             self.pitchers = pitcher_data
             self.hitters = hitter_data
         else:
-            self.pitchers = pd.read_csv(pitcher_data)
-            self.hitters = pd.read_csv(hitter_data)
+            self.pitchers = read_csv(pitcher_data)
+            self.hitters = read_csv(hitter_data)
             
         self.hitter_stat_cols = ( 
             self.hitters
@@ -179,19 +243,48 @@ class MarcelForecaster:
         self.pitcher_stat_cols = self.pitcher_stat_cols.drop(
             [x for x in ['Season','playerid','Age'] if x in self.pitcher_stat_cols])
 
+        self.dtype = dtype
         self._init_hitter_cols = self.hitters.columns#used to return columns in their original order.
         self._init_pitchers_cols = self.pitchers.columns#used to return columns in their original order.
         
+        self.hitter_aging = None
+        self.pitcher_aging = None
+        self.hitter_statcast = None
         self.set_bad_hitting_stats(['SO','CS','GDP','SH'])
         ##['W', 'L', 'ERA', 'G', 'GS', 'CG', 'ShO', 'SV', 'HLD', 'BS', 'IP', 'TBF',
         ##'H', 'R', 'ER', 'HR', 'BB', 'IBB', 'HBP', 'WP', 'BK', 'SO', 'FIP',
         ##'K/9', 'BB/9']
         self.set_bad_pitching_stats(['BB','IBB','HBP','ER','R','HR','H','L'])
         
+    @property
+    def hitters(self):
+        if self._hitters_chunks:
+            self._merge_chunks('hitters')
+        return self._hitters
+
+    @hitters.setter
+    def hitters(self, data):
+        self._hitters = data
+        self._hitters_chunks = []
+
+    @property
+    def pitchers(self):
+        if self._pitchers_chunks:
+            self._merge_chunks('pitchers')
+        return self._pitchers
+
+    @pitchers.setter
+    def pitchers(self, data):
+        self._pitchers = data
+        self._pitchers_chunks = []
+
     def add_hitter_data(self,data, as_pandas = False):
         """
         Adds additional data to the hitter data. Useful if you have separate files for each
         relevant year, position, team, etc.
+
+        The data is buffered and merged into self.hitters the next time it is used, all added
+        chunks at once, so adding many files costs about the same as loading them together.
         
         Parameters
         ----------
@@ -203,13 +296,16 @@ class MarcelForecaster:
             Whether to handle the input data as a DataFrame (if True) or csv (if False.)
         """
         if not as_pandas:
-            data = pd.read_csv(data)
-        self.hitters = pd.concat(self.hitters, data)
+            data = read_csv(data)
+        self._hitters_chunks.append(data)
         
     def add_pitcher_data(self,data, as_pandas = False):
         """
-        Adds additional data to the hitter data. Useful if you have separate files for each
+        Adds additional data to the pitcher data. Useful if you have separate files for each
         relevant year, position, team, etc.
+
+        The data is buffered and merged into self.pitchers the next time it is used, all added
+        chunks at once, so adding many files costs about the same as loading them together.
         
         Parameters
         ----------
@@ -221,8 +317,8 @@ class MarcelForecaster:
             Whether to handle the input data as a DataFrame (if True) or csv (if False.)
         """
         if not as_pandas:
-            data = pd.read_csv(data)
-        self.pitchers = pd.concat(self.pitchers, data)
+            data = read_csv(data)
+        self._pitchers_chunks.append(data)
         
     def pitcher_mean_from_data(self,stat):
         ''' 
@@ -253,12 +349,7 @@ class MarcelForecaster:
         if use_default:
             return self.default_hitter
         else:
-            grouped = self.hitters.groupby('Season')
-            s1 = grouped.get_group(season-1).mean()*5
-            s2 = grouped.get_group(season-2).mean()*4
-            s3 = grouped.get_group(season-3).mean()*3
-            out = (s1 + s2 + s3)/12
-            return out
+            return self._weighted_mean(self._season_aggregates(self.hitters), season)
     
     def expected_mean_pitcher(self,season, use_default = False):
         """
@@ -277,13 +368,23 @@ class MarcelForecaster:
         if use_default:
             return self.default_pitcher
         else:
-            grouped = self.pitchers.groupby('Season')
-            s1 = grouped.get_group(season-1).mean()*5
-            s2 = grouped.get_group(season-2).mean()*4
-            s3 = grouped.get_group(season-3).mean()*3
-            out = (s1 + s2 + s3)/12
-            return out
+            return self._weighted_mean(self._season_aggregates(self.pitchers), season)
     
+    @staticmethod
+    def _weighted_mean(aggregates, season):
+        """
+        Private method.
+
+        Returns the 5/4/3 weighted mean of the numeric columns over the three seasons before
+        season, from the per-season sums and counts returned by _season_aggregates.
+        """
+        sums, counts = aggregates
+        s1 = sums.loc[season-1]/counts.loc[season-1]*5
+        s2 = sums.loc[season-2]/counts.loc[season-2]*4
+        s3 = sums.loc[season-3]/counts.loc[season-3]*3
+        out = (s1 + s2 + s3)/12
+        return out
+
     @staticmethod
     def set_hitter_rates(df):
         """
@@ -385,9 +486,12 @@ class MarcelForecaster:
         row[self.pitcher_stat_cols] = row[self.pitcher_stat_cols]*scaling
         return row
     
-    def project_hitters(self, season, use_default = False, apply_age = True, ids=None):
+    def project_hitters(self, season, use_default = False, apply_age = True, ids=None, engine='vectorized'):
         """
         Return a dataframe of the hitters' Marcel forecasts.
+
+        Besides the projected stats, every projection has its Marcel reliability, weighted PA /
+        (weighted PA + 1200), and a variance column (e.g. HR_var) for every counting stat but PA.
         
         Parameters
         ----------
@@ -402,28 +506,395 @@ class MarcelForecaster:
         apply_age: bool (default = True)
             Whether to apply an aging curve. Useful if a data set doesn't include ages. 
         
-        ids: None or list-like (default = True)
-            A list of playerids specifying which project. If None, all hitters will be projected. 
+        ids: None or list-like (default = None)
+            A list of playerids specifying which project. If None, all hitters will be projected.
+            Only the listed players' rows are read, through a playerid index, and the league
+            means still come from all hitters, so a player's projection doesn't depend on which
+            others are requested.
+
+        engine: 'vectorized' or 'apply' (default = 'vectorized')
+            How the Marcel steps are computed. 'vectorized' does each step as whole-column
+            operations and index-aligned joins; 'apply' is the original row-by-row implementation,
+            which is much slower but kept as a reference. Both return the same projections.
+        """
+        if engine not in ('vectorized', 'apply'):
+            raise ValueError("engine must be 'vectorized' or 'apply', not {!r}".format(engine))
+        with self._step('project_hitters', len(self.hitters)):
+            if engine == 'vectorized':
+                return self._project_hitters_vectorized([season], use_default, apply_age, ids).droplevel('Season')
+            return self._project_hitters_apply(season, use_default, apply_age, ids)
+
+    def project_pitchers(self, season, use_default = False, apply_age=True, ids=None, engine='vectorized'):
         """
-        if ids:
-            all_hitters = self.hitters
-            self.hitters = self.hitters[self.hitters['playerid'].isin(ids)]
-        df = self._hit_step1(season)
+        Returns a DataFrame of the pitchers' Marcel Forcasts.
+
+        As in project_hitters, every projection has a reliability, from weighted TBF, and a
+        variance column for every counting stat but TBF.
+        
+        Parameters
+        ----------
         
-        #step 2
-        mean_guy = self.expected_mean_hitter(season, use_default = use_default)
-        mean_guy = mean_guy.divide(mean_guy['PA'])*1200
+        season: int
+            The season for which a projection will be calculated.
+
+        use_default: bool (default = False)
+            If True, uses self.default_pitcher as the expected mean performance for regression. 
+            If False, calculates the expected mean performance from the data.
+
+        apply_age: bool (default = True)
+            Whether to apply the aging curve step. Useful if data doesn't include ages.
+
+        ids: None or list-like (default = None)
+            A list of ids to project. If None, all pitchers in self.pitchers are projected.
+            See project_hitters.
+
+        engine: 'vectorized' or 'apply' (default = 'vectorized')
+            How the Marcel steps are computed. See project_hitters.
+        """
+        if engine not in ('vectorized', 'apply'):
+            raise ValueError("engine must be 'vectorized' or 'apply', not {!r}".format(engine))
+        with self._step('project_pitchers', len(self.pitchers)):
+            if engine == 'vectorized':
+                return self._project_pitchers_vectorized([season], use_default, apply_age, ids).droplevel('Season')
+            return self._project_pitchers_apply(season, use_default, apply_age, ids)
+
+    def project_hitters_range(self, seasons, use_default = False, apply_age = True, ids=None):
+        """
+        Returns a DataFrame of the hitters' Marcel forecasts for several seasons.
+
+        The result is the same as calling project_hitters for each season and concatenating,
+        but the data is partitioned by season once and the weighted sums, league means and
+        proratings for every season are computed together. Useful for backtesting.
+
+        Parameters
+        ----------
+
+        seasons: list-like of int
+            The seasons for which projections will be calculated. Each season must have
+            data for the three seasons before it.
+
+        use_default, apply_age, ids:
+            See project_hitters.
+
+        Returns
+        -------
+        A DataFrame indexed by (playerid, Season) with a row for each player projected in each season.
+        """
+        with self._step('project_hitters_range', len(self.hitters)):
+            return self._project_hitters_vectorized(seasons, use_default, apply_age, ids)
+
+    def project_pitchers_range(self, seasons, use_default = False, apply_age = True, ids=None):
+        """
+        Returns a DataFrame of the pitchers' Marcel forecasts for several seasons.
+
+        See project_hitters_range.
+
+        Parameters
+        ----------
+
+        seasons: list-like of int
+            The seasons for which projections will be calculated. Each season must have
+            data for the three seasons before it.
+
+        use_default, apply_age, ids:
+            See project_pitchers.
+
+        Returns
+        -------
+        A DataFrame indexed by (playerid, Season) with a row for each player projected in each season.
+        """
+        with self._step('project_pitchers_range', len(self.pitchers)):
+            return self._project_pitchers_vectorized(seasons, use_default, apply_age, ids)
+
+    def project_hitters_streaming(self, source, season, chunksize = 100_000, batch_size = 10_000,
+                                  use_default = False, apply_age = True):
+        """
+        Yields DataFrames of hitter Marcel forecasts computed from data read in chunks.
+
+        Only the weighted sums of the three seasons before season, the prorated playing time,
+        league totals and the rows of the current chunk are held in memory, so the input can
+        be much larger than memory (e.g. minor league or split data). self.hitters is not used,
+        except to define the stat columns, which the chunks must share; a forecaster built
+        from the first rows of the input is enough.
+
+        Parameters
+        ----------
+        source: csv, DataFrame or iterable of DataFrames
+            The hitter data, in any order. A csv is read chunksize rows at a time.
+
+        season: int
+            The season for which projections will be calculated.
+
+        chunksize: int (default = 100,000)
+            The rows read from a csv at a time.
+
+        batch_size: int (default = 10,000)
+            The most projections in each yielded DataFrame.
+
+        use_default, apply_age:
+            See project_hitters.
+
+        Returns
+        -------
+        A generator of DataFrames indexed by playerid, like project_hitters, each with at most
+        batch_size rows.
+        """
+        totals = SeasonAccumulator(season, self.hitter_stat_cols, (5,4,3), 'PA')
+        for chunk in read_chunks(source, chunksize):
+            with self._step('accumulate', len(chunk)):
+                totals.add(chunk)
+        (index, values, others), league, playing_time, careers = totals.totals()
+        mean_guy = self._mean_guys(league, pd.Index([season]), self.default_hitter if use_default else None)
+        for start in range(0, len(index), batch_size):
+            rows = slice(start, start + batch_size)
+            batch = (index[rows], values[rows], {col: x[rows] for col, x in others.items()})
+            yield self._finish_hitters(batch, mean_guy, playing_time[rows], apply_age).droplevel('Season')
+
+    def project_pitchers_streaming(self, source, season, chunksize = 100_000, batch_size = 10_000,
+                                   use_default = False, apply_age = True):
+        """
+        Yields DataFrames of pitcher Marcel forecasts computed from data read in chunks.
+
+        See project_hitters_streaming. Each pitcher's career GS and G are also kept, for the
+        prorating step.
+        """
+        totals = SeasonAccumulator(season, self.pitcher_stat_cols, (3,2,1), 'IP', careers=['GS','G'])
+        for chunk in read_chunks(source, chunksize):
+            with self._step('accumulate', len(chunk)):
+                totals.add(chunk)
+        (index, values, others), league, playing_time, careers = totals.totals()
+        mean_guy = self._mean_guys(league, pd.Index([season]), self.default_pitcher if use_default else None)
+        starter = careers[:, 0]/careers[:, 1]
+        for start in range(0, len(index), batch_size):
+            rows = slice(start, start + batch_size)
+            batch = (index[rows], values[rows], {col: x[rows] for col, x in others.items()})
+            yield self._finish_pitchers(batch, mean_guy, playing_time[rows], starter[rows], apply_age).droplevel('Season')
+
+    def _project_hitters_vectorized(self, seasons, use_default, apply_age, ids=None):
+        """
+        Private method.
+
+        Runs the five Marcel steps as array operations for every season in seasons, returning
+        a DataFrame indexed by (playerid, Season). If ids is given, only those players' rows
+        are read, through the store's playerid index; league means still come from all hitters.
+        self.hitters is not modified.
+        """
+        seasons = pd.Index(seasons).unique()
+        stats = self.hitter_stat_cols
+        with self._step('store', len(self.hitters)):
+            store = self._cached(self.hitters, 'store', lambda x: PlayerSeasonStore(x, stats, self.dtype))
+            rows = self._player_rows(store, ids)
+        with self._step('step1_weighted_sums', len(store.season) if rows is None else len(rows)):
+            totals = self._weighted_totals(store, seasons, (5,4,3), rows)
+        with self._step('step2_league_mean', len(self.hitters)):
+            if use_default:
+                mean_guy = self._mean_guys(None, seasons, self.default_hitter)
+            else:
+                mean_guy = self._cached(self.hitters, ('mean_guys', tuple(seasons)),
+                                        lambda x: self._mean_guys(self._season_aggregates(x), seasons))
+        with self._step('step4_playing_time', len(totals[0])):
+            playing_time = self._prorated_playing_time(store, totals[0], seasons, 'PA', rows)
+        return self._finish_hitters(totals, mean_guy, playing_time, apply_age)
+
+    def _project_pitchers_vectorized(self, seasons, use_default, apply_age, ids=None):
+        """
+        Private method.
+
+        Runs the five Marcel steps as array operations for every season in seasons, returning
+        a DataFrame indexed by (playerid, Season). See _project_hitters_vectorized.
+        """
+        seasons = pd.Index(seasons).unique()
+        stats = self.pitcher_stat_cols
+        with self._step('store', len(self.pitchers)):
+            store = self._cached(self.pitchers, 'store', lambda x: PlayerSeasonStore(x, stats, self.dtype))
+            rows = self._player_rows(store, ids)
+        with self._step('step1_weighted_sums', len(store.season) if rows is None else len(rows)):
+            totals = self._weighted_totals(store, seasons, (3,2,1), rows)
+        with self._step('step2_league_mean', len(self.pitchers)):
+            if use_default:
+                mean_guy = self._mean_guys(None, seasons, self.default_pitcher)
+            else:
+                mean_guy = self._cached(self.pitchers, ('mean_guys', tuple(seasons)),
+                                        lambda x: self._mean_guys(self._season_aggregates(x), seasons))
+        with self._step('step4_playing_time', len(totals[0])):
+            playing_time = self._prorated_playing_time(store, totals[0], seasons, 'IP', rows)
+            careers = store.career_sums(['GS','G'], rows)
+            starter = (careers[:, 0]/careers[:, 1])[store.players.get_indexer(totals[0].get_level_values('playerid'))]
+        return self._finish_pitchers(totals, mean_guy, playing_time, starter, apply_age)
+
+    @staticmethod
+    def _player_rows(store, ids):
+        """
+        Private method.
+
+        Returns the store rows of the players in ids, or None (every row) if ids is None.
+        Warns if none of ids are in the store.
+        """
+        if ids is None:
+            return None
+        players = np.unique(store.player_codes(ids))
+        players = players[players >= 0]
+        if not len(players) and len(ids):
+            warnings.warn('none of the {} ids are in the data'.format(len(ids)), stacklevel=4)
+        return store.player_rows(players)
+
+    def _finish_hitters(self, totals, mean_guy, playing_time, apply_age):
+        """
+        Private method.
+
+        Runs steps 2 to 5 of the hitter Marcel on totals, the step 1 weighted totals returned
+        by _weighted_totals. mean_guy is indexed by season and playing_time is .5/.1 prorated
+        PA aligned with totals. Returns the projections in the columns of the hitter data,
+        followed by their reliability and variances.
+        """
+        index, values, others = totals
+        stats = self.hitter_stat_cols
+        target = index.get_level_values('Season')
+        weighted = values[:, stats.get_loc('PA')]
+
+        with self._step('step3_regression', len(index)):
+            #step 2
+            means = mean_guy[stats].to_numpy() / mean_guy['PA'].to_numpy()[:, None] * 1200
+
+            #step 3
+            values = values + means[mean_guy.index.get_indexer(target)]
+
+        #step 4
+        with self._step('step4_prorating', len(index)):
+            playing_time = playing_time + 200
+            values = values / values[:, [stats.get_loc('PA')]] * playing_time[:, None]
+
+        #step 5
+        if apply_age:
+            with self._step('step5_aging', len(index)):
+                values = self._hitter_curve.apply(values, others['Age'], stats)
+
+        if self.hitter_statcast is not None:
+            with self._step('step6_statcast', len(index)):
+                values = self.hitter_statcast.apply(values, index.get_level_values('playerid'), target, stats)
+
+        with self._step('rates', len(index)):
+            columns = self._columns(index, values, stats, others)
+            self.set_hitter_rates(columns)
+        with self._step('uncertainty', len(index)):
+            columns.update(self._uncertainty(values, weighted, stats, 'PA'))
+        with self._step('frame', len(index)):
+            return self._frame(columns, index, self._init_hitter_cols)
+
+    def _finish_pitchers(self, totals, mean_guy, playing_time, starter, apply_age):
+        """
+        Private method.
+
+        Runs steps 2 to 5 of the pitcher Marcel on totals, as _finish_hitters. starter is each
+        pitcher's career GS/G, aligned with totals.
+        """
+        index, values, others = totals
+        stats = self.pitcher_stat_cols
+        target = index.get_level_values('Season')
+        weighted = values[:, stats.get_loc('TBF')]
+        with self._step('step3_regression', len(index)):
+            #step 2
+            means = mean_guy[stats].to_numpy() / mean_guy['TBF'].to_numpy()[:, None] * 1200
+            #step 3
+            values = values + means[mean_guy.index.get_indexer(target)]
+        #step 4
+        with self._step('step4_prorating', len(index)):
+            playing_time = playing_time + starter * 60 + (1 - starter)*25
+            values = values / values[:, [stats.get_loc('IP')]] * playing_time[:, None]
+        #step 5
+        if apply_age:
+            with self._step('step5_aging', len(index)):
+                values = self._pitcher_curve.apply(values, others['Age'], stats)
+
+        with self._step('rates', len(index)):
+            columns = self._columns(index, values, stats, others)
+            self.set_pitcher_rates(columns)
+        with self._step('uncertainty', len(index)):
+            columns.update(self._uncertainty(values, weighted, stats, 'TBF'))
+        with self._step('frame', len(index)):
+            return self._frame(columns, index, self._init_pitchers_cols)
+
+    @staticmethod
+    def _uncertainty(values, weighted, stats, playing_time):
+        """
+        Private method.
+
+        Returns a dict of the reliability of each projection and the variance of each projected
+        count but playing_time, from the projected values and weighted, the step 1 weighted
+        playing_time (PA or TBF) the projections are based on.
+
+        Reliability is Marcel's weighted / (weighted + 1200). A stat's variance treats it as a
+        Poisson count whose rate is known from weighted plus the 1200 league average PA (TBF)
+        of step 3: a projection x over n PA has variance x * (1 + n / (weighted + 1200)), the
+        chance variation of the season plus the uncertainty of the rate.
+        """
+        regressed = weighted + 1200
+        out = {'reliability': weighted / regressed}
+        spread = 1 + values[:, stats.get_loc(playing_time)] / regressed
+        for j, stat in enumerate(stats):
+            if stat != playing_time and stat not in RATE_STATS:
+                out[stat + '_var'] = values[:, j] * spread
+        return out
+
+    @staticmethod
+    def _columns(index, values, stats, others):
+        """
+        Private method.
+
+        Returns a dict of column arrays from projected stat values and the other columns.
+        set_hitter_rates and set_pitcher_rates work on it as on a DataFrame.
+        """
+        columns = {stat: values[:, j] for j, stat in enumerate(stats)}
+        columns.update(others)
+        columns['playerid'] = index.get_level_values('playerid').to_numpy()
+        columns['Season'] = index.get_level_values('Season').to_numpy()
+        return columns
+
+    @staticmethod
+    def _frame(columns, index, init_cols):
+        """
+        Private method.
+
+        Returns a DataFrame of columns in the order of init_cols, followed by any rate columns
+        the data didn't have, built in one step.
+        """
+        order = list(init_cols) + [x for x in columns if x not in init_cols]
+        return pd.DataFrame({x: columns[x] for x in order}, index=index)
+
+    def _project_hitters_apply(self, season, use_default, apply_age, ids):
+        """
+        Private method.
+
+        The original, row-by-row implementation of project_hitters.
+        """
+        #step 2; league means come from every hitter, whichever are projected.
+        with self._step('step2_league_mean', len(self.hitters)):
+            mean_guy = self.expected_mean_hitter(season, use_default = use_default)
+            mean_guy = mean_guy.divide(mean_guy['PA'])*1200
+
+        all_hitters = self.hitters
+        if ids is not None:
+            self.hitters = all_hitters[normalize_ids(pd.Index(all_hitters['playerid'])).isin(normalize_ids(pd.Index(ids)))]
+        try:
+            with self._step('step1_weighted_sums', len(self.hitters)):
+                df = self._hit_step1(season)
+                weighted = df['PA'].to_numpy(dtype=float)
+            with self._step('step4_playing_time', len(self.hitters)):
+                prorating = self._hit_step4_prorating(season)
+        finally:
+            self.hitters = all_hitters
         
         #step 3
-        df[self.hitter_stat_cols] = (
-            df[self.hitter_stat_cols]
-            .apply(lambda x: x + mean_guy[self.hitter_stat_cols], axis = 1)
-        )
+        with self._step('step3_regression', len(df)):
+            df[self.hitter_stat_cols] = (
+                df[self.hitter_stat_cols]
+                .apply(lambda x: x + mean_guy[self.hitter_stat_cols], axis = 1)
+            )
         
         #step 4
-        prorating = self._hit_step4_prorating(season)
-        df[self.hitter_stat_cols] = df[self.hitter_stat_cols].apply(lambda x: x/x['PA'], axis =1)
-        df[self.hitter_stat_cols] = df[self.hitter_stat_cols].apply(lambda x: x*prorating.loc[x.name]['PA'], axis = 1)
+        with self._step('step4_prorating', len(df)):
+            df[self.hitter_stat_cols] = df[self.hitter_stat_cols].apply(lambda x: x/x['PA'], axis =1)
+            df[self.hitter_stat_cols] = df[self.hitter_stat_cols].apply(lambda x: x*prorating.loc[x.name]['PA'], axis = 1)
         
         #step 5
         ## I honestly don't understand this part of Marcel.
@@ -433,57 +904,72 @@ class MarcelForecaster:
         ## to everything except PA and AB. I think the ideas is that you multiply by 1 + ageAdj
         ## or 1 - ageAdj (if the stat is "bad", e.g., striking out.)
         if apply_age:
-            df = df.apply(self._hit_step5, axis=1)
+            with self._step('step5_aging', len(df)):
+                if self.hitter_aging is None:
+                    df = df.apply(self._hit_step5, axis=1)
+                else:
+                    df[self.hitter_stat_cols] = self.hitter_aging.apply(
+                        df[self.hitter_stat_cols].to_numpy(dtype=float), df['Age'], self.hitter_stat_cols)
         
         df['Season'] = season
         df = df[self._init_hitter_cols]
-        self.set_hitter_rates(df)
+        if self.hitter_statcast is not None:
+            with self._step('step6_statcast', len(df)):
+                stats = self.hitter_stat_cols
+                df[stats] = self.hitter_statcast.apply(df[stats].to_numpy(dtype=float), df['playerid'], season, stats)
+        with self._step('rates', len(df)):
+            self.set_hitter_rates(df)
+        with self._step('uncertainty', len(df)):
+            stats = self.hitter_stat_cols
+            uncertainty = self._uncertainty(df[stats].to_numpy(dtype=float), weighted, stats, 'PA')
+            df = pd.concat([df, pd.DataFrame(uncertainty, index=df.index)], axis=1)
         
         return df
     
-    def project_pitchers(self, season, use_default = False, apply_age=True, ids=None):
+    def _project_pitchers_apply(self, season, use_default, apply_age, ids):
         """
-        Returns a DataFrame of the pitchers' Marcel Forcasts.
-        
-        Parameters
-        ----------
-        
-        season: int
-            The season for which a projection will be calculated.
-
-        use_default: bool (default = False)
-            If True, uses self.default_pitcher as the expected mean performance for regression. 
-            If False, calculates the expected mean performance from the data.
-
-        apply_age: bool (default = True)
-            Whether to apply the aging curve step. Useful if data doesn't include ages.
+        Private method.
 
-        ids: None or list-like (default = None)
-            A list of ids to project. If None, all pitchers in self.pitchers are projected.
+        The original, row-by-row implementation of project_pitchers.
         """
-        if ids:
-            all_pitchers = self.pitchers
-            self.pitchers = self.pitchers[self.pitchers['playerid'].isin(ids)]
-        df = self._pit_step1(season).copy()
-        #step 2
-        mean_guy = self.expected_mean_pitcher(season, use_default = use_default)
-        mean_guy = mean_guy.divide(mean_guy['TBF'])*1200
+        #step 2; league means come from every pitcher, whichever are projected.
+        with self._step('step2_league_mean', len(self.pitchers)):
+            mean_guy = self.expected_mean_pitcher(season, use_default = use_default)
+            mean_guy = mean_guy.divide(mean_guy['TBF'])*1200
+        all_pitchers = self.pitchers
+        if ids is not None:
+            self.pitchers = all_pitchers[normalize_ids(pd.Index(all_pitchers['playerid'])).isin(normalize_ids(pd.Index(ids)))]
+        try:
+            with self._step('step1_weighted_sums', len(self.pitchers)):
+                df = self._pit_step1(season).copy()
+                weighted = df['TBF'].to_numpy(dtype=float)
+            with self._step('step4_playing_time', len(self.pitchers)):
+                prorating = self._pit_step4_prorating(season)
+        finally:
+            self.pitchers = all_pitchers
         #step 3
         stats = self.pitcher_stat_cols
-        df[stats] = df[stats].apply(lambda x: x + mean_guy[stats], axis = 1)
+        with self._step('step3_regression', len(df)):
+            df[stats] = df[stats].apply(lambda x: x + mean_guy[stats], axis = 1)
         #step 4
-        prorating = self._pit_step4_prorating(season)
-        df[stats] = df[stats].apply(lambda x: x/x['IP'], axis = 1)
-        df[stats] = df[stats].apply(lambda x: x*prorating.loc[x.name]['IP'], axis=1)
+        with self._step('step4_prorating', len(df)):
+            df[stats] = df[stats].apply(lambda x: x/x['IP'], axis = 1)
+            df[stats] = df[stats].apply(lambda x: x*prorating.loc[x.name]['IP'], axis=1)
         #step 5
         if apply_age:
-            df = df.apply(self._pit_step5, axis =1)
+            with self._step('step5_aging', len(df)):
+                if self.pitcher_aging is None:
+                    df = df.apply(self._pit_step5, axis =1)
+                else:
+                    df[stats] = self.pitcher_aging.apply(df[stats].to_numpy(dtype=float), df['Age'], stats)
 
         df['Season'] = season
         df = df[self._init_pitchers_cols]
-        self.set_pitcher_rates(df)
-        if ids:
-            self.pitchers = all_pitchers
+        with self._step('rates', len(df)):
+            self.set_pitcher_rates(df)
+        with self._step('uncertainty', len(df)):
+            uncertainty = self._uncertainty(df[stats].to_numpy(dtype=float), weighted, stats, 'TBF')
+            df = pd.concat([df, pd.DataFrame(uncertainty, index=df.index)], axis=1)
 
         return df
     
@@ -497,6 +983,7 @@ class MarcelForecaster:
         """
         self.hit_bad_stats = [x for x in bad_stats if x in self.hitter_stat_cols]
         self.hit_good_stats = [x for x in self.hitter_stat_cols if x not in self.hit_bad_stats + ['PA','AB']]
+        self._hitter_marcel_curve = MarcelCurve(self.hit_good_stats, self.hit_bad_stats)
 
     def set_bad_pitching_stats(self, bad_stats):
         """
@@ -508,7 +995,224 @@ class MarcelForecaster:
         """
         self.pit_bad_stats = [x for x in bad_stats if x in self.pitcher_stat_cols]
         self.pit_good_stats = [x for x in self.pitcher_stat_cols if x not in self.pit_bad_stats + ['TBF','IP']]
+        self._pitcher_marcel_curve = MarcelCurve(self.pit_good_stats, self.pit_bad_stats)
+
+    def set_hitter_aging(self, curve = 'marcel', ages = None, regress = 1000):
+        """
+        Sets the aging curve applied to hitter projections.
+
+        Parameters
+        ----------
+        curve: 'marcel', 'delta' or AgingCurve (default = 'marcel')
+            'marcel' is Tango's curve for hit_good_stats and hit_bad_stats. 'delta' fits a
+            curve for every stat in hit_good_stats and hit_bad_stats from self.hitters with
+            the delta method (see forecast.aging.DeltaMethodCurve). An AgingCurve is used as
+            it is; stats it doesn't include aren't aged.
+
+        ages: DataFrame, csv or None (default = None)
+            For 'delta', player seasons with playerid, Season and Age used for the ages of
+            self.hitters, e.g. forecast.aging.HITTER_AGES. If None, self.hitters['Age'].
+
+        regress: numeric (default = 1000)
+            For 'delta', the PA of no change added to every age.
+        """
+        self.hitter_aging = self._aging_curve(curve, self.hitters, self.hit_good_stats + self.hit_bad_stats,
+                                              'PA', ages, regress)
+
+    def set_pitcher_aging(self, curve = 'marcel', ages = None, regress = 1000):
+        """
+        Sets the aging curve applied to pitcher projections. See set_hitter_aging; 'delta'
+        fits rates per IP from self.pitchers, e.g. with forecast.aging.PITCHER_AGES as ages.
+        """
+        self.pitcher_aging = self._aging_curve(curve, self.pitchers, self.pit_good_stats + self.pit_bad_stats,
+                                               'IP', ages, regress)
+
+    def set_hitter_statcast(self, estimator = 'fit', statcast = STATCAST_HITTERS, stats = ('HR', '2B'),
+                            weight = .5, regress = 300):
+        """
+        Sets the Statcast estimates blended into hitter projections.
+
+        Parameters
+        ----------
+        estimator: 'fit', StatcastEstimator or None (default = 'fit')
+            'fit' fits a forecast.statcast.StatcastEstimator of stats from self.hitters and
+            statcast; each season is projected with the seasons before it only. A
+            StatcastEstimator is used as it is. None turns the blend off.
+
+        statcast: DataFrame or csv (default = forecast.statcast.STATCAST_HITTERS)
+            For 'fit', the Statcast season aggregates.
+
+        stats: list-like (default = ('HR', '2B'))
+            For 'fit', the stats estimated; rate stats like ISO and SLG follow from them.
+
+        weight, regress: numeric (default = .5, 300)
+            For 'fit', the largest blend weight and the batted-ball events that halve it.
+        """
+        if isinstance(estimator, str) and estimator == 'fit':
+            estimator = StatcastEstimator.fit(self.hitters, statcast, [x for x in stats if x in self.hitter_stat_cols],
+                                              weight = weight, regress = regress)
+        elif isinstance(estimator, str):
+            raise ValueError("estimator must be 'fit', a StatcastEstimator or None, not {!r}".format(estimator))
+        self.hitter_statcast = estimator
+
+    @staticmethod
+    def _aging_curve(curve, data, stats, playing_time, ages, regress):
+        """
+        Private method.
+
+        Returns the AgingCurve for set_hitter_aging and set_pitcher_aging (None for Marcel's).
+        """
+        if isinstance(curve, str) and curve == 'marcel':
+            return None
+        elif isinstance(curve, str) and curve == 'delta':
+            return DeltaMethodCurve.fit(data, stats, playing_time, ages = ages, regress = regress)
+        elif isinstance(curve, str):
+            raise ValueError("curve must be 'marcel', 'delta' or an AgingCurve, not {!r}".format(curve))
+        return curve
+
+    @property
+    def _hitter_curve(self):
+        return self._hitter_marcel_curve if self.hitter_aging is None else self.hitter_aging
+
+    @property
+    def _pitcher_curve(self):
+        return self._pitcher_marcel_curve if self.pitcher_aging is None else self.pitcher_aging
         
+    def _cached(self, data, name, build):
+        """
+        Private method.
+
+        Returns build(data), computed once for self.hitters and self.pitchers and kept until
+        they are replaced or added to; other data (e.g. a subset of ids) is built every time.
+        """
+        for kind in ('hitters', 'pitchers'):
+            if data is getattr(self, kind):
+                cached = self._cache.get((kind, name))
+                if cached is None or cached[0] is not data:
+                    cached = self._cache[(kind, name)] = (data, build(data))
+                return cached[1]
+        return build(data)
+
+    def _clear_cache(self, kind):
+        """
+        Private method.
+
+        Drops everything cached for kind ('hitters' or 'pitchers').
+        """
+        for key in [key for key in self._cache if key[0] == kind]:
+            del self._cache[key]
+
+    def _merge_chunks(self, kind):
+        """
+        Private method.
+
+        Concatenates the chunks buffered by add_hitter_data or add_pitcher_data onto kind
+        ('hitters' or 'pitchers') in one copy. Cached season aggregates are kept, and only the
+        seasons the new rows are in are recomputed.
+        """
+        chunks = getattr(self, '_' + kind + '_chunks')
+        data = pd.concat([getattr(self, '_' + kind)] + chunks, ignore_index=True)
+        touched = pd.unique(np.concatenate([chunk['Season'].to_numpy() for chunk in chunks]))
+        cached = self._cache.get((kind, 'season_aggregates'))
+        setattr(self, kind, data)
+        self._clear_cache(kind)
+        if cached is not None:
+            sums, counts = cached[1]
+            new_sums, new_counts = self._aggregate(data[data['Season'].isin(touched)])
+            sums = pd.concat([sums.drop(touched, errors='ignore'), new_sums]).sort_index()
+            counts = pd.concat([counts.drop(touched, errors='ignore'), new_counts]).sort_index()
+            self._cache[(kind, 'season_aggregates')] = (data, (sums, counts))
+
+    def _season_aggregates(self, data):
+        """
+        Private method.
+
+        Returns a tuple of DataFrames (sums, counts), indexed by season, of the sum and number
+        of non-missing values of every numeric column of data in each season. League means
+        for any season are then a few divisions, instead of a groupby over all of data.
+        """
+        return self._cached(data, 'season_aggregates', self._aggregate)
+
+    @staticmethod
+    def _aggregate(data):
+        sums, counts = {}, {}
+        for season, group in data.groupby('Season'):
+            numeric = group.select_dtypes('number')
+            sums[season] = numeric.sum()
+            counts[season] = numeric.count()
+        return pd.DataFrame(sums).T, pd.DataFrame(counts).T
+
+    @staticmethod
+    def _weighted_totals(store, seasons, weights, rows=None):
+        """
+        Private method.
+
+        Returns the weighted cummulative stats in store for the seasons before each season in
+        seasons. weights[0] is applied to the season before, weights[1] to two seasons before
+        and so on. This is step 1 of Marcel done for many seasons at once.
+
+        Stats are summed; other columns are returned as their max. If rows is given, only those
+        rows of store are read.
+
+        Returns
+        -------
+        A tuple (index, values, others): a (playerid, Season) MultiIndex in sorted order, an
+        array (rows, stats) of the weighted sums, and a dict of the other columns' arrays.
+        """
+        players, sums, others = [], [], {x: [] for x in store.others}
+        targets = []
+        for season in seasons:
+            p, x, o = store.weighted_sums(season, weights, rows)
+            players.append(p)
+            sums.append(x)
+            targets.append(np.full(len(p), season))
+            for col in others:
+                others[col].append(o[col])
+        players = np.concatenate(players)
+        targets = np.concatenate(targets)
+        #player codes follow playerid order, so this sorts by (playerid, Season).
+        order = np.lexsort((targets, players)) if len(seasons) > 1 else slice(None)
+        index = pd.MultiIndex(levels=[store.players, seasons], codes=[players[order], seasons.get_indexer(targets[order])],
+                              names=['playerid','Season'], verify_integrity=False)
+        values = np.concatenate(sums)[order]
+        others = {col: store.labels(col, np.concatenate(codes)[order]) for col, codes in others.items()}
+        return index, values, others
+
+    @staticmethod
+    def _mean_guys(aggregates, seasons, default=None):
+        """
+        Private method.
+
+        Returns a DataFrame, indexed by season, of the 5/4/3 weighted mean of the numeric
+        columns for each season in seasons, from the per-season sums and counts returned by
+        _season_aggregates. If default is given, it is used for every season.
+        """
+        if default is not None:
+            return pd.DataFrame([default]*len(seasons), index=seasons)
+        sums, counts = aggregates
+        def means(lag):
+            at = sums.index.get_indexer(seasons - lag)
+            if (at < 0).any():
+                raise KeyError('no data for season {}'.format((seasons - lag)[at < 0][0]))
+            return sums.to_numpy()[at]/counts.to_numpy()[at]
+        return pd.DataFrame((means(1)*5 + means(2)*4 + means(3)*3)/12, index=seasons, columns=sums.columns)
+
+    @staticmethod
+    def _prorated_playing_time(store, index, seasons, stat, rows=None):
+        """
+        Private method.
+
+        Returns an array, aligned with index, of .5 times stat in the season before plus .1
+        times stat two seasons before. If rows is given, only those rows of store are read.
+        """
+        players = store.players.get_indexer(index.get_level_values('playerid'))
+        target = index.get_level_values('Season').to_numpy()
+        out = np.zeros(len(index))
+        for season in seasons:
+            this = target == season
+            out[this] = store.weighted_stat(season, stat, (.5, .1), rows)[players[this]]
+        return out
+
     def _pit_step1(self,season):
         """
         Private method. 
@@ -0,0 +1,216 @@
+"""
+Opt-in timing of the named steps of MarcelForecaster and StatCalculator.
+
+Instrumented classes mark their steps with `with self._step(name, rows):`. While the object's
+hook is None (the default) a step is a shared no-op context, so the instrumentation can stay in
+production code. When a hook is set it is called with a StepRecord after every step, giving
+the step's wall time, the rows it processed and, if tracemalloc is tracing, the peak memory it
+allocated. Steps nest: a projection's record comes after the records of the steps inside it.
+
+    forecaster = MarcelForecaster(pitchers, hitters)
+    with forecaster.profile() as profiler:
+        forecaster.project_hitters(2020)
+    print(profiler.summary())
+
+For live runs, set a hook that emits the records, e.g. forecaster.hook = logger_hook(logger).
+
+Nested steps are tracked with a single stack, so profile one thread at a time.
+
+WARNING: The directory structure in phi_baseball is not final. File locations may change.
+
+Classes
+-------
+
+StepRecord
+    The timing of one step.
+
+Profiler
+    A hook that collects StepRecords and summarizes them.
+
+Instrumented
+    Mixin giving a class a hook, profile() and _step().
+
+Functions
+---------
+
+logger_hook(logger)
+    Returns a hook that logs every StepRecord.
+
+"""
+
+import contextlib
+import logging
+import time
+import tracemalloc
+from collections import namedtuple
+
+import pandas as pd
+
+StepRecord = namedtuple('StepRecord', ['owner', 'step', 'seconds', 'rows', 'peak_bytes', 'depth'])
+StepRecord.__doc__ = """
+The timing of one step.
+
+owner is the class of the instrumented object, step the step's name, seconds its wall time,
+rows the rows it processed (or None), peak_bytes the most memory it had allocated at once
+(None unless tracemalloc was tracing) and depth the number of steps it ran inside.
+"""
+
+_NO_STEP = contextlib.nullcontext()
+_stack = []
+
+
+class _Step:
+    """
+    Times one step and passes its StepRecord to a hook.
+    """
+    __slots__ = ('hook', 'owner', 'step', 'rows', 'start', 'memory', 'peak')
+
+    def __init__(self, hook, owner, step, rows):
+        self.hook = hook
+        self.owner = owner
+        self.step = step
+        self.rows = rows
+
+    def __enter__(self):
+        self.memory = None
+        if tracemalloc.is_tracing():
+            if _stack:
+                _stack[-1].peak = max(_stack[-1].peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self.memory = tracemalloc.get_traced_memory()[0]
+            self.peak = self.memory
+        _stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        _stack.pop()
+        peak_bytes = None
+        if self.memory is not None and tracemalloc.is_tracing():
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            peak_bytes = self.peak - self.memory
+            if _stack and _stack[-1].memory is not None:
+                _stack[-1].peak = max(_stack[-1].peak, self.peak)
+        self.hook(StepRecord(self.owner, self.step, seconds, self.rows, peak_bytes, len(_stack)))
+        return False
+
+
+class Profiler:
+    """
+    A hook that collects StepRecords.
+
+    Attributes
+    ----------
+    records: list
+        The StepRecords, in the order the steps finished.
+    """
+
+    def __init__(self, memory = False):
+        """
+        Parameters
+        ----------
+        memory: bool (default = False)
+            If True, tracemalloc traces allocations while the Profiler is used as a context
+            manager, so records have peak_bytes. Tracing slows Python code considerably.
+        """
+        self.memory = memory
+        self.records = []
+        self._started = False
+
+    def __call__(self, record):
+        self.records.append(record)
+
+    def __enter__(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+        return self
+
+    def __exit__(self, *exc):
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+        return False
+
+    def to_frame(self):
+        """
+        Returns the records as a DataFrame, one row per step run.
+        """
+        return pd.DataFrame(self.records, columns = StepRecord._fields)
+
+    def summary(self):
+        """
+        Returns a DataFrame indexed by (owner, step) with each step's calls, total and mean
+        seconds, rows, rows per second and largest peak_bytes, slowest first.
+        """
+        df = self.to_frame()
+        grouped = df.groupby(['owner', 'step'], sort = False)
+        out = grouped.agg(calls = ('seconds', 'size'), seconds = ('seconds', 'sum'), rows = ('rows', 'sum'),
+                          peak_bytes = ('peak_bytes', 'max'), depth = ('depth', 'min'))
+        out['mean_seconds'] = out['seconds'] / out['calls']
+        out['rows_per_s'] = out['rows'].where(out['rows'] > 0) / out['seconds']
+        return out.sort_values('seconds', ascending = False)
+
+
+def logger_hook(logger = None, level = logging.INFO):
+    """
+    Returns a hook that logs every StepRecord to logger (default: the 'phi_baseball.profile' logger).
+    """
+    logger = logger or logging.getLogger('phi_baseball.profile')
+    def hook(record):
+        logger.log(level, '%s.%s %.6f s rows=%s peak_bytes=%s depth=%d', *record)
+    return hook
+
+
+class Instrumented:
+    """
+    Mixin for classes whose steps can be timed.
+
+    Attributes
+    ----------
+    hook: callable or None (default = None)
+        Called with a StepRecord after every step. None disables the instrumentation. Set
+        on an instance, or on the class to instrument every instance.
+    """
+    hook = None
+
+    @contextlib.contextmanager
+    def profile(self, hook = None, memory = False):
+        """
+        Context manager that sets hook for its duration and restores the previous one.
+
+        Parameters
+        ----------
+        hook: callable or None (default = None)
+            Called with each StepRecord. If None, a new Profiler.
+
+        memory: bool (default = False)
+            If hook is None, passed to the Profiler: trace peak memory of every step.
+
+        Yields
+        ------
+        The hook.
+        """
+        previous = self.__dict__.get('hook')
+        hook = Profiler(memory = memory) if hook is None else hook
+        self.hook = hook
+        try:
+            if isinstance(hook, Profiler):
+                with hook:
+                    yield hook
+            else:
+                yield hook
+        finally:
+            if previous is None:
+                del self.hook
+            else:
+                self.hook = previous
+
+    def _step(self, step, rows = None):
+        """
+        Returns a context manager timing step, or a shared no-op context if no hook is set.
+        """
+        if self.hook is None:
+            return _NO_STEP
+        return _Step(self.hook, type(self).__name__, step, rows)
@@ -0,0 +1,264 @@
+"""
+Statcast-informed estimates of hitters' power, blended into Marcel projections.
+
+forecast/stat_cast_notebook.ipynb found that a linear regression on a season's batted-ball
+quality (EV, Barrel%, HardHit%, ...) predicts the next season's home run rate better than the
+previous home run rate does. StatcastEstimator fits that regression for any counting stats
+(by default HR and 2B, which drive ISO), per PA, from the last three seasons of
+data/hitters_statcast_since2016.csv weighted 5/4/3 by batted-ball events, as Marcel weights
+seasons. Its estimates are blended into Marcel's projected rates in proportion to how many
+batted balls they are based on; players without Statcast data keep their Marcel projection.
+Hits are kept as Marcel projects them: a change in 2B, 3B or HR is taken out of 1B, so that
+H = 1B + 2B + 3B + HR still holds and AVG and OBP agree with SLG.
+
+A fitted estimator projects a season only with a regression fitted on the seasons before it,
+so backtests don't see the seasons they project.
+
+The Statcast seasons are held in a dense (player, season, feature) array, so the estimates for
+a whole projection are one index lookup of its playerids, one gather of three seasons and one
+matrix product; there are no merges.
+
+WARNING: The directory structure in phi_baseball is not final. File locations may change.
+
+Classes
+-------
+
+StatcastEstimator
+    Fitted Statcast estimates of per PA rates, and their blend with Marcel projections.
+
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .aging import DATA
+    from .datacache import read_csv
+    from .store import normalize_ids
+except ImportError: #imported from inside forecast/, as the notebooks do.
+    from aging import DATA
+    from datacache import read_csv
+    from store import normalize_ids
+
+STATCAST_HITTERS = os.path.join(DATA, 'hitters_statcast_since2016.csv')
+FEATURES = ['EV', 'maxEV', 'LA', 'Barrel%', 'HardHit%']
+HIT_COMPONENTS = ['1B', '2B', '3B', 'HR']
+
+
+class StatcastEstimator:
+    """
+    Linear estimates of hitters' per PA rates from their batted-ball quality in the three
+    seasons before, blended into Marcel projections.
+
+    A player's blend weight is weight * E / (E + regress), where E is his batted-ball events in
+    those seasons, so the estimate counts for more the more batted balls it is based on.
+
+    Attributes
+    ----------
+    stats: Index
+        The stats estimated, as rates per PA.
+
+    features: list
+        The Statcast columns the estimates are fitted on.
+
+    coef: ndarray or None
+        Regression coefficients, (1 + features, stats), the first row the intercepts, used for
+        every season. None for a fitted estimator, whose coefficients are fitted per projected
+        season; see coefficients.
+
+    players: Index
+        The normalized playerids of the Statcast data.
+
+    seasons: ndarray
+        The consecutive seasons of the Statcast data.
+
+    weight, regress: float
+        The largest blend weight and the events that halve it.
+    """
+
+    def __init__(self, statcast, stats, coef=None, features=FEATURES, weight=.5, regress=300, weights=(5, 4, 3)):
+        """
+        Parameters
+        ----------
+        statcast: DataFrame or csv
+            Statcast season aggregates with playerid, Season, Events and the features, e.g.
+            STATCAST_HITTERS. Percentages may be strings like '9.1%'.
+
+        stats: list-like
+            The stats estimated.
+
+        coef: array-like or None (default = None)
+            The coefficients, (1 + features, stats), of every season. If None, set by fit.
+
+        features: list-like (default = FEATURES)
+            The Statcast columns the coefficients apply to.
+
+        weight: float (default = .5)
+            The blend weight of a player with unlimited batted balls.
+
+        regress: numeric (default = 300)
+            The batted-ball events at which the blend weight is half of weight.
+
+        weights: tuple (default = (5, 4, 3))
+            The weights of the one, two and three seasons before the projected one.
+        """
+        if not isinstance(statcast, pd.DataFrame):
+            statcast = read_csv(statcast)
+        self.stats = pd.Index(stats)
+        self.features = list(features)
+        if coef is not None:
+            coef = np.asarray(coef, dtype=float).reshape(1 + len(self.features), len(self.stats))
+        self.coef = coef
+        self._samples = None
+        self._coefs = {}
+        self.weight = weight
+        self.regress = regress
+        self.weights = np.asarray(weights, dtype=float)
+
+        data = statcast[statcast['Events'] > 0]
+        codes, players = pd.factorize(normalize_ids(pd.Index(data['playerid'])))
+        self.players = pd.Index(players)
+        season = data['Season'].to_numpy(dtype=np.int64)
+        self.seasons = np.arange(season.min(), season.max() + 1)
+        columns = np.column_stack([self._numbers(data[x]) for x in self.features])
+        #the features are stored multiplied by events, so that seasons add up as weighted means.
+        events = data['Events'].to_numpy(dtype=float)
+        known = ~np.isnan(columns).any(axis=1)
+        self._table = np.zeros((len(self.players), len(self.seasons), len(self.features)))
+        self._events = np.zeros((len(self.players), len(self.seasons)))
+        at = (codes[known], season[known] - self.seasons[0])
+        np.add.at(self._table, at, columns[known] * events[known, None])
+        np.add.at(self._events, at, events[known])
+
+    @staticmethod
+    def _numbers(column):
+        if pd.api.types.is_numeric_dtype(column):
+            return column.to_numpy(dtype=float, na_value=np.nan)
+        return pd.to_numeric(column.astype(str).str.rstrip('%'), errors='coerce').to_numpy(dtype=float)
+
+    @classmethod
+    def fit(cls, hitters, statcast=STATCAST_HITTERS, stats=('HR', '2B'), features=FEATURES, min_pa=100,
+            weight=.5, regress=300, weights=(5, 4, 3)):
+        """
+        Returns a StatcastEstimator fitted on the seasons of hitters that have Statcast data
+        in the seasons before.
+
+        Each player season with at least min_pa PA is a sample: its per PA rates regressed on
+        the events-weighted features of the three seasons before it, weighted by its PA. A
+        season is projected with the samples of the seasons before it only.
+
+        Parameters
+        ----------
+        hitters: DataFrame or csv
+            Player seasons with playerid, Season, PA and the stats, e.g.
+            MarcelForecaster.hitters. Several rows of a player's season are added together.
+
+        min_pa: numeric (default = 100)
+            The fewest PA of a season used as a sample.
+
+        The other parameters are those of StatcastEstimator.
+        """
+        if not isinstance(hitters, pd.DataFrame):
+            hitters = read_csv(hitters)
+        stats = list(stats)
+        estimator = cls(statcast, stats, None, features, weight, regress, weights)
+        seasons = hitters[['playerid', 'Season', 'PA'] + stats].groupby(['playerid', 'Season']).sum()
+        seasons = seasons[seasons['PA'] >= min_pa]
+        season = seasons.index.get_level_values('Season').to_numpy()
+        X, events = estimator._lookup(seasons.index.get_level_values('playerid'), season)
+        keep = events > 0
+        if not keep.any():
+            raise ValueError('no seasons of hitters have Statcast data in the seasons before them')
+        pa = seasons['PA'].to_numpy(dtype=float)[keep]
+        y = seasons[stats].to_numpy(dtype=float)[keep] / pa[:, None]
+        estimator._samples = (season[keep], X[keep], y, pa)
+        return estimator
+
+    def coefficients(self, season):
+        """
+        Returns the coefficients used to project season: coef if it is set, otherwise fitted
+        on the samples of the seasons before season, or None if there are none.
+        """
+        if self.coef is not None:
+            return self.coef
+        if season not in self._coefs:
+            sample_season, X, y, pa = self._samples
+            before = sample_season < season
+            coef = None
+            if before.any():
+                X = np.column_stack([np.ones(before.sum()), X[before]])
+                root = np.sqrt(pa[before])[:, None]
+                coef = np.linalg.lstsq(X * root, y[before] * root, rcond=None)[0]
+            self._coefs[season] = coef
+        return self._coefs[season]
+
+    def _lookup(self, playerids, seasons):
+        """
+        Returns the events-weighted features of the three seasons before each player's season,
+        (n, features), and the events they are based on; features are NaN and events 0 for
+        players without Statcast data in those seasons.
+        """
+        codes, uniques = pd.factorize(pd.Index(playerids))
+        players = self.players.get_indexer(normalize_ids(pd.Index(uniques)))
+        players = np.where(codes >= 0, players[codes], -1)
+        seasons = np.broadcast_to(np.asarray(seasons, dtype=np.int64), players.shape)
+        #columns of the one, two and three seasons before, (n, lags).
+        columns = seasons[:, None] - np.arange(1, len(self.weights) + 1) - self.seasons[0]
+        known = (players[:, None] >= 0) & (columns >= 0) & (columns < len(self.seasons))
+        rows = np.where(known, players[:, None], 0)
+        columns = np.where(known, columns, 0)
+        w = self.weights * known
+        events = (self._events[rows, columns] * w).sum(axis=1)
+        sums = np.einsum('nl,nlf->nf', w, self._table[rows, columns])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            X = sums / events[:, None]
+        raw = (self._events[rows, columns] * known).sum(axis=1)
+        return X, np.where(events > 0, raw, 0.0)
+
+    def estimate(self, playerids, seasons):
+        """
+        Returns the estimated per PA rates of the stats for each player in a season,
+        (n, stats), NaN for players without Statcast data in the three seasons before it or
+        seasons without coefficients, and the batted-ball events of those seasons.
+        """
+        X, events = self._lookup(playerids, seasons)
+        seasons = np.broadcast_to(np.asarray(seasons, dtype=np.int64), events.shape)
+        rates = np.full((len(events), len(self.stats)), np.nan)
+        for season in np.unique(seasons):
+            coef = self.coefficients(int(season))
+            if coef is not None:
+                this = seasons == season
+                rates[this] = np.maximum(coef[0] + X[this] @ coef[1:], 0)
+        return rates, events
+
+    def apply(self, values, playerids, seasons, stats):
+        """
+        Returns values, projections (players, stats) with PA among stats, with the estimated
+        stats blended into them. playerids and seasons are those of the projections' rows.
+
+        If stats has 1B, changes to 2B, 3B and HR are taken out of it (down to 0), and H, if
+        stats has it, changes only where 1B couldn't absorb them.
+        """
+        rates, events = self.estimate(playerids, seasons)
+        known = ~np.isnan(rates).any(axis=1)
+        blend = np.where(known & (events > 0), self.weight * events / (events + self.regress), 0.0)
+        columns = stats.get_indexer(self.stats)
+        pa = values[:, stats.get_loc('PA')]
+        values = values.copy()
+        found = columns >= 0
+        marcel = values[:, columns[found]]
+        estimated = np.nan_to_num(rates[:, found] * pa[:, None])
+        change = blend[:, None] * (estimated - marcel)
+        values[:, columns[found]] = marcel + change
+
+        extra = [stat in HIT_COMPONENTS[1:] for stat in self.stats[found]]
+        if '1B' in stats and '1B' not in self.stats and any(extra):
+            singles = values[:, stats.get_loc('1B')]
+            hits = change[:, extra].sum(axis=1)
+            new = np.maximum(singles - hits, 0)
+            if 'H' in stats:
+                values[:, stats.get_loc('H')] += new - (singles - hits)
+            values[:, stats.get_loc('1B')] = new
+        return values
@@ -0,0 +1,230 @@
+"""
+A compact, array-backed table of player seasons for Marcel.
+
+The player-season table is held as one dense stat matrix (rows, stats) sorted by season and
+then player, with the player of each row as an integer code into a sorted index of playerids.
+Every season is a contiguous block of rows, so the Marcel steps read each season as a view
+of the matrix rather than filtering and copying the DataFrame. Text columns (Name, Team)
+are interned as ordered categoricals and stored as codes.
+
+WARNING: The directory structure in phi_baseball is not final. File locations may change.
+
+Classes
+-------
+
+PlayerSeasonStore
+    A player-season table stored as arrays, with the weighted sums and playing time that the
+    Marcel steps need.
+
+Functions
+---------
+
+normalize_ids(ids)
+    Returns playerids as ints where they are numbers, so that 10155 and '10155' match.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class PlayerSeasonStore:
+    """
+    A player-season table stored as a dense stat matrix sorted by (season, player).
+
+    A player can have several rows in a season (e.g. one per team). They are kept as they
+    are and added together when seasons are summed by player.
+
+    Attributes
+    ----------
+    players: Index
+        The sorted playerids. A row's player is a position in this index.
+
+    stats: Index
+        The labels of the columns of values.
+
+    player: ndarray
+        The player code of each row.
+
+    season: ndarray
+        The season of each row, in increasing order.
+
+    values: ndarray
+        The stat matrix, (rows, stats).
+
+    others: dict
+        Maps the remaining columns (Name, Team, Age, ...) to an array per row. Text columns
+        are ordered categorical codes, with the categories in categories.
+
+    categories: dict
+        Maps each text column in others to its sorted categories.
+    """
+
+    def __init__(self, data, stats, dtype=np.float64):
+        """
+        Parameters
+        ----------
+        data: DataFrame
+            The player-season table, with playerid, Season and the stats.
+
+        stats: list-like
+            The numeric columns held in the stat matrix.
+
+        dtype: numpy dtype (default = np.float64)
+            The dtype of the stat matrix. np.float32 halves its memory.
+        """
+        self.stats = pd.Index(stats)
+        self.dtypes = {}
+        self.categories = {}
+        codes, self.players = pd.factorize(data['playerid'], sort=True)
+        season = data['Season'].to_numpy(dtype=np.int64)
+        order = np.lexsort((codes, season))
+        self.player = codes[order]
+        self.season = season[order]
+        self.values = np.ascontiguousarray(data[self.stats].to_numpy(dtype=dtype)[order])
+        self.others = {}
+        for col in data.columns:
+            if col in self.stats or col in ('playerid', 'Season'):
+                continue
+            self.dtypes[col] = data[col].dtype
+            if pd.api.types.is_numeric_dtype(data[col]):
+                self.others[col] = data[col].to_numpy(dtype=float)[order]
+            else:
+                col_codes, self.categories[col] = pd.factorize(data[col], sort=True)
+                self.others[col] = col_codes[order]
+
+        self._has_nan = bool(np.isnan(self.values).any())
+        self._by_player = None
+        self._normalized = None
+        self._label_values = {}
+        self.seasons, self._starts = np.unique(self.season, return_index=True)
+        self._ends = np.append(self._starts[1:], len(self.season))
+
+    def rows(self, season):
+        """
+        Returns the slice of rows for season; an empty slice if the store has no such season.
+        """
+        i = np.searchsorted(self.seasons, season)
+        if i == len(self.seasons) or self.seasons[i] != season:
+            return slice(0, 0)
+        return slice(self._starts[i], self._ends[i])
+
+    def player_codes(self, ids):
+        """
+        Returns an array of the player codes of ids, -1 for ids not in the store. ids and the
+        store's playerids are compared normalized, so 10155 and '10155' are the same player.
+        """
+        if self._normalized is None:
+            self._normalized = normalize_ids(pd.Index(self.players))
+        return self._normalized.get_indexer(normalize_ids(pd.Index(ids)))
+
+    def player_rows(self, players):
+        """
+        Returns an array of the rows of the given player codes.
+
+        The rows of every player are found through an index sorted by player that is built on
+        first use, so this takes time in proportion to the number of rows returned.
+        """
+        if self._by_player is None:
+            order = np.argsort(self.player, kind='stable')
+            self._by_player = (order, np.searchsorted(self.player[order], np.arange(len(self.players) + 1)))
+        order, starts = self._by_player
+        players = np.asarray(players)
+        if not len(players):
+            return np.zeros(0, dtype=np.intp)
+        return np.concatenate([order[starts[p]:starts[p + 1]] for p in players])
+
+    def _season_rows(self, season, rows):
+        """
+        Returns the rows of season: a slice of all of them, or an array of those among rows.
+        """
+        if rows is None:
+            return self.rows(season)
+        return rows[self.season[rows] == season]
+
+    def column(self, stat):
+        return self.stats.get_loc(stat)
+
+    def block(self, rows, columns=slice(None)):
+        """
+        Returns values[rows, columns] with missing values as 0, as they are when summed.
+        """
+        block = self.values[rows][:, columns]
+        return np.nan_to_num(block) if self._has_nan else block
+
+    def weighted_sums(self, season, weights, rows=None):
+        """
+        Returns the weighted sums of each player's stats over the seasons before season.
+
+        weights[0] is applied to the season before, weights[1] to two seasons before and so on.
+        If rows (e.g. from player_rows) is given, only those rows are summed.
+
+        Returns
+        -------
+        A tuple (players, sums, others): the player codes of every player with a row in those
+        seasons, in increasing order, an array (players, stats) of their weighted sums, and a
+        dict of the max of each of the other columns over those seasons.
+        """
+        blocks = [(self._season_rows(season - lag, rows), weight) for lag, weight in enumerate(weights, 1)]
+        players = np.unique(np.concatenate([self.player[block] for block, weight in blocks]))
+        sums = np.zeros((len(players), len(self.stats)), dtype=self.values.dtype)
+        others = {col: np.full(len(players), -1 if col in self.categories else np.nan, dtype=x.dtype)
+                  for col, x in self.others.items()}
+        #most recent season first, so that sums are added in the same order as _hit_step1.
+        for block, weight in blocks:
+            at = np.searchsorted(players, self.player[block])
+            np.add.at(sums, at, self.block(block) * weight)
+            for col, x in self.others.items():
+                (np.maximum if col in self.categories else np.fmax).at(others[col], at, x[block])
+        return players, sums, others
+
+    def weighted_stat(self, season, stat, weights, rows=None):
+        """
+        Returns a dense array, by player code, of the weighted sum of one stat over the seasons
+        before season. Players with no rows in those seasons have 0. If rows is given, only
+        those rows are summed.
+        """
+        out = np.zeros(len(self.players))
+        j = self.column(stat)
+        for lag, weight in enumerate(weights, 1):
+            block = self._season_rows(season - lag, rows)
+            np.add.at(out, self.player[block], self.block(block, j) * weight)
+        return out
+
+    def career_sums(self, stats, rows=None):
+        """
+        Returns an array (players, stats) of each player's totals over every season. If rows
+        is given, only those rows are summed.
+        """
+        rows = slice(None) if rows is None else rows
+        out = np.zeros((len(self.players), len(stats)))
+        np.add.at(out, self.player[rows], self.block(rows, [self.column(x) for x in stats]))
+        return out
+
+    def labels(self, col, codes):
+        """
+        Returns the values of a column of others from its stored codes, in its original dtype.
+        """
+        if col not in self.categories:
+            if np.isnan(codes).any():
+                return codes
+            return codes.astype(self.dtypes[col])
+        if col not in self._label_values:
+            self._label_values[col] = pd.Index(self.categories[col]).astype(self.dtypes[col]).array
+        return pd.api.extensions.take(self._label_values[col], codes, allow_fill=True)
+
+
+def normalize_ids(ids):
+    """
+    Returns ids as an Index of ints, or, when some ids aren't numbers (Fangraphs minor league
+    ids like 'sa830592'), of ints and strings, so that 10155 and '10155' are the same player.
+    """
+    if ids.dtype.kind in 'iu':
+        return ids.rename('playerid')
+    numbers = pd.to_numeric(pd.Series(ids), errors='coerce')
+    whole = (numbers.notna() & (numbers % 1 == 0)).to_numpy()
+    if whole.all():
+        return pd.Index(numbers.astype(np.int64), name='playerid')
+    out = np.asarray(ids.astype(str), dtype=object)
+    out[whole] = list(numbers[whole].astype(np.int64))
+    return pd.Index(out, dtype=object, name='playerid')
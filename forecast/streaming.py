@@ -0,0 +1,160 @@
+"""
+Marcel projections from player-season data too large to hold in memory.
+
+The input is read in chunks. Each chunk is reduced to what one projection season needs and
+then dropped: per-player weighted sums of the stats over the three seasons before it, the
+.5/.1 prorated playing time of the two seasons before it, the league sums and counts of those
+three seasons, and (for pitchers) each player's career GS and G. Memory is bounded by the
+number of players and the chunk size, not by the length of the history.
+
+Used through MarcelForecaster.project_hitters_streaming and project_pitchers_streaming.
+
+WARNING: The directory structure in phi_baseball is not final. File locations may change.
+
+Classes
+-------
+
+SeasonAccumulator
+    Reduces chunks of player-season rows to the totals a single Marcel season needs.
+
+Functions
+---------
+
+read_chunks(source, chunksize)
+    Yields DataFrames of rows from a csv or an iterable of DataFrames.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def read_chunks(source, chunksize=100_000):
+    """
+    Yields DataFrames of at most chunksize rows.
+
+    source can be a csv, a DataFrame, or an iterable of DataFrames (e.g. one per file), which
+    are passed through as they are.
+    """
+    if isinstance(source, pd.DataFrame):
+        source = [source]
+    elif isinstance(source, str):
+        source = pd.read_csv(source, chunksize=chunksize, encoding='utf-8-sig')
+    for chunk in source:
+        chunk.columns = [str(x).strip().strip('"') for x in chunk.columns]
+        yield chunk
+
+
+class SeasonAccumulator:
+    """
+    Running totals of player-season rows for one projection season.
+
+    Partial totals from each chunk are kept in a list and combined whenever they hold more
+    than limit rows, so adding a chunk costs time in proportion to the chunk.
+
+    Parameters
+    ----------
+    season: int
+        The season to be projected.
+
+    stats: list-like
+        The stats that are summed.
+
+    weights: tuple
+        The weights of the seasons before season, most recent first, e.g. (5,4,3).
+
+    playing_time: str
+        The stat that is prorated, e.g. 'PA' or 'IP'.
+
+    careers: list-like or None (default = None)
+        Stats totalled over every season, e.g. ['GS','G'] for pitchers.
+
+    limit: int (default = 500,000)
+        The most rows of partial totals kept before they are combined.
+    """
+
+    def __init__(self, season, stats, weights, playing_time, careers=None, limit=500_000):
+        self.season = season
+        self.stats = list(stats)
+        self.weights = weights
+        self.playing_time = playing_time
+        self.careers = list(careers or [])
+        self.limit = limit
+        self._sums = []
+        self._others = []
+        self._prorated = []
+        self._careers = []
+        self._league = []
+
+    def add(self, chunk):
+        """
+        Adds a chunk of player-season rows.
+        """
+        if self.careers:
+            self._careers.append(chunk[self.careers].groupby(chunk['playerid']).sum())
+        lag = self.season - chunk['Season'].to_numpy()
+        chunk = chunk[(lag >= 1) & (lag <= len(self.weights))]
+        if len(chunk):
+            self._add_seasons(chunk)
+        if sum(len(x) for x in self._sums + self._others + self._careers) > self.limit:
+            self._combine()
+
+    def _add_seasons(self, chunk):
+        lag = self.season - chunk['Season'].to_numpy()
+        weight = np.asarray(self.weights, dtype=float)[lag - 1]
+        prorate = np.select([lag == 1, lag == 2], [.5, .1], 0)
+        by_player = chunk['playerid']
+
+        self._sums.append(chunk[self.stats].mul(weight, axis=0).groupby(by_player).sum())
+        others = [x for x in chunk.columns if x not in self.stats and x not in ('playerid', 'Season')]
+        self._others.append(chunk[['playerid'] + others])
+        self._prorated.append((chunk[self.playing_time]*prorate).groupby(by_player).sum())
+        numeric = chunk.select_dtypes('number')
+        self._league.append((numeric.groupby(chunk['Season']).sum(), numeric.groupby(chunk['Season']).count()))
+
+    def _combine(self):
+        if self._careers:
+            self._careers = [pd.concat(self._careers).groupby(level=0).sum()]
+        if not self._sums:
+            return
+        self._sums = [pd.concat(self._sums).groupby(level=0).sum()]
+        self._others = [self._max_by_player(pd.concat(self._others))]
+        self._prorated = [pd.concat(self._prorated).groupby(level=0).sum()]
+        sums = pd.concat([x[0] for x in self._league]).groupby(level=0).sum()
+        counts = pd.concat([x[1] for x in self._league]).groupby(level=0).sum()
+        self._league = [(sums, counts)]
+
+    @staticmethod
+    def _max_by_player(df):
+        """
+        Returns one row per playerid with the max of every other column, skipping missing values.
+        """
+        out = {}
+        for col in df.columns.drop('playerid'):
+            values = df[['playerid', col]].dropna()
+            out[col] = values.sort_values(col, kind='stable').drop_duplicates('playerid', keep='last').set_index('playerid')[col]
+        players = pd.Index(df['playerid'].unique())
+        return pd.DataFrame({col: x.reindex(players) for col, x in out.items()}, index=players).rename_axis('playerid').reset_index()
+
+    def totals(self):
+        """
+        Returns the accumulated totals.
+
+        Returns
+        -------
+        A tuple (totals, league, playing_time, careers). totals is a tuple (index, values,
+        others) like MarcelForecaster._weighted_totals returns, league is a tuple of DataFrames
+        (sums, counts) indexed by season like MarcelForecaster._season_aggregates, playing_time
+        is the prorated playing time aligned with totals, and careers is the career totals
+        aligned with totals (or None).
+        """
+        if not self._sums:
+            raise ValueError('no rows in the three seasons before {}'.format(self.season))
+        self._combine()
+        sums = self._sums[0].sort_index()
+        others = self._others[0].set_index('playerid').reindex(sums.index)
+        index = pd.MultiIndex.from_arrays([sums.index, np.full(len(sums), self.season)], names=['playerid', 'Season'])
+        totals = (index, sums[self.stats].to_numpy(dtype=float), {col: others[col].to_numpy() for col in others})
+        playing_time = self._prorated[0].reindex(sums.index, fill_value=0).to_numpy()
+        careers = self._careers[0].reindex(sums.index).to_numpy() if self._careers else None
+        return totals, self._league[0], playing_time, careers
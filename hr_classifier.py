@@ -0,0 +1,271 @@
+'''
+A batted-ball home run classifier built from statcast physics data.
+
+This is the model from hr_classification.ipynb as a library: a feature pipeline, a
+scikit-learn model that can be trained, saved and loaded, and scoring that classifies any
+number of batted balls a chunk at a time, so memory is bounded by the chunk size rather than
+the number of batted balls. Whole seasons can be scored in a process pool.
+
+Features, from statcast columns:
+    --launch_speed and launch_angle, as they are.
+    --spray_angle, the horizontal direction of the ball in degrees from straight away center
+      field (negative toward left field), from the hc_x and hc_y hit coordinates. The notebook
+      scaled hc_x and hc_y by their maxima in the data, which made a ball's features depend on
+      the rest of its batch; the fixed home plate coordinates used here don't.
+    --stand and p_throws, True for right-handed batters and pitchers.
+    --home_team, one-hot encoded as a proxy for the park. Teams the model wasn't trained on
+      get no park effect.
+
+Scoring is deterministic, so a trained model gives the same probabilities for a batted ball
+whatever the chunk size, the number of processes or the other balls in its batch. Training is
+reproducible for a given random_state.
+
+Requires scikit-learn.
+
+Classes
+-------
+
+HRClassifier
+    Trains, saves, loads and scores a home run classifier.
+
+Functions
+---------
+
+features(df)
+    Returns the model features of statcast batted balls.
+
+score_seasons(model, root, seasons)
+    Scores the batted balls of whole seasons in a statcast_store, one season per process.
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+import pickle
+
+import numpy as np
+import pandas as pd
+
+try:
+    from sklearn.compose import ColumnTransformer
+    from sklearn.neural_network import MLPClassifier
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+except ImportError: #only needed to train or score; the feature pipeline works without it.
+    MLPClassifier = None
+
+#the statcast columns the features are built from.
+STATCAST_COLUMNS = ['launch_speed', 'launch_angle', 'hc_x', 'hc_y', 'stand', 'p_throws', 'home_team']
+NUMERIC_FEATURES = ['launch_speed', 'launch_angle', 'spray_angle']
+FEATURES = NUMERIC_FEATURES + ['stand', 'p_throws', 'home_team']
+#home plate in the hc_x, hc_y hit coordinates.
+HOME_PLATE = (125.42, 198.27)
+
+
+def features(df):
+    '''
+    Returns a DataFrame of the model features of statcast batted balls, indexed like df.
+
+    df must have the columns in STATCAST_COLUMNS; missing values stay missing.
+    '''
+    hc_x = df['hc_x'].to_numpy(dtype = float, na_value = np.nan)
+    hc_y = df['hc_y'].to_numpy(dtype = float, na_value = np.nan)
+    spray = np.degrees(np.arctan2(hc_x - HOME_PLATE[0], HOME_PLATE[1] - hc_y))
+    return pd.DataFrame({
+        'launch_speed': df['launch_speed'].to_numpy(dtype = float, na_value = np.nan),
+        'launch_angle': df['launch_angle'].to_numpy(dtype = float, na_value = np.nan),
+        'spray_angle': spray,
+        'stand': (df['stand'] == 'R').to_numpy(dtype = float),
+        'p_throws': (df['p_throws'] == 'R').to_numpy(dtype = float),
+        'home_team': df['home_team'].astype(object).where(df['home_team'].notna(), '').to_numpy(),
+        }, index = df.index)
+
+
+def is_home_run(df):
+    '''
+    Returns a boolean array of which statcast pitches were home runs.
+    '''
+    return (df['events'] == 'home_run').to_numpy(dtype = bool)
+
+
+class HRClassifier:
+    '''
+    Classifies batted balls as home runs or not.
+
+    The model is a pipeline of a one-hot encoding of home_team, standardized numeric features
+    and a multi-layer perceptron, as in hr_classification.ipynb.
+
+    Attributes
+    ----------
+    pipeline: sklearn Pipeline or None
+        The trained model; None until fit or load.
+
+    Methods
+    -------
+    fit(df)
+        Trains the model on statcast batted balls.
+
+    score(batch)
+        Returns the home run probability of every batted ball in batch.
+
+    save(path)
+        Pickles the trained model.
+
+    load(path)
+        Class method returning a saved HRClassifier.
+    '''
+
+    def __init__(self, hidden_layer_sizes = (20, 8), learning_rate_init = .01, max_iter = 1000, random_state = 0):
+        '''
+        Parameters
+        ----------
+        hidden_layer_sizes, learning_rate_init, max_iter:
+            Passed to sklearn's MLPClassifier.
+
+        random_state: int (default = 0)
+            Seeds the training sample and the network's initial weights, so training on the
+            same data gives the same model.
+        '''
+        self.hidden_layer_sizes = hidden_layer_sizes
+        self.learning_rate_init = learning_rate_init
+        self.max_iter = max_iter
+        self.random_state = random_state
+        self.pipeline = None
+
+    def _new_pipeline(self):
+        if MLPClassifier is None:
+            raise ImportError("the home run classifier requires scikit-learn; pip install scikit-learn")
+        columns = ColumnTransformer([
+            ('park', OneHotEncoder(handle_unknown = 'ignore', sparse_output = False), ['home_team']),
+            ('scaler', StandardScaler(), NUMERIC_FEATURES),
+            ], remainder = 'passthrough')
+        mlp = MLPClassifier(hidden_layer_sizes = self.hidden_layer_sizes, activation = 'relu',
+                            learning_rate_init = self.learning_rate_init, max_iter = self.max_iter,
+                            random_state = self.random_state)
+        return Pipeline([('column_transformer', columns), ('mlp_clf', mlp)])
+
+    def fit(self, df, sample = None):
+        '''
+        Trains the model on statcast batted balls and returns self.
+
+        Parameters
+        ----------
+        df: DataFrame
+            Statcast pitches with events and the columns in STATCAST_COLUMNS. Rows missing
+            any feature (e.g. pitches not put in play) are dropped.
+
+        sample: int or None (default = None)
+            If given, trains on a random sample of this many batted balls.
+        '''
+        X = features(df)
+        y = is_home_run(df)
+        keep = X[NUMERIC_FEATURES].notna().all(axis = 1).to_numpy()
+        X, y = X[keep], y[keep]
+        if sample is not None and sample < len(X):
+            rows = np.sort(np.random.default_rng(self.random_state).choice(len(X), sample, replace = False))
+            X, y = X.iloc[rows], y[rows]
+        self.pipeline = self._new_pipeline().fit(X, y)
+        return self
+
+    def score(self, batch, chunksize = 250_000):
+        '''
+        Returns the home run probability of every batted ball in batch.
+
+        Parameters
+        ----------
+        batch: DataFrame
+            Statcast batted balls with the columns in STATCAST_COLUMNS.
+
+        chunksize: int (default = 250,000)
+            The batted balls featurized and classified at a time. Memory is bounded by
+            chunksize, not len(batch).
+
+        Returns
+        -------
+        A float Series indexed like batch; NaN for balls missing a feature.
+        '''
+        if self.pipeline is None:
+            raise ValueError('the classifier has not been trained; use fit or load')
+        out = np.full(len(batch), np.nan)
+        for start in range(0, len(batch), chunksize):
+            X = features(batch.iloc[start:start + chunksize])
+            keep = X[NUMERIC_FEATURES].notna().all(axis = 1).to_numpy()
+            if keep.any():
+                out[start:start + chunksize][keep] = self.pipeline.predict_proba(X[keep])[:, 1]
+        return pd.Series(out, index = batch.index, name = 'hr_probability')
+
+    def predict(self, batch, threshold = .5, chunksize = 250_000):
+        '''
+        Returns a boolean Series of which batted balls are classified as home runs.
+        '''
+        return self.score(batch, chunksize) >= threshold
+
+    def save(self, path):
+        '''
+        Pickles the classifier to path.
+        '''
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Returns the HRClassifier pickled at path by save.
+        '''
+        with open(path, 'rb') as f:
+            model = pickle.load(f)
+        if not isinstance(model, cls):
+            raise TypeError('{} does not hold an HRClassifier'.format(path))
+        return model
+
+
+def score_seasons(model, root, seasons, n_jobs = 1, chunksize = 250_000):
+    '''
+    Returns the home run probabilities of every batted ball of some seasons in a statcast_store.
+
+    Each season is read (only the columns the model needs, and only balls in play) and scored
+    by its own process, so memory is bounded by the largest season and chunksize.
+
+    Parameters
+    ----------
+    model: HRClassifier or str
+        A trained classifier, or the path it was saved to. A path is loaded by each process
+        instead of being sent to it.
+
+    root: str
+        The statcast_store directory.
+
+    seasons: list-like of int
+        The seasons to score.
+
+    n_jobs: int (default = 1)
+        The number of processes.
+
+    chunksize: int (default = 250,000)
+        See HRClassifier.score.
+
+    Returns
+    -------
+    A DataFrame with the game_date, batter, pitcher, events and hr_probability of every
+    batted ball, in the order of seasons. The result doesn't depend on n_jobs.
+    '''
+    args = [(model, root, season, chunksize) for season in seasons]
+    if n_jobs == 1:
+        frames = [_score_season(*x) for x in args]
+    else:
+        with ProcessPoolExecutor(n_jobs) as pool:
+            frames = list(pool.map(_score_season, *zip(*args)))
+    return pd.concat(frames, ignore_index = True)
+
+
+def _score_season(model, root, season, chunksize):
+    '''
+    Reads and scores one season of batted balls. Module level so that it can be sent to a process.
+    '''
+    from statcast_store import read_statcast
+    if isinstance(model, str):
+        model = HRClassifier.load(model)
+    columns = ['game_date', 'batter', 'pitcher', 'events', 'type'] + STATCAST_COLUMNS
+    df = read_statcast(root, seasons = [season], columns = columns)
+    df = df[df['type'] == 'X'].reset_index(drop = True) #balls in play.
+    out = df[['game_date', 'batter', 'pitcher', 'events']].copy()
+    out['hr_probability'] = model.score(df, chunksize).to_numpy()
+    return out
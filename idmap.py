@@ -0,0 +1,172 @@
+'''
+A crosswalk between the player ids of different sites, built from data/id_map.csv.
+
+Fangraphs ids (playerid in the Marcel inputs, Steamer and ZiPS) and MLBAM ids (batter and
+pitcher in statcast) name the same players differently. IdMap loads the crosswalk once and
+keeps a hash index for every id system, so whole columns are translated with a single lookup
+of their unique values instead of a merge on names.
+
+Ids are normalized when they are indexed: ids that are whole numbers are ints, whatever the
+csv stored them as, and other ids (e.g. Fangraphs minor league ids like 'sa830592') are
+strings. A Fangraphs playerid of 10155 and an fg_id of '10155' are the same player.
+
+Classes
+-------
+
+IdMap
+    Translates player ids between id systems (mlb, fg, bref, retro, espn, yahoo, ...).
+'''
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from forecast.datacache import read_csv
+
+ID_MAP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'id_map.csv')
+
+
+class IdMap:
+    '''
+    Translates player ids between the id systems in the crosswalk.
+
+    An id system is named by its column, with or without the '_id' suffix: 'mlb' and 'mlb_id'
+    are the same system. Any column of the crosswalk (e.g. 'mlb_name' or 'birth_date') can be
+    the target of a translation.
+
+    Attributes
+    ----------
+    data: DataFrame
+        The crosswalk, one player per row.
+
+    systems: list
+        The id columns that are indexed.
+
+    Methods
+    -------
+    translate(ids, from_, to)
+        Returns the ids translated from one system to another column of the crosswalk.
+
+    add_ids(df, column, from_, to)
+        Returns df with columns of the players' ids in other systems.
+    '''
+
+    def __init__(self, path = ID_MAP, cache = True, cache_dir = None):
+        '''
+        Parameters
+        ----------
+        path: str (default = ID_MAP)
+            The crosswalk csv.
+
+        cache: bool (default = True)
+            If True, the csv is read through forecast.datacache, which keeps a typed copy
+            that later loads memory-map instead of parsing the csv.
+
+        cache_dir: str or None (default = None)
+            Passed to forecast.datacache.read_csv.
+        '''
+        if cache:
+            data = read_csv(path, cache_dir = cache_dir)
+        else:
+            try:
+                data = pd.read_csv(path, encoding = 'utf-8-sig')
+            except UnicodeDecodeError:
+                data = pd.read_csv(path, encoding = 'latin-1')
+        self.data = data
+        self.systems = [col for col in data.columns if col.endswith('_id')]
+        self._keys = {}
+        self._indexes = {}
+        for system in self.systems:
+            keys = self._normalize(data[system])
+            rows = np.flatnonzero(keys.notna().to_numpy())
+            index = pd.Index(keys.iloc[rows].to_numpy())
+            first = ~index.duplicated(keep = 'first')
+            self._keys[system] = keys
+            self._indexes[system] = (index[first], rows[first])
+
+    def translate(self, ids, from_, to):
+        '''
+        Returns the ids translated from one id system to a column of the crosswalk.
+
+        Only the unique ids are looked up, so translating a column with many repeats (like
+        statcast's batter) costs little more than factorizing it.
+
+        Parameters
+        ----------
+        ids: Series or array-like
+            The ids to translate. Missing and unknown ids translate to missing values.
+
+        from_: str
+            The id system of ids, e.g. 'mlb' or 'mlb_id'.
+
+        to: str
+            The id system or column to translate to, e.g. 'fg', 'bref_id' or 'birth_date'.
+
+        Returns
+        -------
+        A Series indexed like ids (or from 0 for other array-likes) named after to.
+        '''
+        source = self._system(from_)
+        target = self._system(to) if self._system(to) in self.data.columns else to
+        values = self._keys[target] if target in self._keys else self.data[target]
+        index, rows = self._indexes[source]
+
+        ids = ids if isinstance(ids, pd.Series) else pd.Series(np.asarray(ids))
+        codes, uniques = pd.factorize(ids)
+        found = index.get_indexer(self._normalize(pd.Series(uniques)).to_numpy())
+        positions = np.where(found >= 0, rows[found], -1)[codes]
+        positions[codes < 0] = -1
+        out = values.take(np.maximum(positions, 0)).where(positions >= 0)
+        #values that are missing keep values' dtype, so integer ids stay integers.
+        return pd.Series(out.array, index = ids.index, name = target)
+
+    def add_ids(self, df, column, from_, to):
+        '''
+        Returns a copy of df with a column for each of the players' ids in the systems to.
+
+        Parameters
+        ----------
+        df: DataFrame
+            Must have column.
+
+        column: str
+            The column of df holding ids in the system from_.
+
+        from_: str
+            The id system of column.
+
+        to: str or list-like of str
+            The id systems or columns to add. Each added column is named as in the crosswalk.
+        '''
+        if isinstance(to, str):
+            to = [to]
+        out = df.copy()
+        for target in to:
+            translated = self.translate(df[column], from_, target)
+            out[translated.name] = translated.to_numpy()
+        return out
+
+    def _system(self, name):
+        if name in self.data.columns:
+            return name
+        return name + '_id'
+
+    @staticmethod
+    def _normalize(ids):
+        '''
+        Returns ids as a nullable Int64 Series if every id is a whole number, and otherwise as an
+        object Series of ints (for ids that are whole numbers) and strings.
+        '''
+        ids = pd.Series(ids).reset_index(drop = True)
+        if ids.dtype.kind in 'biu':
+            return ids.astype('Int64')
+        numbers = pd.to_numeric(ids, errors = 'coerce')
+        whole = numbers.notna() & (numbers % 1 == 0)
+        missing = ids.isna()
+        if (whole | missing).all():
+            return numbers.astype('Int64')
+        out = ids.astype(object).where(~missing, None)
+        out[whole] = numbers[whole].astype(np.int64).astype(object)
+        out[~whole & ~missing] = ids[~whole & ~missing].astype(str).str.strip()
+        return out
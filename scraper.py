@@ -7,9 +7,20 @@ Currently this just scrapes statcast, which does not permit downloading .csvs of
 Documentation on baseball_scraper: https://pypi.org/project/baseball-scraper/
 '''
 
-import baseball_scraper
+try:
+    import baseball_scraper
+except ImportError: #only needed when scraping for real; a stub fetch can be passed instead.
+    baseball_scraper = None
 import pandas as pd
+from pandas.errors import ParserError
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import datetime
+import json
+import os
+import threading
+import time
+
+MANIFEST = 'manifest.json'
 
 def statcast_scrape(start,end):
     '''
@@ -62,4 +73,319 @@ def update_statcast(target_csv_name):
     end = datetime.datetime.now()
     new = statcast_scrape(start, end)
     out = pd.concat([out,new])
-    return out
\ No newline at end of file
+    return out
+
+def statcast_scrape_to_dir(directory, start, end, days=5, max_workers=1, rate=None, burst=1,
+                           retries=0, backoff=1.0, fetch=None):
+    '''
+    Scrapes statcast data in range start, end into directory and returns the manifest of scraped slices.
+
+    Each time slice is written to its own csv as soon as it is scraped and recorded in a manifest
+    (manifest.json) in directory. Calling this again only scrapes the dates in the range that the
+    manifest doesn't have, so a long scrape that fails part way resumes where it stopped, and the
+    range is never held in memory all at once.
+
+    A slice that was scraped on or before its last date (for example, today's games during the
+    season) is treated as incomplete: it is deleted and scraped again on the next call.
+
+    If an exception is raised, prints a brief report and stops scraping, like statcast_scrape.
+    If writing a slice fails, the error is raised right away and the slices that haven't
+    started are not scraped; the manifest keeps every slice written before it.
+
+    Parameters
+    ----------
+    directory: str
+        Where the slices and manifest are kept. Created if it doesn't exist.
+
+    start: datetime.date
+        The first date to scrape.
+
+    end: datetime.date
+        The last date to scrape, inclusive.
+
+    days: int (default = 5)
+        The most days in each slice.
+
+    max_workers, rate, burst, retries, backoff, fetch:
+        See statcast_scrape_concurrent. With more than one worker, slices are written
+        in the order they finish; each is still its own file.
+
+    Returns
+    -------
+    A pd.DataFrame of the manifest, with a row for each scraped slice: its start and end dates,
+    the number of rows, the csv file (None if the slice had no data) and the date it was scraped.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    manifest = _drop_incomplete(directory, _read_manifest(directory))
+    _write_manifest(directory, manifest)
+    windows = _missing_windows(start, end, manifest, days)
+    for first, last, temp in _scrape_windows(windows, fetch, max_workers, rate, burst, retries, backoff):
+        manifest.append(_write_slice(directory, temp, first, last))
+        _write_manifest(directory, manifest)
+    return pd.DataFrame(manifest, columns=['start', 'end', 'rows', 'file', 'scraped'])
+
+def statcast_scrape_concurrent(start, end, max_workers=4, rate=2.0, burst=1, retries=3, backoff=1.0,
+                               days=5, fetch=None):
+    '''
+    Returns a DataFrame of all the successfully scraped time slices in range start, end, scraping several slices at once.
+
+    Like statcast_scrape, but up to max_workers slices are requested at the same time, requests are
+    rate limited by a token bucket, and a failed slice is retried with exponential backoff. If a
+    slice still fails, prints a brief report, cancels the slices that haven't started and, once
+    the slices already running finish, raises a ScrapeError holding the scraped data and the
+    slices that are missing from it. The result is in date order however the slices finish.
+
+    Parameters
+    ----------
+    start: datetime.date
+        The first date to scrape.
+
+    end: datetime.date
+        The last date to scrape, inclusive.
+
+    max_workers: int (default = 4)
+        The most slices requested at the same time.
+
+    rate: float or None (default = 2.0)
+        The most requests started per second, on average. None for no limit.
+
+    burst: int (default = 1)
+        The most requests that can start at once after the limiter has been idle.
+
+    retries: int (default = 3)
+        How many times a failed slice is retried.
+
+    backoff: float (default = 1.0)
+        Seconds to wait before the first retry; doubled for each retry after that.
+
+    days: int (default = 5)
+        The most days in each slice.
+
+    fetch: callable or None (default = None)
+        Called as fetch(start_dt, end_dt) with "%Y-%m-%d" strings to get a slice. If None,
+        baseball_scraper.statcast. Pass a stub to run offline.
+
+    Returns
+    -------
+    A pd.DataFrame object containing all the scraped time slices in the range.
+
+    Raises
+    ------
+    ScrapeError
+        If any slice failed; its data attribute has the slices that were scraped and its
+        missing attribute the (start, end) dates of those that weren't, to scrape again.
+    '''
+    windows = _missing_windows(start, end, [], days)
+    missing = []
+    scrapes = sorted(_scrape_windows(windows, fetch, max_workers, rate, burst, retries, backoff, missing),
+                     key=lambda x: x[0])
+    data = pd.concat([x[2] for x in scrapes]) if scrapes else pd.DataFrame()
+    if missing:
+        raise ScrapeError(sorted(missing), data)
+    return data
+
+class ScrapeError(Exception):
+    '''
+    Raised by statcast_scrape_concurrent when some slices couldn't be scraped.
+
+    Attributes
+    ----------
+    missing: list
+        The (start, end) dates of every slice that failed or was cancelled, in date order.
+
+    data: pd.DataFrame
+        The slices that were scraped.
+    '''
+
+    def __init__(self, missing, data):
+        super().__init__('{} slices were not scraped, the first from {} to {}'.format(
+            len(missing), missing[0][0], missing[0][1]))
+        self.missing = missing
+        self.data = data
+
+class TokenBucket:
+    '''
+    A thread-safe token bucket rate limiter.
+
+    Tokens are added at rate per second, up to capacity; acquire blocks until a token is
+    available and takes it.
+    '''
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+def update_statcast_dir(directory, start=None):
+    '''
+    Scrapes any statcast data missing from directory up to today. See statcast_scrape_to_dir.
+
+    If start is None, scraping starts the day after the last date in the manifest. A missing
+    or empty manifest (e.g. after an interrupted first run) has no last date, so start must
+    then be given.
+    '''
+    if start is None:
+        manifest = _read_manifest(directory)
+        if not manifest:
+            raise ValueError('{} has no scraped slices yet; pass the start date to scrape from'.format(directory))
+        start = max(_to_date(x['end']) for x in manifest) + datetime.timedelta(days=1)
+    return statcast_scrape_to_dir(directory, start, datetime.date.today())
+
+def read_statcast_dir(directory, start=None, end=None):
+    '''
+    Returns a DataFrame of the scraped slices in directory that overlap start, end.
+
+    If start or end are None, the range is open on that side.
+    '''
+    frames = []
+    for entry in sorted(_read_manifest(directory), key=lambda x: x['start']):
+        if entry['file'] is None:
+            continue
+        if start is not None and _to_date(entry['end']) < _to_date(start):
+            continue
+        if end is not None and _to_date(entry['start']) > _to_date(end):
+            continue
+        frames.append(pd.read_csv(os.path.join(directory, entry['file'])))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+def _to_date(x):
+    return pd.Timestamp(x).date()
+
+def _read_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+def _write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+def _drop_incomplete(directory, manifest):
+    '''
+    Deletes the slices that were scraped before their last date had finished and returns the rest of the manifest.
+    '''
+    complete = []
+    for entry in manifest:
+        if _to_date(entry['scraped']) > _to_date(entry['end']):
+            complete.append(entry)
+        elif entry['file'] is not None and os.path.exists(os.path.join(directory, entry['file'])):
+            os.remove(os.path.join(directory, entry['file']))
+    return complete
+
+def _missing_windows(start, end, manifest, days):
+    '''
+    Returns a list of (first, last) date pairs, at most days long, covering the dates in
+    start, end that no manifest entry covers.
+    '''
+    start, end = _to_date(start), _to_date(end)
+    covered = set()
+    for entry in manifest:
+        first, last = _to_date(entry['start']), _to_date(entry['end'])
+        covered.update(first + datetime.timedelta(days=i) for i in range((last - first).days + 1))
+    windows = []
+    day = start
+    while day <= end:
+        if day in covered:
+            day += datetime.timedelta(days=1)
+            continue
+        first = day
+        while day <= end and day not in covered and (day - first).days < days:
+            day += datetime.timedelta(days=1)
+        windows.append((first, day - datetime.timedelta(days=1)))
+    return windows
+
+def _write_slice(directory, df, first, last):
+    '''
+    Writes a scraped slice to directory and returns its manifest entry.
+    '''
+    name = None
+    if len(df):
+        name = 'statcast_{}_{}.csv'.format(first.strftime("%Y-%m-%d"), last.strftime("%Y-%m-%d"))
+        path = os.path.join(directory, name)
+        df.to_csv(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+    return {'start': first.strftime("%Y-%m-%d"), 'end': last.strftime("%Y-%m-%d"),
+            'rows': len(df), 'file': name, 'scraped': datetime.date.today().strftime("%Y-%m-%d")}
+
+def _statcast(start_dt, end_dt):
+    if baseball_scraper is None:
+        raise ImportError("scraping statcast requires baseball_scraper; pip install baseball-scraper")
+    return baseball_scraper.statcast(start_dt, end_dt)
+
+def _fetch_window(fetch, first, last, bucket, retries, backoff, stop=None):
+    '''
+    Returns one scraped slice, retrying failures with exponential backoff. Once stop is set,
+    failures are no longer retried.
+    '''
+    for attempt in range(retries + 1):
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            return fetch(first.strftime("%Y-%m-%d"), last.strftime("%Y-%m-%d"))
+        except Exception:
+            if attempt == retries or (stop is not None and stop.wait(backoff * 2**attempt)):
+                raise
+
+def _scrape_windows(windows, fetch, max_workers, rate, burst, retries, backoff, missing=None):
+    '''
+    Yields (first, last, DataFrame) for each window as its scrape finishes.
+
+    If a window fails after its retries, prints a brief report and cancels the windows that
+    haven't started; windows already being scraped are still yielded. If missing is a list,
+    (first, last) of every failed or cancelled window is added to it. Closing the generator
+    early cancels the windows that haven't started without waiting for them.
+    '''
+    fetch = fetch or _statcast
+    bucket = TokenBucket(rate, burst) if rate else None
+    stop = threading.Event()
+    pool = ThreadPoolExecutor(max_workers)
+    try:
+        futures = {pool.submit(_fetch_window, fetch, first, last, bucket, retries, backoff, stop): (first, last)
+                   for first, last in windows}
+        for future in as_completed(futures):
+            first, last = futures[future]
+            if future.cancelled():
+                if missing is not None:
+                    missing.append((first, last))
+                continue
+            try:
+                temp = future.result()
+            except Exception as e:
+                name = 'ParserError' if isinstance(e, ParserError) else 'Unspecified'
+                print("{} failure at {}".format(name, first.strftime("%Y-%m-%d")))
+                _cancel(futures)
+                if missing is not None:
+                    missing.append((first, last))
+                continue
+            yield first, last, temp
+    finally:
+        #if the caller stops early (an error writing a slice, Ctrl-C, a break), don't wait for the
+        #queued windows to be scraped: cancel them, and stop retrying the running ones.
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _cancel(futures):
+    for future in futures:
+        future.cancel()
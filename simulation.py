@@ -0,0 +1,285 @@
+'''
+Monte Carlo simulation of fantasy seasons from projections.
+
+Projections are point estimates, so rankings built from them hide how uncertain they are. The
+SeasonSimulator samples many seasons for every player around his projection and values each
+sampled season with StatCalculator's SPG formulas. When players are assigned to fantasy teams,
+it also totals each team's categories and scores the standings in every simulated season.
+
+Sampling happens in batches of seasons held as NumPy arrays of shape (seasons, players, stats),
+so memory is bounded by the batch size; batches can be spread over several processes.
+
+The sampling model, for each player and simulated season:
+    --Playing time (AB for hitters, IP for pitchers) is the projection times a gamma
+      distributed factor with mean 1 and coefficient of variation playing_time_cv.
+    --Each counting stat's true talent is the projected rate times a gamma distributed factor
+      with mean 1 and coefficient of variation talent_cv * sqrt(1 - reliability). Stats are
+      sampled independently.
+    --The counting stat is then Poisson distributed around talent times playing time.
+
+Classes
+-------
+
+SeasonSimulator
+    Samples seasons around hitter and pitcher projections and reports the distributions of
+    player SPG values and team standings points.
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+import copy
+
+import numpy as np
+import pandas as pd
+
+from stats import StatCalculator
+
+
+class SeasonSimulator:
+    '''
+    Samples fantasy seasons around projections.
+
+    Attributes
+    ----------
+    hitter_stats: list
+        The standard keys of the hitting stats that are sampled. AB is the playing time.
+
+    pitcher_stats: list
+        The standard keys of the pitching stats that are sampled. IP is the playing time.
+
+    Methods
+    -------
+    simulate(sims)
+        Returns the distributions of each player's SPG value and, if teams are given, of each
+        team's standings points.
+    '''
+    hitter_stats = ['HR', 'SB', 'RBI', 'R', 'H', 'AB']
+    pitcher_stats = ['K', 'W', 'S', 'ER', 'BB', 'H', 'IP']
+
+    def __init__(self, hitters, pitchers, calculator = None, reliability = 'reliability', default_reliability = .5,
+                 playing_time_cv = .2, talent_cv = .3, hitter_stat_dict = None, pitcher_stat_dict = None):
+        '''
+        Parameters
+        ----------
+        hitters: DataFrame
+            Hitter projections, one hitter per row, with the stats in hitter_stats. A ValueError
+            is raised if any of them is missing or negative; fill them (e.g. with fillna) first.
+
+        pitchers: DataFrame
+            Pitcher projections, one pitcher per row, with the stats in pitcher_stats, checked
+            as hitters are.
+
+        calculator: StatCalculator or None (default = None)
+            Provides the SPG coefficients. If None, a new StatCalculator.
+
+        reliability: string (default = 'reliability')
+            The column of hitters and pitchers holding each projection's reliability, between
+            0 and 1 (e.g. from Marcel). Rows of a frame without the column use default_reliability.
+
+        default_reliability: numeric (default = .5)
+            Reliability used when the reliability column is missing.
+
+        playing_time_cv: numeric (default = .2)
+            The coefficient of variation of playing time.
+
+        talent_cv: numeric (default = .3)
+            The coefficient of variation of a stat's true talent rate for a projection with no reliability.
+
+        hitter_stat_dict, pitcher_stat_dict: dictionary or None (default = None)
+            Maps standard keys to the column names in hitters and pitchers, as in StatCalculator.
+        '''
+        self.calculator = calculator if calculator is not None else StatCalculator()
+        self.hitters = hitters
+        self.pitchers = pitchers
+        self.playing_time_cv = playing_time_cv
+        self.talent_cv = talent_cv
+        self._hitter_proj = self._matrix(hitters, self.hitter_stats,
+                                         {**self.calculator._standard_hitting_keys, **(hitter_stat_dict or {})})
+        self._pitcher_proj = self._matrix(pitchers, self.pitcher_stats,
+                                          {**self.calculator._standard_pitching_keys, **(pitcher_stat_dict or {})})
+        self._check(hitters, self._hitter_proj, self.hitter_stats, 'hitters')
+        self._check(pitchers, self._pitcher_proj, self.pitcher_stats, 'pitchers')
+        self._hitter_rel = self._reliability(hitters, reliability, default_reliability)
+        self._pitcher_rel = self._reliability(pitchers, reliability, default_reliability)
+
+    def simulate(self, sims = 10_000, hitter_teams = None, pitcher_teams = None, seed = None,
+                 batch_size = 1_000, n_jobs = 1, quantiles = (.05, .25, .5, .75, .95)):
+        '''
+        Simulates seasons and returns the distributions of player values and team standings.
+
+        Parameters
+        ----------
+        sims: int (default = 10,000)
+            The number of seasons to simulate.
+
+        hitter_teams, pitcher_teams: string, array-like or None (default = None)
+            The fantasy team of each hitter and pitcher, as a column label or an array aligned
+            with the projections. Players with a missing team are free agents. If both are
+            None, standings are not simulated.
+
+        seed: int or None (default = None)
+            Seed for the random numbers. Results with the same seed are identical for any
+            n_jobs, as long as batch_size is unchanged.
+
+        batch_size: int (default = 1,000)
+            The number of seasons sampled at once.
+
+        n_jobs: int (default = 1)
+            The number of processes sampling batches.
+
+        quantiles: tuple of float
+            The quantiles of player SPG values to report.
+
+        Returns
+        -------
+        A tuple (hitter_values, pitcher_values, standings). The first two are DataFrames
+        indexed like the projections with the mean, standard deviation and quantiles of
+        each player's SPG. standings is indexed by team with the mean and standard deviation
+        of total standings points and the share of seasons the team finished first, or None.
+        '''
+        teams, hitter_codes, pitcher_codes = self._team_codes(hitter_teams, pitcher_teams)
+        sizes = [batch_size] * (sims // batch_size) + ([sims % batch_size] if sims % batch_size else [])
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        if n_jobs == 1:
+            batches = [_simulate_batch(self, size, s, hitter_codes, pitcher_codes, len(teams))
+                       for size, s in zip(sizes, seeds)]
+        else:
+            #workers get the projection arrays once, without the DataFrames, instead of with every batch.
+            worker = copy.copy(self)
+            worker.hitters = worker.pitchers = None
+            with ProcessPoolExecutor(n_jobs, initializer = _init_worker,
+                                     initargs = (worker, hitter_codes, pitcher_codes, len(teams))) as pool:
+                batches = list(pool.map(_worker_batch, sizes, seeds))
+
+        hitter_spg = np.concatenate([b[0] for b in batches])
+        pitcher_spg = np.concatenate([b[1] for b in batches])
+        hitter_values = self._summary(hitter_spg, self.hitters.index, quantiles)
+        pitcher_values = self._summary(pitcher_spg, self.pitchers.index, quantiles)
+        standings = None
+        if len(teams):
+            points = np.concatenate([b[2] for b in batches])
+            first = np.bincount(points.argmax(axis = 1), minlength = len(teams)) / len(points)
+            standings = pd.DataFrame({'mean': points.mean(axis = 0), 'std': points.std(axis = 0), 'first': first},
+                                     index = pd.Index(teams, name = 'team'))
+        return hitter_values, pitcher_values, standings
+
+    @staticmethod
+    def _matrix(data, stats, keys):
+        return np.column_stack([data[keys[stat]].to_numpy(dtype = float) for stat in stats])
+
+    @staticmethod
+    def _check(data, projection, stats, name):
+        '''
+        Raises a ValueError if any projected stat is missing or negative, which can't be sampled.
+        '''
+        bad = np.isnan(projection) | (projection < 0)
+        if bad.any():
+            columns = [stat for stat, b in zip(stats, bad.any(axis = 0)) if b]
+            raise ValueError('{} {} have missing or negative projections of {} (first: {!r}); fill them, '
+                             'e.g. with fillna, or drop them'.format(bad.any(axis = 1).sum(), name, columns,
+                                                                      data.index[bad.any(axis = 1)][0]))
+
+    @staticmethod
+    def _reliability(data, reliability, default):
+        if reliability in data:
+            return np.clip(data[reliability].to_numpy(dtype = float), 0, 1)
+        return np.full(len(data), float(default))
+
+    def _team_codes(self, hitter_teams, pitcher_teams):
+        '''
+        Returns the team labels and integer team codes (-1 for free agents) for hitters and pitchers.
+        '''
+        labels = []
+        for data, teams in [(self.hitters, hitter_teams), (self.pitchers, pitcher_teams)]:
+            if teams is None:
+                labels.append(pd.Series(np.nan, index = data.index))
+            elif isinstance(teams, str):
+                labels.append(data[teams])
+            else:
+                labels.append(pd.Series(np.asarray(teams), index = data.index))
+        codes, teams = pd.factorize(pd.concat(labels, ignore_index = True))
+        return teams, codes[:len(self.hitters)], codes[len(self.hitters):]
+
+    def _sample(self, rng, sims, projection, reliability):
+        '''
+        Returns an array (sims, players, stats) of sampled seasons. The last stat is playing time.
+        '''
+        players, stats = projection.shape
+        playing_time = np.ones((sims, players, 1))
+        if self.playing_time_cv > 0:
+            shape = 1 / self.playing_time_cv**2
+            playing_time = rng.gamma(shape, 1 / shape, size = (sims, players, 1))
+        cv = np.maximum(self.talent_cv * np.sqrt(1 - reliability), 1e-6)
+        shape = (1 / cv**2)[None, :, None]
+        talent = rng.gamma(shape, 1 / shape, size = (sims, players, stats - 1))
+        out = np.empty((sims, players, stats))
+        out[..., :-1] = rng.poisson(projection[None, :, :-1] * playing_time * talent)
+        out[..., -1] = projection[None, :, -1] * playing_time[..., 0]
+        return out
+
+    def _hitter_spg(self, h):
+        HR, SB, RBI, R, H, AB = np.moveaxis(h, -1, 0)
+        return self.calculator._hitter_spg(HR, RBI, R, SB, np.minimum(H, AB), AB)
+
+    def _pitcher_spg(self, p):
+        K, W, S, ER, BB, H, IP = np.moveaxis(p, -1, 0)
+        return self.calculator._pitcher_spg(K, W, S, ER, H + BB, IP)
+
+    @staticmethod
+    def _standings_points(h, p, hitter_codes, pitcher_codes, n_teams):
+        '''
+        Returns an array (sims, teams) of total 5x5 rotisserie standings points.
+        '''
+        def totals(x, codes):
+            onehot = np.zeros((len(codes), n_teams))
+            rostered = codes >= 0
+            onehot[np.flatnonzero(rostered), codes[rostered]] = 1
+            return np.moveaxis(np.moveaxis(x, 1, 2) @ onehot, 1, 2)
+        HR, SB, RBI, R, H, AB = np.moveaxis(totals(h, hitter_codes), -1, 0)
+        K, W, S, ER, BB, pH, IP = np.moveaxis(totals(p, pitcher_codes), -1, 0)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            #bigger is better for every category, so ERA and WHIP are negated.
+            categories = [R, HR, RBI, SB, H/AB, W, S, K, -9*ER/IP, -(pH + BB)/IP]
+        points = np.zeros(HR.shape)
+        for c in categories:
+            c = np.nan_to_num(c, nan = -np.inf)
+            #teams tied in a category split its points: the average of the ranks they span.
+            below = (c[:, :, None] > c[:, None, :]).sum(axis = 2)
+            tied = (c[:, :, None] == c[:, None, :]).sum(axis = 2)
+            points += below + (tied + 1) / 2
+        return points
+
+    @staticmethod
+    def _summary(spg, index, quantiles):
+        out = pd.DataFrame({'mean': spg.mean(axis = 0), 'std': spg.std(axis = 0)}, index = index)
+        for q, values in zip(quantiles, np.quantile(spg, quantiles, axis = 0)):
+            out['q{:g}'.format(q*100)] = values
+        return out
+
+
+_worker = {}
+
+
+def _init_worker(simulator, hitter_codes, pitcher_codes, n_teams):
+    '''
+    Pool initializer. Keeps the simulator and team codes for the worker's batches.
+    '''
+    _worker.update(simulator = simulator, hitter_codes = hitter_codes, pitcher_codes = pitcher_codes,
+                   n_teams = n_teams)
+
+
+def _worker_batch(sims, seed):
+    return _simulate_batch(_worker['simulator'], sims, seed, _worker['hitter_codes'], _worker['pitcher_codes'],
+                           _worker['n_teams'])
+
+
+def _simulate_batch(simulator, sims, seed, hitter_codes, pitcher_codes, n_teams):
+    '''
+    Samples one batch of seasons. Returns hitter SPG, pitcher SPG and standings points (or None).
+    '''
+    rng = np.random.default_rng(seed)
+    h = simulator._sample(rng, sims, simulator._hitter_proj, simulator._hitter_rel)
+    p = simulator._sample(rng, sims, simulator._pitcher_proj, simulator._pitcher_rel)
+    points = None
+    if n_teams:
+        points = simulator._standings_points(h, p, hitter_codes, pitcher_codes, n_teams)
+    return simulator._hitter_spg(h), simulator._pitcher_spg(p), points
@@ -0,0 +1,206 @@
+'''
+A date-partitioned, columnar store for pitch-level statcast data.
+
+Pitches are written as parquet files partitioned by season and game date
+(root/season=2019/game_date=2019-04-01/...). Reads push filters on dates, events, batters and
+pitchers, and the choice of columns, down to the files: partitions outside the date range are
+never opened and unrequested columns are never read. A model that only needs launch speed and
+angle for balls in play reads only those bytes.
+
+Requires pyarrow.
+
+Functions
+---------
+
+write_statcast(df, root)
+    Adds a DataFrame of statcast pitches to the store, replacing any game dates it contains.
+
+import_statcast_csv(csv, root)
+    Adds a statcast csv (e.g. from scraper.py) to the store without loading it all at once.
+
+read_statcast(root, ...)
+    Returns the pitches in the store matching the given filters.
+
+iter_statcast(root, ...)
+    Yields the pitches in the store matching the given filters in batches.
+'''
+
+import datetime
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+SCHEMA = '_schema.arrow' #ignored by pyarrow when it lists the parquet files.
+STAGING = '_staging'
+#rows are buffered into row groups of at least this many (or a whole file), since a date's
+#pitches arrive in many small slices when the input isn't sorted by date.
+MIN_ROWS_PER_GROUP = 1 << 16
+MAX_ROWS_PER_GROUP = 1 << 17
+PARTITIONING = ds.partitioning(pa.schema([('season', pa.int16()), ('game_date', pa.date32())]), flavor='hive')
+
+def write_statcast(df, root):
+    '''
+    Adds statcast pitches to the store at root.
+
+    Every game date in df replaces what the store had for that date, so writing the same scrape
+    twice doesn't duplicate pitches.
+
+    Parameters
+    ----------
+    df: DataFrame
+        Statcast pitches, as returned by baseball_scraper.statcast. Must have a game_date column.
+
+    root: str
+        The store's directory. Created if it doesn't exist.
+    '''
+    _write(df, root, 'delete_matching', 'part-{i}.parquet')
+
+def import_statcast_csv(csv, root, chunksize=200_000):
+    '''
+    Adds the pitches in a statcast csv to the store at root, reading chunksize rows at a time.
+
+    Like write_statcast, the game dates in the csv replace what the store had for them.
+    '''
+    #chunks are written to a staging directory, ignored by pyarrow like SCHEMA, and each game
+    #date's partition replaces the store's only once the whole csv has been written.
+    staging = os.path.join(root, STAGING)
+    if os.path.isdir(staging):
+        shutil.rmtree(staging)
+    try:
+        #a game date can be spread over several chunks, so chunks are added next to each other.
+        for n, chunk in enumerate(pd.read_csv(csv, chunksize=chunksize, low_memory=False)):
+            _write(chunk, root, 'overwrite_or_ignore', 'part-{}-{{i}}.parquet'.format(n), data_root=staging)
+        for season in os.listdir(staging) if os.path.isdir(staging) else []:
+            os.makedirs(os.path.join(root, season), exist_ok=True)
+            for date in os.listdir(os.path.join(staging, season)):
+                partition = os.path.join(root, season, date)
+                if os.path.isdir(partition):
+                    shutil.rmtree(partition)
+                os.replace(os.path.join(staging, season, date), partition)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+def read_statcast(root, start=None, end=None, seasons=None, events=None, batters=None, pitchers=None,
+                  columns=None):
+    '''
+    Returns a DataFrame of the pitches in the store at root that match every given filter.
+
+    Parameters
+    ----------
+    root: str
+        The store's directory.
+
+    start, end: datetime.date, str or None (default = None)
+        The first and last game dates, inclusive. None leaves that side of the range open.
+
+    seasons: list-like of int or None (default = None)
+        Only these seasons.
+
+    events: list-like of str or None (default = None)
+        Only pitches whose events value is one of these, e.g. ['home_run', 'single'].
+
+    batters, pitchers: list-like of int or None (default = None)
+        Only pitches to or from these MLBAM ids.
+
+    columns: list-like of str or None (default = None)
+        The columns to return. None returns every column.
+    '''
+    dataset, expression = _scan(root, start, end, seasons, events, batters, pitchers)
+    table = dataset.to_table(columns=None if columns is None else list(columns), filter=expression)
+    return table.to_pandas()
+
+def iter_statcast(root, start=None, end=None, seasons=None, events=None, batters=None, pitchers=None,
+                  columns=None, batch_size=250_000):
+    '''
+    Yields the pitches in the store at root that match every given filter, as DataFrames of
+    batch_size pitches (the last one can be smaller), so that a pass over many seasons holds one
+    batch in memory at a time. The store's files hold a game date each, so smaller batches read
+    from them are combined.
+
+    The filters and columns are those of read_statcast. The partition column season can be
+    requested like any other column.
+    '''
+    dataset, expression = _scan(root, start, end, seasons, events, batters, pitchers)
+    pending = []
+    rows = 0
+    for batch in dataset.to_batches(columns=None if columns is None else list(columns), filter=expression,
+                                    batch_size=batch_size):
+        if not batch.num_rows:
+            continue
+        pending.append(batch)
+        rows += batch.num_rows
+        while rows >= batch_size:
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, batch_size).to_pandas()
+            pending = table.slice(batch_size).to_batches()
+            rows -= batch_size
+    if rows:
+        yield pa.Table.from_batches(pending).to_pandas()
+
+def _scan(root, start, end, seasons, events, batters, pitchers):
+    '''
+    Returns the store's dataset and the filter expression of read_statcast's arguments.
+    '''
+    dataset = ds.dataset(root, format='parquet', partitioning=PARTITIONING, schema=_read_schema(root))
+    filters = []
+    if start is not None:
+        filters.append(ds.field('game_date') >= pa.scalar(_to_date(start), pa.date32()))
+    if end is not None:
+        filters.append(ds.field('game_date') <= pa.scalar(_to_date(end), pa.date32()))
+    if seasons is not None:
+        filters.append(ds.field('season').isin([int(x) for x in seasons]))
+    if events is not None:
+        filters.append(ds.field('events').isin(list(events)))
+    if batters is not None:
+        filters.append(ds.field('batter').isin([int(x) for x in batters]))
+    if pitchers is not None:
+        filters.append(ds.field('pitcher').isin([int(x) for x in pitchers]))
+    expression = None
+    for f in filters:
+        expression = f if expression is None else expression & f
+    return dataset, expression
+
+def _write(df, root, existing_data_behavior, basename_template, data_root=None):
+    '''
+    Writes df's partitions under data_root (default: root) and adds its schema to root's.
+
+    The schemas are unified before anything is written, and a column that is integer in some
+    batches and float in others (e.g. once a batch has a missing value) is stored as float.
+    '''
+    if not len(df):
+        return
+    game_date = pd.to_datetime(df['game_date'])
+    df = df.assign(game_date=game_date.dt.date, season=game_date.dt.year.astype('int16'))
+    df = df.loc[:, ~df.columns.str.startswith('Unnamed:')] #index columns from csvs written with an index.
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    #a column with no values in this batch has no real type yet; the store's schema supplies it on read.
+    for i, name in enumerate(table.column_names):
+        if table.column(i).null_count == len(table) and name not in ('season', 'game_date'):
+            table = table.set_column(i, name, pa.nulls(len(table)))
+    schema = table.schema.remove_metadata()
+    old = _read_schema(root)
+    if old is not None:
+        schema = pa.unify_schemas([old, schema], promote_options='permissive')
+    ds.write_dataset(table, root if data_root is None else data_root, format='parquet', partitioning=PARTITIONING,
+                     existing_data_behavior=existing_data_behavior, basename_template=basename_template,
+                     min_rows_per_group=MIN_ROWS_PER_GROUP, max_rows_per_group=MAX_ROWS_PER_GROUP)
+    with open(os.path.join(root, SCHEMA), 'wb') as f:
+        f.write(schema.serialize().to_pybytes())
+
+def _read_schema(root):
+    '''
+    Returns the schema that unifies every batch written to the store, or None for a new store.
+    '''
+    path = os.path.join(root, SCHEMA)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pa.ipc.read_schema(pa.py_buffer(f.read()))
+
+def _to_date(x):
+    if isinstance(x, datetime.date) and not isinstance(x, datetime.datetime):
+        return x
+    return pd.Timestamp(x).date()
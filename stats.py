@@ -1,7 +1,14 @@
+import warnings
+
 import numpy as np
 import pandas as pd
 
-class StatCalculator:
+try:
+    from forecast.profiling import Instrumented
+except ImportError: #imported with forecast/ on the path instead of the repo root, as the notebooks do.
+    from profiling import Instrumented
+
+class StatCalculator(Instrumented):
     '''Provides basic functionality for getting rate and counting stats from existing stats.
     
     Includes pre-defined calculator for common and fantasy-relevant stats.
@@ -25,6 +32,16 @@ class StatCalculator:
     replacement_level: dict (string: numeric)
     The raw SPG value for each player who is replacement level at their position.
 
+    roster_slots: dict (string: int)
+    The number of roster slots of each position on one team. Used by solve_replacement_levels.
+
+    pitcher_positions: list (string)
+    The roster positions filled by pitchers. Used by solve_replacement_levels.
+
+    hook: callable or None
+    If set, called with a forecast.profiling.StepRecord after each batch valuation and
+    replacement level step. None (the default) disables the instrumentation. See profile.
+
     '''
 
     team_name_to_city_abbr = {
@@ -68,6 +85,19 @@ class StatCalculator:
         'U': 16.7,
         })
 
+    roster_slots = {
+        'C': 2,
+        '1B': 1,
+        '2B': 1,
+        '3B': 1,
+        'SS': 1,
+        'OF': 5,
+        'U': 1,
+        'P': 9,
+        }
+
+    pitcher_positions = ['P', 'SP', 'RP']
+
     spgxH = 8.475##used 8.47, nearly matched the real value of 8.486 in 2019.
     spgHR = 5.286##real value was 4.782
     spgR = 11.671###used 10.81,real value was 12.532
@@ -245,20 +275,59 @@ class StatCalculator:
                 K = pitcher_stats[stat_dict['K']]
                 W = pitcher_stats[stat_dict['W']]
                 S = pitcher_stats[stat_dict['S']]
-                IP = pitcher_stats['IP']
+                IP = pitcher_stats[stat_dict['IP']]
                 ER = pitcher_stats[stat_dict['ERA']]*IP/9
-                RA = pitcher_stats['WHIP']*IP
+                RA = pitcher_stats[stat_dict['WHIP']]*IP
                 
+        if use_replacement:
+            repl_adj = self.replacement_level[position]
+        else:
+            repl_adj = 0
+        return self._pitcher_spg(K, W, S, ER, RA, IP) - repl_adj
+
+    def pitcherFWAR_batch(self, data, position = 'P', use_replacement = True, use_count_stats = True, stat_dict = None):
+        '''
+        Returns a Series of pitcherFWAR values, one for each row of a DataFrame of pitcher stats.
+
+        Gives the same values as applying pitcherFWAR to each row, but stat_dict is resolved once
+        and the values are computed with whole-column arithmetic.
+
+        Parameters
+        ----------
+        data: DataFrame
+            Pitcher stats, one pitcher per row. See pitcherFWAR for the stats needed.
+
+        position: string or array-like, default = 'P'
+            The position of every pitcher, or an array of positions aligned with data.
+
+        use_replacement, use_count_stats, stat_dict:
+            See pitcherFWAR.
+        '''
+        with self._step('pitcherFWAR_batch', len(data)):
+            keys = {**self._standard_pitching_keys, **(stat_dict or {})}
+            col = lambda stat: data[keys[stat]].to_numpy(dtype=float)
+            K, W, S, IP = col('K'), col('W'), col('S'), col('IP')
+            if use_count_stats:
+                ER = col('ER')
+                RA = col('H') + col('BB')
+            else:
+                ER = col('ERA')*IP/9
+                RA = col('WHIP')*IP
+            values = self._pitcher_spg(K, W, S, ER, RA, IP)
+            if use_replacement:
+                values = values - self._replacement_values(position, len(data))
+            return pd.Series(values, index=data.index)
+
+    def _pitcher_spg(self, K, W, S, ER, RA, IP):
+        '''
+        Returns the cummulative SPG from pitching stats. Shared by pitcherFWAR and pitcherFWAR_batch.
+        '''
         K_ = K/self.spg['K']
         W_ = W/self.spg['W']
         S_ = S/self.spg['S']
         xER_ = ((self.lgERA * IP)/9 - ER)/self.spg['xER']
         xWHIP_ = ((self.lgWHIP * IP) - (RA))/self.spg['xWHIP']
-        if use_replacement:
-            repl_adj = self.replacement_level[position]
-        else:
-            repl_adj = 0
-        return K_ + W_ + S_ + xER_ + xWHIP_ - repl_adj
+        return K_ + W_ + S_ + xER_ + xWHIP_
 
     def hitterFWAR(self, hitter_stats, position = 'U', use_replacement = True, use_count_stats = True, stat_dict = None):
         '''
@@ -300,40 +369,241 @@ class StatCalculator:
                 AB = hitter_stats[stat_dict['AB']]
                 H = hitter_stats[stat_dict['BA']]*AB
                 
+        if use_replacement:
+            rep_level = self.replacement_level[position]
+        else:
+            rep_level = 0
+        return self._hitter_spg(HR, RBI, R, SB, H, AB) - rep_level
+
+    def hitterFWAR_batch(self, data, position = 'U', use_replacement = True, use_count_stats = True, stat_dict = None):
+        '''
+        Returns a Series of hitterFWAR values, one for each row of a DataFrame of hitter stats.
+
+        Gives the same values as applying hitterFWAR to each row, but stat_dict is resolved once
+        and the values are computed with whole-column arithmetic.
+
+        Parameters
+        ----------
+        data: DataFrame
+            Hitter stats, one hitter per row. See hitterFWAR for the stats needed.
+
+        position: string or array-like, default = 'U'
+            The position of every hitter, or an array of positions aligned with data.
+
+        use_replacement, use_count_stats, stat_dict:
+            See hitterFWAR.
+        '''
+        with self._step('hitterFWAR_batch', len(data)):
+            keys = {**self._standard_hitting_keys, **(stat_dict or {})}
+            col = lambda stat: data[keys[stat]].to_numpy(dtype=float)
+            HR, SB, RBI, R, AB = col('HR'), col('SB'), col('RBI'), col('R'), col('AB')
+            if use_count_stats:
+                H = col('H')
+            else:
+                H = col('BA')*AB
+            values = self._hitter_spg(HR, RBI, R, SB, H, AB)
+            if use_replacement:
+                values = values - self._replacement_values(position, len(data))
+            return pd.Series(values, index=data.index)
+
+    def _hitter_spg(self, HR, RBI, R, SB, H, AB):
+        '''
+        Returns the cummulative SPG from hitting stats. Shared by hitterFWAR and hitterFWAR_batch.
+        '''
         HR_ = HR/self.spg['HR']
         RBI_ = RBI/self.spg['RBI']
         R_ = R/self.spg['RBI']
         SB_ = SB/self.spg['SB']
         xH_ = (H - self.lgBA*AB)/self.spg['xH']
-        if use_replacement:
-            rep_level = self.replacement_level[position]
-        else:
-            rep_level = 0
-        return HR_ + RBI_ + R_ + SB_ + xH_ - rep_level
+        return HR_ + RBI_ + R_ + SB_ + xH_
+
+    def _replacement_values(self, position, length):
+        '''
+        Returns an array of replacement levels for a position or an array-like of positions.
+        '''
+        if isinstance(position, str):
+            return np.full(length, self.replacement_level[position])
+        return self.replacement_level.loc[np.asarray(position)].to_numpy()
 
     def hitter_replacement_level(self, data, count = 180, use_count_stats=True, stat_dict=None):
         """
         Returns the replacement level for hitters based on the input data.
         """
-        fwar_series = data.apply(self.hitterFWAR, 
-                                 args=(self,),
-                                 use_count_stats = use_count_stats, stat_dict=stat_dict, 
-                                 use_replacement = False,
-                                 axis=1)
+        fwar_series = self.hitterFWAR_batch(data, use_count_stats = use_count_stats, stat_dict=stat_dict,
+                                            use_replacement = False)
         return min(fwar_series.nlargest(count))
 
     def pitcher_replacement_level(self, data, count = 180, use_count_stats=True, stat_dict=None):
         """
         Returns the replacement level for pitchers based on the input data.
         """
-        fwar_series = data.apply(self.pitcherFWAR, 
-                                 args=(self,),
-                                 use_count_stats = use_count_stats, stat_dict=stat_dict, 
-                                 use_replacement = False,
-                                 axis=1)
+        fwar_series = self.pitcherFWAR_batch(data, use_count_stats = use_count_stats, stat_dict=stat_dict,
+                                             use_replacement = False)
         return min(fwar_series.nlargest(count))
 
+    def solve_replacement_levels(self, hitters, pitchers, teams = 15, roster = None, open_slots = None,
+                                 position_col = 'Pos', max_iter = 25, use_count_stats = True,
+                                 hitter_stat_dict = None, pitcher_stat_dict = None, return_rosters = False):
+        """
+        Returns replacement levels by position, solved by filling every roster slot in a league.
+
+        Players are valued with hitterFWAR_batch/pitcherFWAR_batch (without replacement). Each
+        iteration puts every player at the eligible position where he is most valuable over that
+        position's replacement level, fills each position's slots with the best players there,
+        fills the slots still open from the best players left, and sets each position's
+        replacement level to the value of the last player rostered there. This repeats until the
+        replacement levels stop changing, or until they repeat, when players swapping positions
+        back and forth makes the rosters cycle; then the rosters of the cycle worth the most are
+        kept. Each level is the value of the last player rostered at that position.
+
+        Parameters
+        ----------
+        hitters: DataFrame
+            Hitter stats, one hitter per row, with a position_col of eligible positions
+            separated by '/' or ',' (e.g. 'SS/2B'). LF, CF and RF count as OF when the roster
+            has OF slots. Every hitter is eligible at U, and none at pitcher_positions.
+
+        pitchers: DataFrame
+            Pitcher stats, one pitcher per row. If it has a position_col (e.g. with SP and RP),
+            it is used for eligibility at the other pitcher_positions. Every pitcher is eligible at P.
 
+        teams: int, default = 15
+            The number of teams in the league.
 
+        roster: dict or None, default = None
+            Slots of each position on one team. If None, self.roster_slots.
 
+        open_slots: dict or None, default = None
+            Slots of each position still open across the whole league, overriding teams and
+            roster. Pass the undrafted players and the open slots to re-solve during a draft.
 
+        position_col: string, default = 'Pos'
+            The column with each player's eligible positions.
+
+        max_iter: int, default = 25
+            The most iterations before giving up on convergence. A RuntimeWarning is issued
+            if the levels haven't converged or started cycling by then.
+
+        use_count_stats, hitter_stat_dict, pitcher_stat_dict:
+            See hitterFWAR and pitcherFWAR.
+
+        return_rosters: bool, default = False
+            If True, also return Series giving the position each hitter and pitcher was
+            rostered at (NaN if not rostered).
+
+        Returns
+        -------
+        A Series like replacement_level, with the solved positions replaced. LF, CF and RF
+        are set to the OF level. If return_rosters, a tuple (levels, hitter_rosters, pitcher_rosters).
+        """
+        with self._step('solve_replacement_levels', len(hitters) + len(pitchers)):
+            return self._solve_replacement_levels(hitters, pitchers, teams, roster, open_slots, position_col, max_iter,
+                                                  use_count_stats, hitter_stat_dict, pitcher_stat_dict, return_rosters)
+
+    def _solve_replacement_levels(self, hitters, pitchers, teams, roster, open_slots, position_col, max_iter,
+                                  use_count_stats, hitter_stat_dict, pitcher_stat_dict, return_rosters):
+        """
+        Private method. The body of solve_replacement_levels.
+        """
+        if open_slots is None:
+            open_slots = {pos: n*teams for pos, n in (roster or self.roster_slots).items()}
+        hitter_values = self.hitterFWAR_batch(hitters, use_replacement = False,
+                                              use_count_stats = use_count_stats, stat_dict = hitter_stat_dict)
+        pitcher_values = self.pitcherFWAR_batch(pitchers, use_replacement = False,
+                                                use_count_stats = use_count_stats, stat_dict = pitcher_stat_dict)
+        with self._step('eligibility', len(hitters) + len(pitchers)):
+            hitter_eligible = self._eligibility(hitters, position_col, open_slots, default = None)
+            pitcher_eligible = self._eligibility(pitchers, position_col, open_slots, default = 'P')
+
+        levels = self.replacement_level.copy()
+        rosters = []
+        for values, eligible in [(hitter_values, hitter_eligible), (pitcher_values, pitcher_eligible)]:
+            slots = np.array([open_slots[pos] for pos in eligible.columns])
+            with self._step('allocate', len(values)):
+                solved, assigned = self._allocate(values.to_numpy(), eligible.to_numpy(), slots, max_iter)
+            for pos, level in zip(eligible.columns, solved):
+                levels[pos] = level
+            rosters.append(pd.Series(np.where(assigned >= 0, eligible.columns.to_numpy()[assigned], np.nan),
+                                     index = values.index))
+        if 'OF' in levels and 'OF' in open_slots:
+            for pos in ['LF','CF','RF']:
+                levels[pos] = levels['OF']
+        if return_rosters:
+            return levels, rosters[0], rosters[1]
+        return levels
+
+    @staticmethod
+    def _eligibility(data, position_col, open_slots, default):
+        """
+        Returns a boolean DataFrame, one column per rosterable position, of which players are eligible where.
+        """
+        if position_col in data:
+            eligible = data[position_col].fillna('').astype(str).str.replace(',', '/').str.get_dummies(sep = '/')
+            eligible.columns = eligible.columns.str.strip()
+            eligible = eligible.T.groupby(level = 0).max().T #merge columns that differed by whitespace.
+            if 'OF' in open_slots:
+                outfield = [x for x in ['OF','LF','CF','RF'] if x in eligible]
+                if outfield:
+                    eligible['OF'] = eligible[outfield].max(axis = 1)
+        else:
+            eligible = pd.DataFrame({default: 1}, index = data.index)
+        if default is None and 'U' in open_slots:
+            eligible['U'] = 1
+        elif default is not None and default in open_slots:
+            eligible[default] = 1 #P slots take any pitcher, as U slots take any hitter.
+        #two-way players are solved as a hitter and a pitcher, each only at the positions of his pool.
+        pitching = [pos in StatCalculator.pitcher_positions for pos in open_slots]
+        positions = [pos for pos, p in zip(open_slots, pitching)
+                     if pos in eligible and open_slots[pos] > 0 and p == (default is not None)]
+        return eligible[positions].astype(bool)
+
+    @staticmethod
+    def _allocate(values, eligible, slots, max_iter):
+        """
+        Private method. Solves replacement levels for one pool of players.
+
+        values is an array of n player values, eligible an n by m boolean array and slots the
+        m slot counts. Returns the m replacement levels, each the value of the last player
+        rostered at that position (0 if none), and an array of the position each player is
+        rostered at (-1 if not rostered). Warns if the levels haven't converged or started
+        cycling after max_iter iterations.
+        """
+        n, m = eligible.shape
+        top_k = lambda idx, k: idx if k >= len(idx) else idx[np.argpartition(-values[idx], k - 1)[:k]]
+        marginal = lambda assigned: np.array([values[assigned == j].min() if np.any(assigned == j) else 0
+                                              for j in range(m)])
+
+        #start with each position's level ignoring the other positions.
+        levels = np.zeros(m)
+        for j in range(m):
+            chosen = top_k(np.flatnonzero(eligible[:, j]), slots[j])
+            levels[j] = values[chosen].min() if len(chosen) else 0
+        playable = eligible.any(axis = 1)
+
+        #the levels determine the next rosters, so once they repeat, the rosters cycle.
+        seen = {}
+        rosters = []
+        for _ in range(max_iter):
+            seen[levels.tobytes()] = len(rosters)
+            surplus = np.where(eligible, values[:, None] - levels[None, :], -np.inf)
+            best = surplus.argmax(axis = 1)
+            assigned = np.full(n, -1)
+            for j in range(m):
+                assigned[top_k(np.flatnonzero(playable & (best == j)), slots[j])] = j
+            for j in range(m):
+                remaining = slots[j] - np.count_nonzero(assigned == j)
+                if remaining > 0:
+                    assigned[top_k(np.flatnonzero((assigned == -1) & eligible[:, j]), remaining)] = j
+            rosters.append(assigned)
+            levels = marginal(assigned)
+            if levels.tobytes() in seen:
+                break
+        else:
+            warnings.warn('replacement levels did not converge in {} iterations; the levels of the last rosters '
+                          'are returned. Try a larger max_iter.'.format(max_iter), RuntimeWarning, stacklevel = 4)
+            return levels, assigned
+        #a converged solution is a cycle of one roster; otherwise players swap positions back and
+        #forth, and the rosters of the cycle that are worth the most are kept.
+        cycle = rosters[seen[levels.tobytes()]:]
+        assigned = max(cycle, key = lambda assigned: values[assigned >= 0].sum())
+        return marginal(assigned), assigned
@@ -0,0 +1,47 @@
+'''
+Checks of forecast/blend.py on small synthetic projections.
+'''
+
+import numpy as np
+import pandas as pd
+
+from forecast.blend import blend_hitters
+
+
+def system(pa, hr, hr_var=None):
+    df = pd.DataFrame({'playerid': [1, 2], 'PA': pa, 'AB': np.multiply(pa, .9), 'H': np.multiply(pa, .23),
+                       'HR': hr})
+    if hr_var is not None:
+        df['HR_var'] = hr_var
+    return df
+
+
+def marcel_var(hr, pa, weighted):
+    #Marcel's variance: Poisson variation plus the uncertainty of a rate known from weighted + 1200 PA.
+    return np.multiply(hr, 1 + np.divide(pa, np.add(weighted, 1200)))
+
+
+def test_one_system_keeps_its_variance():
+    hr_var = marcel_var([20, 10], [600, 400], [1500, 300])
+    out = blend_hitters({'marcel': system([600, 400], [20, 10], hr_var)})
+    assert np.allclose(out['HR_var'], hr_var)
+
+
+def test_identical_systems_halve_the_rate_variance():
+    hr_var = marcel_var([20, 10], [600, 400], [1500, 300])
+    one = blend_hitters({'a': system([600, 400], [20, 10], hr_var)})
+    two = blend_hitters({'a': system([600, 400], [20, 10], hr_var), 'b': system([600, 400], [20, 10], hr_var)})
+    assert np.allclose(two['HR'], one['HR'])
+    assert np.allclose(two['HR_var'] - two['HR'], (one['HR_var'] - one['HR']) / 2)
+
+
+def test_variance_is_rescaled_to_blended_playing_time():
+    hr_var = marcel_var([20, 10], [600, 400], [1500, 300])
+    out = blend_hitters({'marcel': system([600, 400], [20, 10], hr_var), 'steamer': system([500, 200], [15, 4])},
+                        playing_time_weights={'marcel': 0, 'steamer': 1})
+    assert np.allclose(out['PA'], [500, 200])
+    #never below the Poisson variation of the blended count.
+    assert (out['HR_var'] >= out['HR']).all()
+    #steamer has no variance, so its rate is taken to be as uncertain as marcel's.
+    rate_var = (hr_var - np.array([20, 10])) / np.array([600, 400])**2
+    assert np.allclose(out['HR_var'], out['HR'] + rate_var / 2 * np.array([500, 200])**2)
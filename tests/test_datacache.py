@@ -0,0 +1,58 @@
+'''
+Checks of forecast/datacache.py: cached reads match uncached ones, and the cache follows the csv.
+'''
+
+import os
+
+import pandas as pd
+import pytest
+
+from forecast import datacache
+
+pytest.importorskip('pyarrow')
+
+CSV = '\ufeffplayerid,Season,Name,K%,HR\n1,2019,A,21.5%,30\n2,2019,B,9.0%,12\n'
+
+
+def write(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return str(path)
+
+
+def test_cached_read_matches_uncached(tmp_path):
+    path = write(tmp_path / 'hitters.csv', CSV)
+    first = datacache.read_csv(path)
+    cached = datacache.read_csv(path)
+    pd.testing.assert_frame_equal(first, cached)
+    #percentages stay text, as pd.read_csv leaves them.
+    expected = pd.read_csv(path, encoding='utf-8-sig')
+    pd.testing.assert_frame_equal(cached, expected, check_dtype=False)
+    assert cached['K%'].tolist() == ['21.5%', '9.0%']
+
+
+def test_changed_csv_rebuilds_cache(tmp_path):
+    path = write(tmp_path / 'hitters.csv', CSV)
+    datacache.read_csv(path)
+    write(path, CSV.replace('30', '31'))
+    os.utime(path, ns=(0, 10**18))
+    assert datacache.read_csv(path)['HR'].tolist() == [31, 12]
+
+
+def test_touched_csv_keeps_cache(tmp_path, monkeypatch):
+    path = write(tmp_path / 'hitters.csv', CSV)
+    datacache.read_csv(path)
+    os.utime(path, ns=(0, 10**18))
+    monkeypatch.setattr(datacache, '_parse', lambda path: pytest.fail('cache was rebuilt'))
+    assert datacache.read_csv(path)['HR'].tolist() == [30, 12]
+
+
+def test_same_name_in_shared_cache_dir(tmp_path):
+    cache = str(tmp_path / 'cache')
+    os.makedirs(tmp_path / 'a')
+    os.makedirs(tmp_path / 'b')
+    a = write(tmp_path / 'a' / 'hitters.csv', CSV)
+    b = write(tmp_path / 'b' / 'hitters.csv', CSV.replace('30', '40'))
+    assert datacache.read_csv(a, cache_dir=cache)['HR'].tolist() == [30, 12]
+    assert datacache.read_csv(b, cache_dir=cache)['HR'].tolist() == [40, 12]
+    assert datacache.read_csv(a, cache_dir=cache)['HR'].tolist() == [30, 12]
@@ -0,0 +1,45 @@
+'''
+Checks of expected_stats.py on a small synthetic statcast_store.
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import statcast_store
+from expected_stats import ExpectedStatsGrid, expected_stats
+
+
+@pytest.fixture
+def root(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 5000
+    events = rng.choice(np.array(['single', 'double', 'home_run', 'field_out', 'strikeout', 'walk', None],
+                                 dtype = object), n)
+    batted = np.isin(events, ['single', 'double', 'home_run', 'field_out'])
+    df = pd.DataFrame({'game_date': (pd.Timestamp('2019-04-01') + pd.to_timedelta(rng.integers(0, 20, n), 'D')),
+                       'batter': rng.integers(1, 30, n), 'events': events,
+                       'launch_speed': np.where(batted, rng.normal(88, 12, n), np.nan),
+                       'launch_angle': np.where(batted, rng.normal(12, 25, n), np.nan)})
+    path = str(tmp_path / 'store')
+    statcast_store.write_statcast(df, path)
+    return path
+
+
+def test_batch_size_does_not_change_results(root):
+    grid = ExpectedStatsGrid.fit_store(root)
+    whole = expected_stats(root, grid)
+    batched = expected_stats(root, grid, batch_size = 333)
+    pd.testing.assert_frame_equal(whole.sort_index(), batched.sort_index())
+
+
+def test_actual_counts_match_pandas(root):
+    out = expected_stats(root, ExpectedStatsGrid.fit_store(root))
+    pitches = statcast_store.read_statcast(root, columns = ['batter', 'events'])
+    home_runs = pitches[pitches['events'] == 'home_run'].groupby('batter').size()
+    assert (out['HR'].droplevel('Season').reindex(home_runs.index) == home_runs).all()
+    assert out['PA'].sum() == pitches['events'].notna().sum()
+    #the grid is fitted on the same batted balls, so expected home runs add up to about the actual ones.
+    assert np.isclose(out['xHR'].sum(), out['HR'].sum(), rtol = .2)
@@ -0,0 +1,35 @@
+'''
+Checks of hr_classifier.py on synthetic batted balls.
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('sklearn')
+
+from hr_classifier import HRClassifier
+
+
+def batted_balls(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    speed = rng.normal(90, 12, n)
+    angle = rng.normal(15, 20, n)
+    home_run = (speed > 100) & (angle > 20) & (angle < 35)
+    df = pd.DataFrame({'launch_speed': speed, 'launch_angle': angle, 'hc_x': rng.uniform(20, 230, n),
+                       'hc_y': rng.uniform(20, 190, n), 'stand': rng.choice(['L', 'R'], n),
+                       'p_throws': rng.choice(['L', 'R'], n), 'home_team': rng.choice(['PHI', 'NYM', 'COL'], n),
+                       'events': np.where(home_run, 'home_run', 'field_out')})
+    df.loc[df.index[::50], 'launch_angle'] = np.nan
+    return df
+
+
+@pytest.mark.filterwarnings('ignore::sklearn.exceptions.ConvergenceWarning')
+def test_score_does_not_depend_on_chunksize(tmp_path):
+    df = batted_balls()
+    model = HRClassifier(hidden_layer_sizes=(8,), max_iter=50).fit(df)
+    whole = model.score(df)
+    assert whole.isna().sum() == df['launch_angle'].isna().sum()
+    pd.testing.assert_series_equal(whole, model.score(df, chunksize=37))
+    model.save(str(tmp_path / 'model.pkl'))
+    pd.testing.assert_series_equal(whole, HRClassifier.load(str(tmp_path / 'model.pkl')).score(df))
@@ -0,0 +1,111 @@
+'''
+Checks of MarcelForecaster's projection paths on small synthetic player seasons.
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from forecast.marcel import MarcelForecaster
+
+SEASONS = range(2012, 2020)
+
+
+def player_seasons(n=150, seed=0):
+    '''
+    Returns (hitters, pitchers) DataFrames of random but consistent player seasons.
+    '''
+    rng = np.random.default_rng(seed)
+    hitters, pitchers = [], []
+    for pid in range(1, n + 1):
+        born = rng.integers(1980, 1996)
+        for season in sorted(rng.choice(SEASONS, size=rng.integers(1, len(SEASONS) + 1), replace=False)):
+            pa = int(rng.integers(1, 700))
+            ab = int(pa * .88)
+            h = int(ab * rng.uniform(.2, .32))
+            hr, doubles, triples = int(h * rng.uniform(0, .25)), int(h * .2), int(h * .02)
+            hitters.append({'Season': season, 'Name': 'P{}'.format(pid), 'Team': 'Cubs', 'G': pa // 4, 'AB': ab,
+                            'PA': pa, 'H': h, '1B': h - hr - doubles - triples, '2B': doubles, '3B': triples,
+                            'HR': hr, 'R': int(pa * .12), 'RBI': int(pa * .11), 'BB': int(pa * .08),
+                            'IBB': int(pa * .005), 'SO': int(pa * .22), 'HBP': int(pa * .01), 'SF': int(pa * .007),
+                            'SH': int(pa * .003), 'GDP': int(pa * .02), 'SB': int(rng.integers(0, 30)),
+                            'CS': int(rng.integers(0, 8)), 'AVG': h / ab if ab else 0.0, 'playerid': pid,
+                            'Age': int(season - born)})
+            if rng.random() < .5:
+                g = int(rng.integers(1, 70))
+                ip = float(rng.integers(1, 200))
+                er = int(ip * rng.uniform(.3, .6))
+                pitchers.append({'Season': season, 'Name': 'P{}'.format(pid), 'Team': 'Cubs',
+                                 'W': int(rng.integers(0, 15)), 'L': int(rng.integers(0, 15)), 'ERA': er / ip * 9,
+                                 'G': g, 'GS': int(rng.integers(0, g + 1)), 'CG': 0, 'ShO': 0,
+                                 'SV': int(rng.integers(0, 30)), 'HLD': int(rng.integers(0, 20)),
+                                 'BS': int(rng.integers(0, 5)), 'IP': ip, 'TBF': int(ip * 4.3), 'H': int(ip * .9),
+                                 'R': er + 2, 'ER': er, 'HR': int(ip * .12), 'BB': int(ip * .35), 'IBB': 1, 'HBP': 2,
+                                 'WP': 3, 'BK': 0, 'SO': int(ip * rng.uniform(.6, 1.3)), 'playerid': pid,
+                                 'Age': int(season - born)})
+    return pd.DataFrame(hitters), pd.DataFrame(pitchers)
+
+
+@pytest.fixture(scope='module')
+def data():
+    return player_seasons()
+
+
+def forecaster(data):
+    hitters, pitchers = data
+    return MarcelForecaster(pitchers.copy(), hitters.copy(), as_pandas=True)
+
+
+def assert_same(a, b):
+    a, b = a.sort_index(), b.sort_index()
+    numeric = [col for col in a if a[col].dtype.kind in 'fiu']
+    assert list(a.index) == list(b.index)
+    np.testing.assert_allclose(a[numeric].to_numpy(float), b[numeric].to_numpy(float), rtol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize('kind', ['hitters', 'pitchers'])
+def test_engines_agree(data, kind):
+    m = forecaster(data)
+    project = getattr(m, 'project_' + kind)
+    assert_same(project(2019, engine='vectorized'), project(2019, engine='apply'))
+
+
+@pytest.mark.parametrize('kind', ['hitters', 'pitchers'])
+def test_range_matches_single_seasons(data, kind):
+    m = forecaster(data)
+    projections = getattr(m, 'project_{}_range'.format(kind))([2017, 2019])
+    for season in [2017, 2019]:
+        assert_same(projections.xs(season, level='Season'), getattr(m, 'project_' + kind)(season))
+
+
+def test_ids_match_full_projection(data):
+    m = forecaster(data)
+    full = m.project_hitters(2019)
+    ids = list(full.index[::7])
+    assert_same(m.project_hitters(2019, ids=ids), full.loc[ids])
+    #ids given as strings are normalized like the stored ones.
+    assert_same(m.project_hitters(2019, ids=[str(x) for x in ids]), full.loc[ids])
+
+
+def test_added_data_invalidates_caches(data):
+    hitters, pitchers = data
+    #half of 2018 is added after the first projections, which must then be recomputed.
+    late_h = (hitters['Season'] == 2018) & (hitters['playerid'] % 2 == 0)
+    late_p = (pitchers['Season'] == 2018) & (pitchers['playerid'] % 2 == 0)
+    m = MarcelForecaster(pitchers[~late_p].copy(), hitters[~late_h].copy(), as_pandas=True)
+    before = m.project_hitters(2019)
+    m.project_pitchers(2019)
+    m.add_hitter_data(hitters[late_h], as_pandas=True)
+    m.add_pitcher_data(pitchers[late_p], as_pandas=True)
+    fresh = forecaster(data)
+    assert not np.allclose(before['HR'], fresh.project_hitters(2019).loc[before.index, 'HR'])
+    assert_same(m.project_hitters(2019), fresh.project_hitters(2019))
+    assert_same(m.project_pitchers(2019), fresh.project_pitchers(2019))
+
+
+def test_streaming_matches_in_memory(data):
+    hitters, pitchers = data
+    m = forecaster(data)
+    chunks = [hitters.iloc[i:i + 200] for i in range(0, len(hitters), 200)]
+    streamed = pd.concat(m.project_hitters_streaming(chunks, 2019, batch_size=50))
+    assert_same(streamed, m.project_hitters(2019))
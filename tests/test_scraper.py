@@ -0,0 +1,98 @@
+'''
+Offline checks of the Statcast fetchers in scraper.py, with a stub in place of baseball_scraper.
+'''
+
+import datetime
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import scraper
+
+START = datetime.date(2019, 4, 1)
+
+
+class StubFetch:
+    '''
+    A fetch that returns one row per slice, failing the first fails calls for the slices starting on the dates in fail.
+    '''
+
+    def __init__(self, fail=None, delay=0):
+        self.fail = fail or {}
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, start_dt, end_dt):
+        with self._lock:
+            self.calls.append(start_dt)
+            attempts = self.calls.count(start_dt)
+        time.sleep(self.delay)
+        if attempts <= self.fail.get(start_dt, 0):
+            raise ConnectionError('stub failure')
+        return pd.DataFrame({'game_date': [start_dt], 'end': [end_dt]})
+
+
+def test_retries_recover_failed_slices():
+    fetch = StubFetch(fail={'2019-04-06': 2})
+    out = scraper.statcast_scrape_concurrent(START, START + datetime.timedelta(days=14), max_workers=2,
+                                             rate=None, retries=2, backoff=0, fetch=fetch)
+    assert list(out['game_date']) == ['2019-04-01', '2019-04-06', '2019-04-11']
+    assert fetch.calls.count('2019-04-06') == 3
+
+
+def test_scrape_error_lists_missing_slices():
+    fetch = StubFetch(fail={'2019-04-06': 10})
+    windows = scraper._missing_windows(START, START + datetime.timedelta(days=59), [], 5)
+    with pytest.raises(scraper.ScrapeError) as error:
+        scraper.statcast_scrape_concurrent(START, START + datetime.timedelta(days=59), max_workers=1,
+                                           rate=None, retries=1, backoff=0, fetch=fetch)
+    missing = error.value.missing
+    scraped = [scraper._to_date(x) for x in error.value.data['game_date']]
+    assert missing == sorted(missing)
+    assert (datetime.date(2019, 4, 6), datetime.date(2019, 4, 10)) in missing
+    #every slice is either scraped or missing, and the ones queued behind the failure were cancelled.
+    assert sorted([first for first, last in missing] + scraped) == [first for first, last in windows]
+    assert len(set(fetch.calls)) < len(windows)
+    assert fetch.calls.count('2019-04-06') == 2
+
+
+def test_early_close_does_not_scrape_queued_slices():
+    fetch = StubFetch(delay=.05)
+    windows = scraper._missing_windows(START, START + datetime.timedelta(days=180), [], 5)
+    scrapes = scraper._scrape_windows(windows, fetch, 2, None, 1, 0, 0)
+    next(scrapes)
+    began = time.monotonic()
+    scrapes.close()
+    assert time.monotonic() - began < 1
+    time.sleep(.2)
+    assert len(fetch.calls) < len(windows)
+
+
+def test_failed_write_stops_resumable_scrape(tmp_path, monkeypatch):
+    fetch = StubFetch(delay=.05)
+    def fail(*args):
+        raise OSError('disk full')
+    monkeypatch.setattr(scraper, '_write_slice', fail)
+    with pytest.raises(OSError):
+        scraper.statcast_scrape_to_dir(str(tmp_path), START, START + datetime.timedelta(days=180),
+                                       max_workers=2, fetch=fetch)
+    time.sleep(.2)
+    assert len(fetch.calls) < 10
+
+
+def test_resumes_missing_dates(tmp_path):
+    end = START + datetime.timedelta(days=14)
+    first = scraper.statcast_scrape_to_dir(str(tmp_path), START, START + datetime.timedelta(days=4), fetch=StubFetch())
+    fetch = StubFetch()
+    manifest = scraper.statcast_scrape_to_dir(str(tmp_path), START, end, fetch=fetch)
+    assert len(first) == 1 and len(manifest) == 3
+    assert fetch.calls == ['2019-04-06', '2019-04-11']
+    assert len(scraper.read_statcast_dir(str(tmp_path))) == 3
+
+
+def test_update_needs_start_without_manifest(tmp_path):
+    with pytest.raises(ValueError):
+        scraper.update_statcast_dir(str(tmp_path))
@@ -0,0 +1,55 @@
+'''
+Checks of simulation.py on small synthetic projections.
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation import SeasonSimulator
+
+
+def projections(n=12, seed=0):
+    rng = np.random.default_rng(seed)
+    hitters = pd.DataFrame({'HR': rng.uniform(5, 40, n), 'SB': rng.uniform(0, 30, n), 'RBI': rng.uniform(40, 110, n),
+                            'R': rng.uniform(40, 110, n), 'H': rng.uniform(90, 180, n), 'AB': rng.uniform(350, 650, n)})
+    pitchers = pd.DataFrame({'K': rng.uniform(50, 250, n), 'W': rng.uniform(2, 18, n), 'S': rng.uniform(0, 30, n),
+                             'ER': rng.uniform(20, 90, n), 'BB': rng.uniform(15, 70, n), 'H': rng.uniform(50, 190, n),
+                             'IP': rng.uniform(60, 200, n)})
+    return hitters, pitchers
+
+
+def test_tied_teams_split_points():
+    #two teams, every category tied: each gets 1.5 points in each of the 10 categories.
+    h = np.ones((3, 2, 6))
+    p = np.ones((3, 2, 7))
+    points = SeasonSimulator._standings_points(h, p, np.array([0, 1]), np.array([0, 1]), 2)
+    assert np.allclose(points, 15)
+
+
+def test_points_are_average_ranks():
+    h = np.zeros((1, 3, 6))
+    h[0, :, 0] = [10, 20, 10] #HR: the two tied teams share ranks 1 and 2.
+    h[0, :, 5] = 1
+    p = np.ones((1, 3, 7))
+    points = SeasonSimulator._standings_points(h, p, np.arange(3), np.arange(3), 3)
+    assert np.allclose(points - points.min(), [[0, 1.5, 0]])
+
+
+def test_missing_projection_raises():
+    hitters, pitchers = projections()
+    hitters.loc[3, 'SB'] = np.nan
+    with pytest.raises(ValueError, match='SB'):
+        SeasonSimulator(hitters, pitchers)
+
+
+def test_processes_match_one_process():
+    hitters, pitchers = projections()
+    teams = np.arange(len(hitters)) % 3
+    simulator = SeasonSimulator(hitters, pitchers)
+    one = simulator.simulate(400, teams, teams, seed=1, batch_size=100)
+    two = simulator.simulate(400, teams, teams, seed=1, batch_size=100, n_jobs=2)
+    for a, b in zip(one, two):
+        pd.testing.assert_frame_equal(a, b)
+    #every season hands out 3 + 2 + 1 points in each of the 10 categories.
+    assert np.isclose(one[2]['mean'].sum(), 60)
@@ -0,0 +1,63 @@
+'''
+Checks of statcast_store.py on small synthetic pitch data.
+'''
+
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+import statcast_store
+
+
+def pitches(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    #shuffled dates, as a scrape written in the order it finished would have them.
+    dates = pd.Timestamp('2019-04-01') + pd.to_timedelta(rng.integers(0, 10, n), 'D')
+    return pd.DataFrame({'game_date': dates.strftime('%Y-%m-%d'), 'batter': rng.integers(1, 50, n),
+                         'events': rng.choice(['single', 'home_run', 'field_out'], n),
+                         'launch_speed': rng.normal(88, 10, n)})
+
+
+def test_filters_match_pandas(tmp_path):
+    df = pitches()
+    root = str(tmp_path / 'store')
+    statcast_store.write_statcast(df, root)
+    out = statcast_store.read_statcast(root, start='2019-04-03', end='2019-04-05', events=['home_run'],
+                                       batters=[1, 2, 3], columns=['batter', 'launch_speed'])
+    expected = df[df['game_date'].between('2019-04-03', '2019-04-05') & (df['events'] == 'home_run')
+                  & df['batter'].isin([1, 2, 3])]
+    assert sorted(out['launch_speed']) == sorted(expected['launch_speed'])
+    assert list(out.columns) == ['batter', 'launch_speed']
+
+
+def test_import_in_chunks_writes_whole_row_groups(tmp_path):
+    df = pitches()
+    df.loc[df.index[-1], 'batter'] = np.nan #the last chunk's batter is float, the others int.
+    df.to_csv(tmp_path / 'pitches.csv', index=False)
+    root = str(tmp_path / 'store')
+    statcast_store.import_statcast_csv(str(tmp_path / 'pitches.csv'), root, chunksize=1000)
+    assert len(statcast_store.read_statcast(root)) == len(df)
+    files = glob.glob(os.path.join(root, '**', '*.parquet'), recursive=True)
+    assert all(pq.ParquetFile(f).num_row_groups == 1 for f in files)
+    assert not os.path.exists(os.path.join(root, statcast_store.STAGING))
+
+
+def test_iter_combines_batches(tmp_path):
+    df = pitches()
+    root = str(tmp_path / 'store')
+    statcast_store.write_statcast(df, root)
+    sizes = [len(x) for x in statcast_store.iter_statcast(root, columns=['batter'], batch_size=700)]
+    assert sizes == [700] * (len(df) // 700) + [len(df) % 700]
+
+
+def test_rewrite_replaces_dates(tmp_path):
+    df = pitches()
+    root = str(tmp_path / 'store')
+    statcast_store.write_statcast(df, root)
+    statcast_store.write_statcast(df[df['game_date'] == '2019-04-02'], root)
+    assert len(statcast_store.read_statcast(root)) == len(df)
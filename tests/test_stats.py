@@ -0,0 +1,83 @@
+'''
+Checks of StatCalculator: batch valuations against the scalar ones, and replacement levels.
+'''
+
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stats import StatCalculator
+
+HITTER_COLUMNS = {'HR': 'home_runs', 'SB': 'steals', 'RBI': 'rbi', 'R': 'runs', 'H': 'hits', 'AB': 'at_bats',
+                  'BA': 'avg'}
+PITCHER_COLUMNS = {'K': 'SO', 'S': 'SV', 'W': 'wins', 'ER': 'earned', 'BB': 'walks', 'H': 'hits', 'IP': 'innings',
+                   'ERA': 'era', 'WHIP': 'whip'}
+
+
+def hitters(n=40, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'HR': rng.uniform(0, 45, n), 'SB': rng.uniform(0, 40, n), 'RBI': rng.uniform(20, 120, n),
+                       'R': rng.uniform(20, 120, n), 'AB': rng.uniform(200, 650, n)})
+    df['H'] = df['AB'] * rng.uniform(.2, .32, n)
+    df['BA'] = df['H'] / df['AB']
+    df['Pos'] = rng.choice(['C', '1B', '2B', '3B', 'SS', 'OF', 'SS/2B', '1B/OF', 'SP/OF'], n)
+    return df
+
+
+def pitchers(n=40, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'K': rng.uniform(30, 280, n), 'W': rng.uniform(0, 20, n), 'S': rng.uniform(0, 40, n),
+                       'IP': rng.uniform(40, 210, n), 'BB': rng.uniform(10, 80, n)})
+    df['ER'] = df['IP'] * rng.uniform(2.5, 5.5, n) / 9
+    df['H'] = df['IP'] * rng.uniform(.7, 1.1, n)
+    df['ERA'] = 9 * df['ER'] / df['IP']
+    df['WHIP'] = (df['H'] + df['BB']) / df['IP']
+    return df
+
+
+@pytest.mark.parametrize('use_count_stats', [True, False])
+@pytest.mark.parametrize('remap', [False, True])
+def test_batch_matches_scalar(use_count_stats, remap):
+    calculator = StatCalculator()
+    h, p = hitters(), pitchers()
+    hitter_dict = pitcher_dict = None
+    if remap:
+        h, p = h.rename(columns=HITTER_COLUMNS), p.rename(columns=PITCHER_COLUMNS)
+        hitter_dict, pitcher_dict = HITTER_COLUMNS, PITCHER_COLUMNS
+    batch = calculator.hitterFWAR_batch(h, position='SS', use_count_stats=use_count_stats, stat_dict=hitter_dict)
+    scalar = [calculator.hitterFWAR(row, position='SS', use_count_stats=use_count_stats, stat_dict=hitter_dict)
+              for _, row in h.iterrows()]
+    assert np.allclose(batch, scalar)
+    batch = calculator.pitcherFWAR_batch(p, use_count_stats=use_count_stats, stat_dict=pitcher_dict)
+    scalar = [calculator.pitcherFWAR(row, use_count_stats=use_count_stats, stat_dict=pitcher_dict)
+              for _, row in p.iterrows()]
+    assert np.allclose(batch, scalar)
+
+
+def test_replacement_levels_are_the_last_rostered_players():
+    calculator = StatCalculator()
+    h, p = hitters(400), pitchers(300)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        levels, hitter_rosters, pitcher_rosters = calculator.solve_replacement_levels(h, p, teams=4,
+                                                                                        return_rosters=True)
+    slots = {pos: n * 4 for pos, n in calculator.roster_slots.items()}
+    values = calculator.hitterFWAR_batch(h, use_replacement=False)
+    for pos in ['C', '1B', '2B', '3B', 'SS', 'OF', 'U']:
+        assert (hitter_rosters == pos).sum() == slots[pos]
+        assert np.isclose(levels[pos], values[hitter_rosters == pos].min())
+    #hitters listed at SP fill no pitcher slots.
+    assert (pitcher_rosters == 'P').sum() == slots['P']
+    assert set(hitter_rosters.dropna()) <= set(slots) - {'P'}
+    pitcher_values = calculator.pitcherFWAR_batch(p, use_replacement=False)
+    assert np.isclose(levels['P'], pitcher_values[pitcher_rosters == 'P'].min())
+
+
+def test_allocate_warns_without_convergence():
+    values = np.random.default_rng(0).normal(0, 2, 300)
+    eligible = np.random.default_rng(1).random((300, 4)) < .35
+    eligible[:, 3] = True
+    with pytest.warns(RuntimeWarning):
+        StatCalculator._allocate(values, eligible, np.array([12, 12, 24, 10]), 1)